@@ -1,12 +1,31 @@
 import streamlit as st
+import streamlit.components.v1 as components
 import pandas as pd
+import numpy as np
 from datetime import datetime, timedelta
 import gspread
 from gspread.exceptions import WorksheetNotFound, SpreadsheetNotFound
 from oauth2client.service_account import ServiceAccountCredentials
 import time
 import json
+import random
 import os
+import re
+import atexit
+import logging
+import sqlite3
+import threading
+import contextlib
+import uuid
+import abc
+import contextvars
+from collections import deque, namedtuple
+from concurrent.futures import ThreadPoolExecutor
+
+try:
+    import pyarrow.parquet  # noqa: F401 (moteur Parquet de pandas, pour les instantanés sur disque)
+except ImportError:
+    pyarrow = None
 
 # --- 1. CONFIGURATION ET CONSTANTES GLOBALES ---
 
@@ -29,6 +48,127 @@ PRE_EXISTING_ACCOUNTS = {
 }
 SPREADSHEET_NAME = "Andihoo Time Tracker Database" # Assurez-vous que ce nom correspond à votre feuille Google Sheet
 
+def get_config(key, default=None):
+    """Lit un paramètre : variable d'environnement KLICK_<KEY>, puis section [klick] des secrets Streamlit."""
+    env_value = os.environ.get(f"KLICK_{key.upper()}")
+    if env_value is not None:
+        return env_value
+    try:
+        return st.secrets["klick"][key]
+    except Exception:
+        return default
+
+# Moteur de stockage : 'gsheets' (Google Sheets, par défaut) ou 'sqlite' (base locale indexée)
+STORAGE_BACKEND = get_config("storage_backend", "gsheets")
+SQLITE_PATH = get_config("sqlite_path", "klick.db")
+# Clé du classeur Google Sheets (évite la recherche Drive par nom) et fichier où elle est mémorisée
+SPREADSHEET_KEY = get_config("spreadsheet_key", "")
+SHEET_IDS_PATH = get_config("sheet_ids_path", ".klick_sheet_ids.json")
+# Durée de vie (secondes) des instantanés de feuilles partagés entre les sessions
+CACHE_TTL_SECONDS = float(get_config("cache_ttl_seconds", 30))
+# Synchronisation en arrière-plan : intervalle de rafraîchissement (0 : chaque session recharge elle-même)
+# et inactivité au-delà de laquelle une feuille n'est plus rafraîchie
+SYNC_INTERVAL_SECONDS = float(get_config("sync_interval_seconds", 10))
+SYNC_IDLE_SECONDS = float(get_config("sync_idle_seconds", 300))
+# Instantanés Parquet des feuilles (démarrage à chaud, analyses hors API) : dossier (vide : désactivés) et intervalle
+SNAPSHOT_DIR = get_config("snapshot_dir", "klick_snapshots")
+SNAPSHOT_INTERVAL_MINUTES = float(get_config("snapshot_interval_minutes", 15))
+# Écritures différées : les clics n'attendent plus l'API, la file est vidée en arrière-plan
+WRITE_BEHIND = str(get_config("write_behind", "true")).lower() in ("1", "true", "yes")
+FLUSH_INTERVAL_SECONDS = float(get_config("flush_interval_seconds", 0.5))
+FLUSH_BATCH_SIZE = int(get_config("flush_batch_size", 500))
+# Journal disque des écritures différées, rejoué au redémarrage (vide : pas de journal)
+JOURNAL_PATH = get_config("journal_path", "klick_journal.jsonl")
+# Synchronisation incrémentale des feuilles en ajout seul (Sessions, Logins)
+DELTA_SYNC = str(get_config("delta_sync", "true")).lower() in ("1", "true", "yes")
+DELTA_RECHECK_ROWS = int(get_config("delta_recheck_rows", 200))
+FULL_RESYNC_SECONDS = float(get_config("full_resync_seconds", 600))
+# Threads du chargement groupé des feuilles (rafraîchissements incrémentaux en parallèle du lot)
+BULK_LOAD_WORKERS = int(get_config("bulk_load_workers", 4))
+# Archivage : lignes fermées plus anciennes que l'horizon déplacées vers des feuilles mensuelles (0 = désactivé)
+ARCHIVE_HORIZON_DAYS = int(get_config("archive_horizon_days", 90))
+ARCHIVE_INTERVAL_HOURS = float(get_config("archive_interval_hours", 24))
+# Durée maximale d'une passe d'archivage : au-delà, son bail expire et une autre passe peut démarrer
+ARCHIVE_LEASE_SECONDS = 3600
+# Nombre de tâches affichées par page dans la liste
+TASK_PAGE_SIZE = int(get_config("task_page_size", 25))
+# Quotas Google Sheets par minute (compte de service) et nombre d'appels API conservés pour le tableau de bord
+API_READ_QUOTA_PER_MINUTE = int(get_config("api_read_quota_per_minute", 60))
+API_WRITE_QUOTA_PER_MINUTE = int(get_config("api_write_quota_per_minute", 60))
+API_METER_HISTORY = int(get_config("api_meter_history", 10000))
+# Limitation côté client : rafale autorisée par seau de jetons, nouvelles tentatives sur 429/5xx
+API_BURST = int(get_config("api_burst", 10))
+API_MAX_RETRIES = int(get_config("api_max_retries", 3))
+API_BACKOFF_MAX_SECONDS = float(get_config("api_backoff_max_seconds", 16))
+# Répartition entre classeurs : {"équipe/année" ou "équipe": clé du classeur} et {email: équipe} (JSON ou table des secrets)
+SHARD_SPREADSHEETS = get_config("shard_spreadsheets", "{}")
+SHARD_SPREADSHEETS = dict(SHARD_SPREADSHEETS) if not isinstance(SHARD_SPREADSHEETS, str) else json.loads(SHARD_SPREADSHEETS or "{}")
+SHARD_TEAMS = get_config("shard_teams", "{}")
+SHARD_TEAMS = dict(SHARD_TEAMS) if not isinstance(SHARD_TEAMS, str) else json.loads(SHARD_TEAMS or "{}")
+
+logger = logging.getLogger("klick")
+
+# Schéma commun à tous les moteurs : une feuille (ou table) par entité
+SHEET_HEADERS = {
+    'users': ['user_email', 'prénom', 'rôle', 'created_at'],
+    'tasks': ['task_id', 'titre', 'description', 'assigné_email', 'created_at', 'due_datetime', 'statut', 'total_time_seconds', 'created_by', 'closed_by', 'closed_at'],
+    'sessions': ['session_id', 'task_id', 'user_email', 'start_at', 'pause_at', 'resume_at', 'end_at', 'duration_seconds', 'pause_type'],
+    'logins': ['login_id', 'user_email', 'login_at', 'logout_at', 'total_logged_seconds'],
+    # Résumés additifs des lignes archivées (un jour, un utilisateur, une tâche, un type par ligne) et lot d'archivage
+    'archives': ['period', 'sheet', 'user_email', 'task_id', 'pause_type', 'rows', 'duration_seconds', 'paused_seconds', 'last_activity', 'batch'],
+    # Agrégats matérialisés pour le reporting, tenus à jour à chaque fermeture de session ou de connexion :
+    # une ligne par incrément (ID propre), additionnées par clé (jour et utilisateur, ou tâche) à la lecture
+    'daily_rollups': ['rollup_id', 'day', 'user_email', 'mission_seconds', 'mission_paused_seconds', 'global_pause_seconds', 'logged_seconds'],
+    'task_rollups': ['rollup_id', 'task_id', 'total_seconds', 'sessions', 'last_activity'],
+}
+WORKSHEET_TITLES = {
+    'users': 'Users', 'tasks': 'Tâches', 'sessions': 'Sessions', 'logins': 'Logins', 'archives': 'Archives',
+    'daily_rollups': 'Rollups_Jour', 'task_rollups': 'Rollups_Tâches',
+}
+# Feuilles créées automatiquement si elles n'existent pas encore dans le classeur
+OPTIONAL_SHEETS = {'archives', 'daily_rollups', 'task_rollups'}
+# Feuilles reconstruites depuis l'historique : vidées ensemble si l'en-tête de l'une d'elles a changé, puis
+# recalculées par `ensure_rollups`
+DERIVED_SHEETS = ('daily_rollups', 'task_rollups')
+# Clé primaire de chaque feuille (toujours la première colonne)
+SHEET_ID_COLUMNS = {
+    'users': 'user_email', 'tasks': 'task_id', 'sessions': 'session_id', 'logins': 'login_id', 'archives': 'period',
+    'daily_rollups': 'rollup_id', 'task_rollups': 'rollup_id',
+}
+# Feuilles en ajout seul : une ligne reste "ouverte" (modifiable) tant que ces colonnes sont vides
+OPEN_ROW_COLUMNS = {'sessions': ['pause_at', 'end_at'], 'logins': ['logout_at']}
+# Colonne qui date une ligne pour l'archivage mensuel
+ARCHIVE_TIME_COLUMNS = {'sessions': 'start_at', 'logins': 'login_at'}
+# Préfixe des feuilles des baux entre processus (une passe d'archivage à la fois), une par bail, créées au premier usage
+LEASE_TITLE = 'Verrous'
+# Feuilles réparties entre classeurs : (colonne email qui désigne l'équipe, colonne qui date la ligne ou None)
+SHARD_COLUMNS = {'tasks': ('assigné_email', None), 'sessions': ('user_email', 'start_at'), 'logins': ('user_email', 'login_at')}
+# Format unique des horodatages écrits dans les feuilles
+TIMESTAMP_FORMAT = '%Y-%m-%d %H:%M:%S'
+# Types appliqués une fois au chargement : horodatages -> datetime64 (vide -> NaT), durées et compteurs -> int64,
+# valeurs très répétées (emails, statuts, types) -> catégories. Les colonnes absentes restent telles que lues.
+SHEET_SCHEMAS = {
+    'users': {'rôle': 'category', 'created_at': 'datetime'},
+    'tasks': {
+        'assigné_email': 'category', 'created_at': 'datetime', 'due_datetime': 'datetime', 'statut': 'category',
+        'total_time_seconds': 'int', 'created_by': 'category', 'closed_by': 'category', 'closed_at': 'datetime',
+    },
+    'sessions': {
+        'task_id': 'category', 'user_email': 'category', 'start_at': 'datetime', 'pause_at': 'datetime',
+        'resume_at': 'datetime', 'end_at': 'datetime', 'duration_seconds': 'int', 'pause_type': 'category',
+    },
+    'logins': {'user_email': 'category', 'login_at': 'datetime', 'logout_at': 'datetime', 'total_logged_seconds': 'int'},
+    'archives': {
+        'sheet': 'category', 'user_email': 'category', 'task_id': 'category', 'pause_type': 'category',
+        'rows': 'int', 'duration_seconds': 'int', 'paused_seconds': 'int', 'last_activity': 'datetime',
+    },
+    'daily_rollups': {
+        'user_email': 'category', 'mission_seconds': 'int', 'mission_paused_seconds': 'int',
+        'global_pause_seconds': 'int', 'logged_seconds': 'int',
+    },
+    'task_rollups': {'total_seconds': 'int', 'sessions': 'int', 'last_activity': 'datetime'},
+}
+
 # --- 2. FONCTIONS D'UTILITAIRES ET DESIGN ---
 
 def load_high_tech_css():
@@ -130,17 +270,331 @@ def seconds_to_hms(seconds):
     except:
         return "00:00:00"
 
+def live_timer(base_seconds, label="EN COURS..."):
+    """Chronomètre qui s'incrémente dans le navigateur : aucun rerun serveur entre deux actions."""
+    components.html(f"""
+        <div id="klick-timer" style="font-family: sans-serif; font-weight: bold; color: #39ff14;">
+            {label} ({seconds_to_hms(base_seconds)})
+        </div>
+        <script>
+            const base = {int(base_seconds)};
+            const t0 = Date.now();
+            const el = document.getElementById('klick-timer');
+            const pad = n => String(n).padStart(2, '0');
+            setInterval(() => {{
+                const s = base + Math.floor((Date.now() - t0) / 1000);
+                el.textContent = `{label} (${{pad(Math.floor(s / 3600))}}:${{pad(Math.floor(s % 3600 / 60))}}:${{pad(s % 60)}})`;
+            }}, 1000);
+        </script>
+        """, height=30)
+
+def new_record_id(prefix):
+    """Identifiant unique d'une ligne : rejouer son ajout permet de reconnaître une ligne déjà écrite."""
+    return prefix + datetime.now().strftime('%Y%m%d%H%M%S') + uuid.uuid4().hex[:6]
+
 def format_timestamp(dt=None):
     """Formate la date et l'heure au format standard pour les logs."""
     dt = dt if dt else datetime.now()
-    return dt.strftime('%Y-%m-%d %H:%M:%S')
+    return dt.strftime(TIMESTAMP_FORMAT)
+
+def _typed_column(values, kind):
+    """Convertit une colonne lue (texte, nombres, cellules vides '') vers le type `kind` de SHEET_SCHEMAS."""
+    if kind == 'datetime':
+        if pd.api.types.is_datetime64_any_dtype(values):
+            return values
+        # Format fixe : analyse vectorisée, sans inférence ligne à ligne
+        return pd.to_datetime(values, format=TIMESTAMP_FORMAT, errors='coerce')
+    if kind == 'int':
+        if pd.api.types.is_integer_dtype(values):
+            return values
+        return pd.to_numeric(values, errors='coerce').fillna(0).round().astype('int64')
+    if isinstance(values.dtype, pd.CategoricalDtype):
+        return values
+    return values.fillna('').astype(str).astype('category')
+
+def apply_schema(sheet_name, df):
+    """Copie de `df` aux types de SHEET_SCHEMAS (appelée une fois par chargement, pas à chaque rendu)."""
+    schema = SHEET_SCHEMAS.get(sheet_name, {})
+    if not any(column in schema for column in df.columns):
+        return df
+    return pd.DataFrame(
+        {column: _typed_column(df[column], schema[column]) if column in schema else df[column] for column in df.columns},
+        index=df.index,
+    )
+
+def concat_typed(frames):
+    """Concatène des DataFrames typés en gardant les catégories (union des modalités de chaque colonne)."""
+    df = pd.concat(frames, ignore_index=True)
+    for column in frames[0].columns:
+        parts = [frame[column] for frame in frames]
+        if (all(isinstance(part.dtype, pd.CategoricalDtype) for part in parts)
+                and not isinstance(df[column].dtype, pd.CategoricalDtype)):
+            df[column] = pd.api.types.union_categoricals(parts, ignore_order=True)
+    return df
+
+def day_labels(stamps):
+    """Jour 'AAAA-MM-JJ' de chaque horodatage ('' si vide) ; chaque jour distinct n'est formaté qu'une fois."""
+    days = stamps.dt.normalize()
+    labels = {day: day.strftime('%Y-%m-%d') for day in pd.DatetimeIndex(days.dropna().unique())}
+    return days.map(labels).fillna('').astype(str)
+
+def text_frame(df):
+    """Copie de `df` en chaînes, comme dans la feuille (horodatages au format fixe, vides -> '')."""
+    columns = {}
+    for column in df.columns:
+        values = df[column]
+        if pd.api.types.is_datetime64_any_dtype(values):
+            columns[column] = values.dt.strftime(TIMESTAMP_FORMAT).fillna('')
+        else:
+            columns[column] = values.astype(object).where(values.notna(), '').astype(str)
+    return pd.DataFrame(columns, index=df.index)
 
 # --- 3. GESTION DES DONNÉES GOOGLE SHEETS (Back-end) ---
 
+def _a1_title(title):
+    """Nom de feuille protégé pour une plage A1 (les titres peuvent contenir des accents ou espaces)."""
+    return "'" + title.replace("'", "''") + "'"
+
+
+def _load_sheet_ids():
+    """IDs mémorisés du classeur et des feuilles (évite la recherche Drive par nom au redémarrage)."""
+    try:
+        with open(SHEET_IDS_PATH, encoding='utf-8') as f:
+            ids = json.load(f)
+    except (OSError, ValueError):
+        return {}
+    # Les IDs d'un autre classeur (nom changé dans la configuration) sont ignorés
+    return ids if ids.get('spreadsheet_name') == SPREADSHEET_NAME else {}
+
+
+def _save_sheet_ids(spreadsheet_key, worksheet_ids):
+    try:
+        with open(SHEET_IDS_PATH, 'w', encoding='utf-8') as f:
+            json.dump({
+                'spreadsheet_name': SPREADSHEET_NAME,
+                'spreadsheet_key': spreadsheet_key,
+                'worksheets': worksheet_ids,
+            }, f)
+    except OSError as e:
+        logger.warning("Impossible de mémoriser les IDs des feuilles (%s) : %s", SHEET_IDS_PATH, e)
+
+
+# Méthodes gspread comptées comme écritures dans les quotas (toutes les autres sont des lectures)
+API_WRITE_OPERATIONS = {'append_row', 'append_rows', 'batch_update', 'update', 'values_batch_update', 'add_worksheet'}
+# Écritures rejouables sans risque après une erreur 5xx (les ajouts et suppressions ne le sont pas)
+API_IDEMPOTENT_WRITES = {'update', 'values_batch_update'}
+
+# Action et utilisateur auxquels sont attribués les appels API (threads d'arrière-plan : valeur par défaut)
+_api_context = contextvars.ContextVar('klick_api_context', default=('arrière-plan', ''))
+
+ApiCall = namedtuple('ApiCall', ['at', 'sheet', 'operation', 'kind', 'action', 'user', 'seconds', 'ok'])
+
+
+def _api_kind(operation):
+    return 'écriture' if operation in API_WRITE_OPERATIONS else 'lecture'
+
+
+def _api_status(error):
+    """Code HTTP d'une APIError gspread (0 si inconnu)."""
+    return getattr(getattr(error, 'response', None), 'status_code', None) or 0
+
+
+def _permanent_error(error):
+    """Erreur qu'un nouvel essai ne corrigera pas : requête refusée (4xx hors 408/429) ou valeur invalide."""
+    status = _api_status(error)
+    return (400 <= status < 500 and status not in (408, 429)) or isinstance(error, (ValueError, TypeError))
+
+
+@contextlib.contextmanager
+def api_context(action, user=None):
+    """Attribue les appels API du bloc (ou de la fonction décorée) à une action et à l'utilisateur connecté."""
+    if user is None:
+        user = st.session_state.get('user_email') or ''
+    token = _api_context.set((action, user))
+    try:
+        yield
+    finally:
+        _api_context.reset(token)
+
+
+class ApiMeter:
+    """Journal borné des appels à l'API Google Sheets, toutes sessions confondues."""
+
+    def __init__(self, history):
+        self._lock = threading.Lock()
+        self._calls = deque(maxlen=history)
+
+    def record(self, sheet, operation, seconds, ok):
+        action, user = _api_context.get()
+        call = ApiCall(time.time(), sheet, operation, _api_kind(operation), action, user, seconds, ok)
+        with self._lock:
+            self._calls.append(call)
+
+    def calls(self):
+        with self._lock:
+            return list(self._calls)
+
+    def last_minute(self):
+        """Appels des 60 dernières secondes par type, à comparer aux quotas par minute."""
+        since = time.time() - 60
+        counts = {'lecture': 0, 'écriture': 0}
+        with self._lock:
+            for call in reversed(self._calls):
+                if call.at < since:
+                    break
+                counts[call.kind] += 1
+        return counts
+
+    def to_jsonl(self):
+        return ''.join(json.dumps(call._asdict(), ensure_ascii=False) + '\n' for call in self.calls())
+
+
+@st.cache_resource
+def get_api_meter():
+    """Compteur d'appels API unique pour le processus."""
+    return ApiMeter(API_METER_HISTORY)
+
+
+class RateLimiter:
+    """Seaux à jetons partagés par toutes les sessions : un pour les lectures, un pour les écritures.
+
+    Les écritures ne patientent jamais derrière les lectures ; les lectures d'arrière-plan (sans utilisateur)
+    laissent une réserve de jetons aux lectures déclenchées par les sessions.
+    """
+
+    def __init__(self, per_minute, burst):
+        self._cond = threading.Condition()
+        self._rates = {kind: max(1, quota) / 60 for kind, quota in per_minute.items()}
+        self._capacity = max(1, burst)
+        self._reserve = self._capacity // 2
+        self._tokens = {kind: float(self._capacity) for kind in per_minute}
+        self._updated = time.monotonic()
+
+    def _refill(self):
+        now = time.monotonic()
+        elapsed, self._updated = now - self._updated, now
+        for kind, rate in self._rates.items():
+            self._tokens[kind] = min(self._capacity, self._tokens[kind] + elapsed * rate)
+
+    def acquire(self, kind, background=False):
+        """Attend un jeton du seau `kind` ('lecture' ou 'écriture')."""
+        needed = 1 + (self._reserve if background and kind == 'lecture' else 0)
+        with self._cond:
+            while True:
+                self._refill()
+                if self._tokens[kind] >= needed:
+                    self._tokens[kind] -= 1
+                    return
+                self._cond.wait(timeout=(needed - self._tokens[kind]) / self._rates[kind])
+
+    def penalize(self, kind):
+        """Quota dépassé côté Google : le seau est vidé pour ralentir tout le processus."""
+        with self._cond:
+            self._refill()
+            self._tokens[kind] = min(self._tokens[kind], 0.0)
+
+
+@st.cache_resource
+def get_rate_limiter():
+    """Limiteur de débit unique pour le processus."""
+    return RateLimiter({'lecture': API_READ_QUOTA_PER_MINUTE, 'écriture': API_WRITE_QUOTA_PER_MINUTE}, API_BURST)
+
+
+class MeteredHandle:
+    """Poignée gspread (classeur ou feuille) par laquelle passent tous les appels API.
+
+    Chaque appel attend un jeton du limiteur de débit, est compté et chronométré, et est retenté
+    avec un délai exponentiel (plus gigue) sur 429 et, s'il peut être rejoué sans risque, sur 5xx.
+    """
+
+    def __init__(self, target, label, meter, limiter):
+        self._target = target
+        self._label = label
+        self._meter = meter
+        self._limiter = limiter
+
+    def _wrap(self, worksheet):
+        return MeteredHandle(worksheet, worksheet.title, self._meter, self._limiter)
+
+    def __getattr__(self, name):
+        attr = getattr(self._target, name)
+        if name == 'spreadsheet':
+            return MeteredHandle(attr, 'classeur', self._meter, self._limiter)
+        if not callable(attr):
+            return attr
+
+        kind = _api_kind(name)
+        replayable = kind == 'lecture' or name in API_IDEMPOTENT_WRITES
+
+        def metered(*args, **kwargs):
+            background = not _api_context.get()[1]
+            attempt = 0
+            while True:
+                self._limiter.acquire(kind, background)
+                started = time.perf_counter()
+                ok = False
+                try:
+                    result = attr(*args, **kwargs)
+                    ok = True
+                    break
+                except gspread.exceptions.APIError as e:
+                    status = _api_status(e)
+                    if attempt >= API_MAX_RETRIES or not (status == 429 or (status >= 500 and replayable)):
+                        raise
+                    if status == 429:
+                        self._limiter.penalize(kind)
+                finally:
+                    self._meter.record(self._label, name, time.perf_counter() - started, ok)
+                delay = min(API_BACKOFF_MAX_SECONDS, 2 ** attempt) + random.random()
+                attempt += 1
+                logger.warning("Google Sheets %s.%s : HTTP %s, nouvelle tentative %s dans %.1f s",
+                               self._label, name, status, attempt, delay)
+                time.sleep(delay)
+            # Feuilles ouvertes ou créées par le classeur : comptées elles aussi
+            return self._wrap(result) if isinstance(result, gspread.Worksheet) else result
+        return metered
+
+
+class LazyWorksheets:
+    """Poignées de feuilles résolues au premier usage : aucun appel API quand l'ID de la feuille est mémorisé."""
+
+    def __init__(self, spreadsheet, worksheet_ids, persist=True):
+        self.spreadsheet = spreadsheet
+        self.startup_timings = {}
+        # Seuls les IDs du classeur principal sont mémorisés sur disque
+        self._persist = persist
+        self._ids = dict(worksheet_ids)
+        self._handles = {}
+        self._lock = threading.Lock()
+
+    def __getitem__(self, sheet_name):
+        handle = self._handles.get(sheet_name)
+        if handle is not None:
+            return handle
+        with self._lock:
+            handle = self._handles.get(sheet_name)
+            if handle is None:
+                title = WORKSHEET_TITLES[sheet_name]
+                gid = self._ids.get(sheet_name)
+                if gid is None:
+                    handle = self.spreadsheet.worksheet(title)
+                    self._ids[sheet_name] = handle.id
+                    if self._persist:
+                        _save_sheet_ids(self.spreadsheet.id, self._ids)
+                else:
+                    handle = self.spreadsheet._wrap(
+                        gspread.Worksheet(self.spreadsheet._target, {'sheetId': gid, 'title': title, 'index': 0})
+                    )
+                self._handles[sheet_name] = handle
+        return handle
+
+
 @st.cache_resource
 def init_gspread():
     """Initialise la connexion à Google Sheets via les secrets Streamlit (sans fichier local)."""
     try:
+        timings = {}
+        started = time.perf_counter()
         scope = ['https://spreadsheets.google.com/feeds',
                  'https://www.googleapis.com/auth/drive']
 
@@ -158,18 +612,40 @@ def init_gspread():
 
         creds = ServiceAccountCredentials.from_json_keyfile_dict(creds_dict, scope)
         client = gspread.authorize(creds)
-        spreadsheet = client.open(SPREADSHEET_NAME)
-
-        # Chargement des feuilles (Worksheets)
-        sheets = {
-            'users': spreadsheet.worksheet('Users'),
-            'tasks': spreadsheet.worksheet('Tâches'),
-            'sessions': spreadsheet.worksheet('Sessions'),
-            'logins': spreadsheet.worksheet('Logins'),
-        }
-
-        # Assurer que les en-têtes sont corrects
-        _ensure_headers(sheets)
+        timings['credentials'] = time.perf_counter() - started
+
+        # Ouverture par clé (configurée ou mémorisée) ; la recherche Drive par nom n'a lieu qu'une fois
+        step = time.perf_counter()
+        saved_ids = _load_sheet_ids()
+        spreadsheet_key = SPREADSHEET_KEY or saved_ids.get('spreadsheet_key')
+        if spreadsheet_key:
+            try:
+                spreadsheet = client.open_by_key(spreadsheet_key)
+            except (SpreadsheetNotFound, gspread.exceptions.APIError):
+                # Clé mémorisée obsolète : on retombe sur la recherche par nom
+                if SPREADSHEET_KEY:
+                    raise
+                saved_ids = {}
+                spreadsheet = client.open(SPREADSHEET_NAME)
+        else:
+            spreadsheet = client.open(SPREADSHEET_NAME)
+        # Tous les appels passant par le classeur et ses feuilles sont limités et comptés
+        spreadsheet = MeteredHandle(spreadsheet, 'classeur', get_api_meter(), get_rate_limiter())
+        worksheet_ids = saved_ids.get('worksheets', {}) if saved_ids.get('spreadsheet_key') == spreadsheet.id else {}
+        if not saved_ids or saved_ids.get('spreadsheet_key') != spreadsheet.id:
+            _save_sheet_ids(spreadsheet.id, worksheet_ids)
+        timings['ouverture'] = time.perf_counter() - step
+
+        # Assurer que les en-têtes sont corrects (une seule lecture groupée pour les quatre feuilles)
+        step = time.perf_counter()
+        _ensure_headers(spreadsheet)
+        timings['en-têtes'] = time.perf_counter() - step
+
+        # Chargement des feuilles (Worksheets) : différé jusqu'au premier usage
+        sheets = LazyWorksheets(spreadsheet, worksheet_ids)
+        timings['total'] = time.perf_counter() - started
+        sheets.startup_timings = timings
+        logger.info("Démarrage Google Sheets : %s", ", ".join(f"{k}={v:.3f}s" for k, v in timings.items()))
 
         return client, sheets
     except SpreadsheetNotFound:
@@ -178,62 +654,1866 @@ def init_gspread():
     except Exception as e:
         st.error(f"Erreur lors de l'initialisation de Google Sheets. Vérifiez vos APIs et vos secrets. Détail: {e}")
         st.stop()
-def _ensure_headers(sheets):
-    """Vérifie et initialise les en-têtes si les feuilles sont vides."""
-    headers = {
-        'users': ['user_email', 'prénom', 'rôle', 'created_at'],
-        'tasks': ['task_id', 'titre', 'description', 'assigné_email', 'created_at', 'due_datetime', 'statut', 'total_time_seconds', 'created_by', 'closed_by', 'closed_at'],
-        'sessions': ['session_id', 'task_id', 'user_email', 'start_at', 'pause_at', 'resume_at', 'end_at', 'duration_seconds', 'pause_type'],
-        'logins': ['login_id', 'user_email', 'login_at', 'logout_at', 'total_logged_seconds'],
-    }
-    
-    for key, sheet in sheets.items():
+def _ensure_headers(spreadsheet, sheet_names=None):
+    """Vérifie et initialise les en-têtes si les feuilles sont vides (une lecture et au plus une écriture).
+
+    `sheet_names` limite la vérification à certaines feuilles (classeur de répartition), toutes créées au besoin.
+    """
+    titles = {key: WORKSHEET_TITLES[key] for key in (sheet_names or WORKSHEET_TITLES)}
+    creatable = OPTIONAL_SHEETS if sheet_names is None else set(titles)
+    try:
+        # Lire la première ligne de chaque feuille en un seul appel
+        ranges = [f"{_a1_title(title)}!1:1" for title in titles.values()]
         try:
-            # Lire la première ligne pour vérifier les en-têtes
-            current_headers = sheet.row_values(1)
-            if not current_headers or current_headers != headers[key]:
+            value_ranges = spreadsheet.values_batch_get(ranges).get('valueRanges', [])
+        except gspread.exceptions.APIError:
+            # Une feuille manque : seules les feuilles optionnelles (ex. Archives) sont créées
+            existing = {worksheet.title for worksheet in spreadsheet.worksheets()}
+            missing = [key for key, title in titles.items() if title not in existing]
+            if not missing or any(key not in creatable for key in missing):
+                raise
+            for key in missing:
+                spreadsheet.add_worksheet(WORKSHEET_TITLES[key], rows=1000, cols=len(SHEET_HEADERS[key]))
+            value_ranges = spreadsheet.values_batch_get(ranges).get('valueRanges', [])
+        fixes = []
+        current = {key: (value_range.get('values') or [[]])[0] for key, value_range in zip(titles, value_ranges)}
+        if any(current.get(key) not in ([], SHEET_HEADERS[key]) for key in DERIVED_SHEETS):
+            # Agrégats d'un ancien schéma : colonnes décalées, vidés pour être recalculés depuis l'historique
+            for key in DERIVED_SHEETS:
+                spreadsheet.values_clear(_a1_title(WORKSHEET_TITLES[key]))
+                current[key] = []
+        for key, current_headers in current.items():
+            if not current_headers or current_headers != SHEET_HEADERS[key]:
                 # Si vide ou incorrect, met à jour
-                sheet.update('A1', [headers[key]])
-        except Exception as e:
-            # En cas d'erreur (feuille inexistante, etc.), on arrête
-            st.error(f"Erreur critique lors de la vérification des en-têtes de la feuille '{key}'. Détail: {e}")
-            st.stop()
+                fixes.append({'range': f"{_a1_title(WORKSHEET_TITLES[key])}!A1", 'values': [SHEET_HEADERS[key]]})
+        if fixes:
+            spreadsheet.values_batch_update({'valueInputOption': 'RAW', 'data': fixes})
+    except Exception as e:
+        # En cas d'erreur (feuille inexistante, etc.), on arrête
+        st.error(f"Erreur critique lors de la vérification des en-têtes des feuilles {list(titles.values())}. Détail: {e}")
+        st.stop()
 
 
-def fetch_data(sheet_name):
-    """Récupère toutes les données d'une feuille."""
-    try:
-        _, sheets = init_gspread()
-        sheet = sheets.get(sheet_name)
-        if not sheet:
-             st.warning(f"Feuille {sheet_name} non trouvée.")
-             return pd.DataFrame()
+@st.cache_resource
+def open_shard(spreadsheet_key):
+    """Feuilles d'un classeur de répartition : ouvert au premier usage, puis partagé par toutes les sessions."""
+    client, _ = init_gspread()
+    spreadsheet = MeteredHandle(client.open_by_key(spreadsheet_key), 'classeur', get_api_meter(), get_rate_limiter())
+    _ensure_headers(spreadsheet, list(SHARD_COLUMNS))
+    return LazyWorksheets(spreadsheet, {}, persist=False)
+
+
+class RowNotFound(LookupError):
+    """Aucune ligne ne correspond à l'ID demandé."""
+
+
+class StorageBackend(abc.ABC):
+    """Interface commune des moteurs de stockage : une table par feuille (users, tasks, sessions, logins).
+
+    Les méthodes abstraites doivent toutes être fournies : un moteur incomplet échoue dès son instanciation.
+    """
+
+    name = 'base'
+
+    @abc.abstractmethod
+    def fetch(self, sheet_name):
+        """Retourne toutes les lignes de la feuille sous forme de DataFrame."""
+
+    def fetch_delta(self, sheet_name, df):
+        """Met à jour `df` (résultat d'un chargement précédent) ; par défaut, rechargement complet."""
+        return self.fetch(sheet_name)
+
+    def fetch_many(self, sheet_names):
+        """Charge plusieurs feuilles ({feuille: DataFrame}) ; par défaut, en parallèle sur un pool borné."""
+        with ThreadPoolExecutor(max_workers=max(1, BULK_LOAD_WORKERS)) as pool:
+            return dict(zip(sheet_names, pool.map(self.fetch, sheet_names)))
+
+    def fetch_all(self, sheet_name, years=None):
+        """Toute la feuille, y compris les lignes que `fetch` ne lit pas (maintenance : archivage, reconstruction).
 
-        data = sheet.get_all_records()
+        `years` ({'AAAA'}) limite la lecture aux années données quand le moteur répartit par année.
+        """
+        return self.fetch(sheet_name)
+
+    def fetch_past(self, sheet_name, years=None):
+        """Lignes des années `years` (None : toutes) que `fetch` ne lit pas, ou None s'il n'y en a pas."""
+        return None
+
+    @abc.abstractmethod
+    def append(self, sheet_name, values):
+        """Ajoute une ligne (liste de valeurs dans l'ordre des en-têtes) ; retourne sa position (voir `append_many`)."""
+
+    @abc.abstractmethod
+    def update(self, sheet_name, df, id_column, id_value, data_dict):
+        """Met à jour la ligne identifiée par `id_value` avec les valeurs de `data_dict`."""
+
+    def append_many(self, sheet_name, rows):
+        """Ajoute plusieurs lignes, dans l'ordre, en un seul appel si le moteur le permet.
+
+        Retourne la position de la première ligne ajoutée dans le DataFrame de `fetch` (None si inconnue),
+        ou (classeur, position dans ce classeur) pour un moteur réparti (voir `ShardedBackend`).
+        """
+        positions = [self.append(sheet_name, values) for values in rows]
+        return positions[0] if positions else None
+
+    @abc.abstractmethod
+    def update_many(self, sheet_name, updates):
+        """Applique des mises à jour regroupées {id_value: (id_column, data_dict)} ; retourne les IDs introuvables."""
+
+    def existing_ids(self, sheet_name, id_values):
+        """Sous-ensemble des IDs déjà présents dans la feuille (rejeu d'ajouts dont le résultat est incertain)."""
+        df = self.fetch(sheet_name)
+        present = set(df[SHEET_ID_COLUMNS[sheet_name]].astype(str))
+        return {v for v in id_values if str(v) in present}
+
+    @abc.abstractmethod
+    def archive_rows(self, sheet_name, month, rows, batch):
+        """Copie des lignes vers l'archive mensuelle de la feuille (`month` au format 'AAAA-MM'), marquées du lot `batch`."""
+
+    @abc.abstractmethod
+    def archived_batches(self, sheet_name, month):
+        """Lot de chaque ID déjà copié dans l'archive mensuelle ({ID: lot}, lot '' pour les lignes sans lot)."""
+
+    @abc.abstractmethod
+    def delete_rows(self, sheet_name, id_values):
+        """Supprime les lignes portant ces IDs, retrouvées au moment de la suppression."""
+
+    @abc.abstractmethod
+    def replace_rows(self, sheet_name, id_values, rows):
+        """Supprime les lignes portant ces IDs et ajoute `rows`, en une seule opération atomique (feuilles non réparties)."""
+
+    @abc.abstractmethod
+    def acquire_lease(self, name, owner, seconds):
+        """Prend le bail `name` pour `seconds` secondes ; False s'il est détenu par un autre `owner`."""
+
+    @abc.abstractmethod
+    def release_lease(self, name, owner):
+        """Rend le bail `name` s'il est détenu par `owner`."""
+
+    @contextlib.contextmanager
+    def lease(self, name, seconds):
+        """Bail exclusif entre processus le temps du bloc ; produit False si un autre processus le détient."""
+        owner = f"{os.getpid()}-{uuid.uuid4()}"
+        if not self.acquire_lease(name, owner, seconds):
+            yield False
+            return
+        try:
+            yield True
+        finally:
+            self.release_lease(name, owner)
+
+    def seed(self, sheet_name, df):
+        """Signale que `df` vient d'un instantané disque : à vérifier sur la feuille avant toute synchronisation incrémentale."""
+
+    def iter_chunks(self, sheet_name, chunk_rows):
+        """Parcourt la feuille par morceaux typés d'au plus `chunk_rows` lignes ; par défaut, découpe un `fetch` complet."""
+        df = self.fetch(sheet_name)
+        for start in range(0, len(df), chunk_rows):
+            yield df.iloc[start:start + chunk_rows]
+
+
+def _first_row_of_range(a1_range):
+    """Numéro de la première ligne d'une plage A1 renvoyée par l'API (ex. "Sessions!A12:I13" -> 12)."""
+    match = re.search(r'!\$?[A-Z]+\$?(\d+)', a1_range or '')
+    return int(match.group(1)) if match else None
+
+
+class GSheetsBackend(StorageBackend):
+    """Moteur Google Sheets : passe par les feuilles ouvertes par `init_gspread()`.
+
+    Un index ID -> numéro de ligne est tenu par feuille : construit au chargement, complété à chaque
+    ajout grâce à la plage renvoyée par l'API. Une mise à jour coûte ainsi un seul appel d'écriture.
+    """
+
+    name = 'gsheets'
+
+    def __init__(self, open_sheets=None):
+        # `open_sheets()` retourne les feuilles du classeur ; par défaut, le classeur principal d'`init_gspread()`
+        self._open_sheets = open_sheets
+        self._index_lock = threading.Lock()
+        self._row_index = {}
+        self._last_full_fetch = {}
+        # Feuilles réchauffées depuis un instantané disque, pas encore vérifiées sur la feuille
+        self._seeded = set()
+        # Les en-têtes sont garantis par `_ensure_headers` : la position des colonnes est connue d'avance
+        self._header_cols = {
+            sheet_name: {column: pos for pos, column in enumerate(headers, start=1)}
+            for sheet_name, headers in SHEET_HEADERS.items()
+        }
+
+    def _sheet(self, sheet_name):
+        sheets = self._open_sheets() if self._open_sheets else init_gspread()[1]
+        return sheets[sheet_name]
+
+    def indexed_ids(self, sheet_name, id_values):
+        """IDs déjà présents dans l'index en mémoire (aucun appel API)."""
+        with self._index_lock:
+            index = self._row_index.get(sheet_name) or {}
+            return {v for v in id_values if str(v) in index}
+
+    def _build_index(self, sheet_name, ids):
+        """(Re)construit l'index à partir des IDs de la feuille, ligne 2 comprise (la première occurrence l'emporte)."""
+        index = {}
+        for row_num, value in enumerate(ids, start=2):
+            index.setdefault(str(value), row_num)
+        with self._index_lock:
+            self._row_index[sheet_name] = index
+
+    def _index_appended(self, sheet_name, rows, response):
+        """Complète l'index avec les lignes ajoutées ; retourne le numéro de la première (None si inconnu)."""
+        first_row = _first_row_of_range(((response or {}).get('updates') or {}).get('updatedRange'))
+        with self._index_lock:
+            index = self._row_index.get(sheet_name)
+            if index is None:
+                return first_row
+            if first_row is None:
+                # Réponse inattendue : l'index sera reconstruit à la prochaine recherche
+                del self._row_index[sheet_name]
+                return None
+            for offset, values in enumerate(rows):
+                index.setdefault(str(values[0]), first_row + offset)
+        return first_row
+
+    def _locate(self, sheet_name, id_values):
+        """Numéros de ligne des IDs ; relit la colonne des IDs une seule fois si l'un d'eux est inconnu."""
+        with self._index_lock:
+            index = self._row_index.get(sheet_name)
+        if index is None or any(str(v) not in index for v in id_values):
+            # Ligne ajoutée hors de l'application (ou index jamais construit)
+            self._build_index(sheet_name, self._sheet(sheet_name).col_values(1)[1:])
+            with self._index_lock:
+                index = self._row_index[sheet_name]
+        return {v: index.get(str(v)) for v in id_values}
+
+    def _cells(self, sheet_name, row_num, data_dict):
+        header_cols = self._header_cols[sheet_name]
+        return [
+            {'range': gspread.utils.rowcol_to_a1(row_num, header_cols[column]), 'values': [[_to_python(value)]]}
+            for column, value in data_dict.items() if column in header_cols
+        ]
+
+    def _loaded(self, sheet_name, df):
+        """Typage des colonnes, tenue de l'index et de la date du dernier chargement complet."""
+        df = apply_schema(sheet_name, df)
+        self._build_index(sheet_name, df[SHEET_ID_COLUMNS[sheet_name]].tolist())
+        with self._index_lock:
+            self._last_full_fetch[sheet_name] = time.monotonic()
+            self._seeded.discard(sheet_name)
+        return df
+
+    def fetch(self, sheet_name):
+        data = self._sheet(sheet_name).get_all_records()
         df = pd.DataFrame(data)
-        
+
         # S'assurer que les colonnes existent, même si la feuille est vide
         if df.empty:
-            headers = {
-                'users': ['user_email', 'prénom', 'rôle', 'created_at'],
-                'tasks': ['task_id', 'titre', 'description', 'assigné_email', 'created_at', 'due_datetime', 'statut', 'total_time_seconds', 'created_by', 'closed_by', 'closed_at'],
-                'sessions': ['session_id', 'task_id', 'user_email', 'start_at', 'pause_at', 'resume_at', 'end_at', 'duration_seconds', 'pause_type'],
-                'logins': ['login_id', 'user_email', 'login_at', 'logout_at', 'total_logged_seconds'],
-            }
-            return pd.DataFrame(columns=headers.get(sheet_name, []))
+            df = pd.DataFrame(columns=SHEET_HEADERS[sheet_name])
+        return self._loaded(sheet_name, df)
+
+    def fetch_many(self, sheet_names):
+        """Toutes les feuilles demandées en un seul appel `values_batch_get`."""
+        spreadsheet = self._sheet(sheet_names[0]).spreadsheet
+        # Plages bornées aux colonnes du schéma : une cellule à droite (note, calcul) n'est pas lue
+        ranges = [
+            f"{_a1_title(WORKSHEET_TITLES[sheet_name])}!A:"
+            + re.sub(r'\d', '', gspread.utils.rowcol_to_a1(1, len(SHEET_HEADERS[sheet_name])))
+            for sheet_name in sheet_names
+        ]
+        value_ranges = spreadsheet.values_batch_get(ranges).get('valueRanges', [])
+        frames = {}
+        for sheet_name, value_range in zip(sheet_names, value_ranges):
+            headers = SHEET_HEADERS[sheet_name]
+            values = value_range.get('values') or []
+            # Colonnes identifiées par l'en-tête de la feuille, comme get_all_records (une colonne déplacée reste à sa place)
+            sheet_headers = [str(h) for h in values[0]] if values else headers
+            if len(set(sheet_headers)) != len(sheet_headers):
+                sheet_headers = headers[:len(sheet_headers)]
+            width = len(sheet_headers)
+            # Même conversion que get_all_records : nombres convertis, cellules vides -> ''
+            rows = [
+                gspread.utils.numericise_all(list(row[:width]) + [''] * (width - len(row)))
+                for row in values[1:]
+            ]
+            df = pd.DataFrame(rows, columns=sheet_headers).reindex(columns=headers, fill_value='')
+            frames[sheet_name] = self._loaded(sheet_name, df)
+        return frames
+
+    def seed(self, sheet_name, df):
+        # Instantané d'âge quelconque : ni index ni date de chargement complet, seulement une vérification à faire
+        with self._index_lock:
+            self._seeded.add(sheet_name)
+
+    def iter_chunks(self, sheet_name, chunk_rows):
+        """Lecture par plages de `chunk_rows` lignes : un seul morceau en mémoire à la fois."""
+        headers = SHEET_HEADERS[sheet_name]
+        last_column = re.sub(r'\d', '', gspread.utils.rowcol_to_a1(1, len(headers)))
+        start = 2
+        while True:
+            values = self._sheet(sheet_name).get(f"A{start}:{last_column}{start + chunk_rows - 1}")
+            rows = [gspread.utils.numericise_all(list(row) + [''] * (len(headers) - len(row))) for row in values]
+            if rows:
+                yield apply_schema(sheet_name, pd.DataFrame(rows, columns=headers))
+            if len(values) < chunk_rows:
+                return
+            start += chunk_rows
+
+    def fetch_delta(self, sheet_name, df):
+        """Synchronisation incrémentale : ne relit que les nouvelles lignes et les lignes récentes encore ouvertes."""
+        headers = SHEET_HEADERS[sheet_name]
+        open_columns = OPEN_ROW_COLUMNS.get(sheet_name)
+        if open_columns is None or list(df.columns) != headers:
+            return self.fetch(sheet_name)
+        with self._index_lock:
+            last_full = self._last_full_fetch.get(sheet_name)
+            seeded = sheet_name in self._seeded
+            self._seeded.discard(sheet_name)
+        if last_full is None and seeded:
+            # Instantané disque : ses positions ne sont adoptées que si la colonne des IDs de la feuille commence par les siennes
+            ids = [str(v) for v in self._sheet(sheet_name).col_values(1)[1:]]
+            if ids[:len(df)] != df[SHEET_ID_COLUMNS[sheet_name]].astype(str).tolist():
+                return self.fetch(sheet_name)
+            self._build_index(sheet_name, ids)
+            last_full = time.monotonic()
+            with self._index_lock:
+                self._last_full_fetch[sheet_name] = last_full
+        if last_full is None or time.monotonic() - last_full > FULL_RESYNC_SECONDS:
+            return self.fetch(sheet_name)
+
+        # Première ligne à relire : la plus ancienne ligne ouverte de la fenêtre récente, sinon la fin de la feuille
+        synced = len(df)
+        window = df.iloc[max(0, synced - DELTA_RECHECK_ROWS):]
+        is_open = window[open_columns].isna().all(axis=1).to_numpy()
+        start = int(window.index[is_open][0]) if is_open.any() else synced
+
+        # La ligne précédant `start` est relue comme repère : si son ID a changé, des lignes ont disparu
+        # avant `start` (suppression manuelle, archivage), même si des ajouts compensent : resynchronisation complète
+        anchor = max(start - 1, 0)
+        last_column = re.sub(r'\d', '', gspread.utils.rowcol_to_a1(1, len(headers)))
+        values = self._sheet(sheet_name).get(f"A{anchor + 2}:{last_column}")
+        if anchor < start:
+            expected = str(df[SHEET_ID_COLUMNS[sheet_name]].iloc[anchor])
+            if not values or not values[0] or str(gspread.utils.numericise(values[0][0])) != expected:
+                return self.fetch(sheet_name)
+            values = values[1:]
+
+        # Même conversion que get_all_records : nombres convertis, cellules vides -> ''
+        rows = [gspread.utils.numericise_all(list(row) + [''] * (len(headers) - len(row))) for row in values]
+        with self._index_lock:
+            index = self._row_index.get(sheet_name)
+            if index is not None:
+                # Les lignes à partir de `start` sont remplacées par celles relues (la première occurrence l'emporte)
+                for id_value in [k for k, row_num in index.items() if row_num >= start + 2]:
+                    del index[id_value]
+                for offset, row in enumerate(rows):
+                    index.setdefault(str(row[0]), start + 2 + offset)
+        tail = apply_schema(sheet_name, pd.DataFrame(rows, columns=headers))
+        previous = df.iloc[start:].reset_index(drop=True)
+        if len(tail) == len(previous) and text_frame(tail).equals(text_frame(previous)):
+            # Ni ajout ni modification : l'instantané est rendu tel quel et garde sa version (voir `SnapshotCache._store`)
+            return df
+        return concat_typed([df.iloc[:start], tail])
+
+    def append(self, sheet_name, values):
+        return self.append_many(sheet_name, [values])
+
+    def update(self, sheet_name, df, id_column, id_value, data_dict):
+        # La ligne vient de l'index et non de `df` : un DataFrame périmé ne peut plus viser la mauvaise ligne
+        row_num = self._locate(sheet_name, [id_value])[id_value]
+        if row_num is None:
+            raise RowNotFound(id_value)
+        cells = self._cells(sheet_name, row_num, data_dict)
+        if cells:
+            # Seules les cellules modifiées sont écrites, en un seul appel
+            self._sheet(sheet_name).batch_update(cells)
+
+    def append_many(self, sheet_name, rows):
+        rows = [[_to_python(v) for v in values] for values in rows]
+        response = self._sheet(sheet_name).append_rows(rows)
+        first_row = self._index_appended(sheet_name, rows, response)
+        # Ligne 1 = en-têtes : la ligne 2 est la position 0 du DataFrame
+        return first_row - 2 if first_row is not None else None
+
+    def existing_ids(self, sheet_name, id_values):
+        rows = self._locate(sheet_name, list(id_values))
+        return {v for v, row_num in rows.items() if row_num is not None}
+
+    def update_many(self, sheet_name, updates):
+        rows = self._locate(sheet_name, list(updates))
+        missing = []
+        cells = []
+        for id_value, (_, data_dict) in updates.items():
+            if rows[id_value] is None:
+                missing.append(id_value)
+                continue
+            cells.extend(self._cells(sheet_name, rows[id_value], data_dict))
+        if cells:
+            # Toutes les cellules modifiées de la feuille en un seul appel
+            self._sheet(sheet_name).batch_update(cells)
+        return missing
+
+    def archive_rows(self, sheet_name, month, rows, batch):
+        spreadsheet = self._sheet(sheet_name).spreadsheet
+        title = f"{WORKSHEET_TITLES[sheet_name]}_{month.replace('-', '_')}"
+        rows = [[_to_python(v) for v in values] + [batch] for values in rows]
+        try:
+            spreadsheet.worksheet(title).append_rows(rows)
+        except WorksheetNotFound:
+            headers = SHEET_HEADERS[sheet_name] + ['batch']
+            archive = spreadsheet.add_worksheet(title, rows=len(rows) + 1, cols=len(headers))
+            archive.update('A1', [headers] + rows)
+
+    def archived_batches(self, sheet_name, month):
+        title = f"{WORKSHEET_TITLES[sheet_name]}_{month.replace('-', '_')}"
+        try:
+            archive = self._sheet(sheet_name).spreadsheet.worksheet(title)
+        except WorksheetNotFound:
+            return {}
+        # Colonne des IDs et colonne du lot (après les en-têtes de la feuille) en un appel
+        batch_column = re.sub(r'\d', '', gspread.utils.rowcol_to_a1(1, len(SHEET_HEADERS[sheet_name]) + 1))
+        ids, batches = archive.batch_get(['A2:A', f"{batch_column}2:{batch_column}"])
+        batches = list(batches) + [[]] * (len(ids) - len(batches))
+        return {str(row[0]): str(batch[0]) if batch else '' for row, batch in zip(ids, batches) if row}
+
+    def delete_rows(self, sheet_name, id_values):
+        self._batch_rewrite(sheet_name, id_values, [])
+
+    def replace_rows(self, sheet_name, id_values, rows):
+        self._batch_rewrite(sheet_name, id_values, rows)
+
+    def _batch_rewrite(self, sheet_name, id_values, rows):
+        """Suppressions et ajouts en un seul `batchUpdate`, que l'API applique entièrement ou pas du tout."""
+        sheet = self._sheet(sheet_name)
+        # Positions relues juste avant la suppression : l'index en mémoire peut dater d'avant une autre suppression
+        wanted = {str(v) for v in id_values}
+        row_nums = [row_num for row_num, value in enumerate(sheet.col_values(1)[1:], start=2) if str(value) in wanted]
+        # Plages contiguës supprimées de bas en haut : une suppression ne décale pas les suivantes
+        spans = []
+        for row_num in sorted(row_nums, reverse=True):
+            if spans and spans[-1][0] == row_num + 1:
+                spans[-1][0] = row_num
+            else:
+                spans.append([row_num, row_num])
+        requests = [
+            {'deleteDimension': {'range': {
+                'sheetId': sheet.id, 'dimension': 'ROWS', 'startIndex': first - 1, 'endIndex': last,
+            }}}
+            for first, last in spans
+        ]
+        if rows:
+            requests.append({'appendCells': {
+                'sheetId': sheet.id, 'fields': 'userEnteredValue',
+                'rows': [{'values': [_cell_data(v) for v in values]} for values in rows],
+            }})
+        if requests:
+            sheet.spreadsheet.batch_update({'requests': requests})
+        # Les numéros de ligne ont changé : index et synchronisation incrémentale repartent d'un chargement complet
+        with self._index_lock:
+            self._row_index.pop(sheet_name, None)
+            self._last_full_fetch.pop(sheet_name, None)
+
+    def _lease_sheet(self, name):
+        """Feuille des demandes du bail `name` (une par bail : seul son détenteur y supprime des lignes)."""
+        spreadsheet = self._sheet('archives').spreadsheet
+        title = f"{LEASE_TITLE}_{name}"
+        try:
+            return spreadsheet.worksheet(title)
+        except WorksheetNotFound:
+            pass
+        try:
+            sheet = spreadsheet.add_worksheet(title, rows=100, cols=2)
+            sheet.update('A1', [['owner', 'expires_at']])
+            return sheet
+        except gspread.exceptions.APIError:
+            # Créée entre-temps par un autre processus
+            return spreadsheet.worksheet(title)
+
+    def _lease_claims(self, sheet):
+        """Demandes encore valides du bail, dans l'ordre d'ajout : [(numéro de ligne, demandeur)], la première le détient."""
+        now = time.time()
+        return [(row_num, row[0]) for row_num, row in enumerate(sheet.get_all_values()[1:], start=2)
+                if len(row) >= 2 and row[0] and _as_float(row[1]) > now]
+
+    def _withdraw_claim(self, sheet, owner):
+        # Cellule retrouvée par sa valeur et non par sa position : sans risque pendant une suppression du détenteur
+        sheet.spreadsheet.batch_update({'requests': [{'findReplace': {
+            'find': owner, 'replacement': '', 'matchEntireCell': True, 'sheetId': sheet.id,
+        }}]})
+
+    def acquire_lease(self, name, owner, seconds):
+        # Pas d'écriture conditionnelle dans Sheets : chaque candidat ajoute sa demande, la première valide l'emporte
+        sheet = self._lease_sheet(name)
+        if any(holder != owner for _, holder in self._lease_claims(sheet)):
+            return False
+        sheet.append_rows([[owner, time.time() + seconds]])
+        claims = self._lease_claims(sheet)
+        if claims and claims[0][1] == owner:
+            return True
+        # Course perdue : la demande est retirée, sinon elle bloquerait les passes suivantes jusqu'à son expiration
+        self._withdraw_claim(sheet, owner)
+        return False
+
+    def release_lease(self, name, owner):
+        sheet = self._lease_sheet(name)
+        claims = self._lease_claims(sheet)
+        if not claims or claims[0][1] != owner:
+            # Bail expiré entre-temps : seule la demande est retirée, le détenteur suivant fera le ménage
+            self._withdraw_claim(sheet, owner)
+            return
+        # Toutes les demandes au-dessus de celle du détenteur sont expirées ou retirées : supprimées avec elle
+        sheet.spreadsheet.batch_update({'requests': [{'deleteDimension': {'range': {
+            'sheetId': sheet.id, 'dimension': 'ROWS', 'startIndex': 1, 'endIndex': claims[0][0],
+        }}}]})
+
 
+def _cell_data(value):
+    """Cellule d'une requête `appendCells`, écrite comme `append_rows` en mode RAW (nombres et textes tels quels)."""
+    value = _to_python(value)
+    if value is None or value == '':
+        return {}
+    if isinstance(value, bool):
+        return {'userEnteredValue': {'boolValue': value}}
+    if isinstance(value, (int, float)):
+        return {'userEnteredValue': {'numberValue': value}}
+    return {'userEnteredValue': {'stringValue': str(value)}}
+
+
+def _sql_name(name):
+    """Protège un nom de colonne/table SQLite (les en-têtes contiennent des accents)."""
+    return '"' + name.replace('"', '""') + '"'
+
+
+def _to_python(value):
+    """Convertit les scalaires numpy/pandas en types Python natifs (sqlite3, JSON de l'API).
+
+    Les horodatages sont réécrits au format des feuilles, les horodatages vides (NaT) en cellule vide.
+    """
+    if value is pd.NaT:
+        return ''
+    if isinstance(value, datetime):
+        return value.strftime(TIMESTAMP_FORMAT)
+    if hasattr(value, 'item'):
+        return value.item()
+    return value
+
+
+class SQLiteBackend(StorageBackend):
+    """Moteur SQLite local : mêmes quatre tables, indexées sur les clés et les emails."""
+
+    name = 'sqlite'
+
+    # Index secondaires utilisés par les lectures ciblées (par tâche, par utilisateur)
+    SECONDARY_INDEXES = {
+        'tasks': ['assigné_email', 'statut'],
+        'sessions': ['task_id', 'user_email'],
+        'logins': ['user_email'],
+    }
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._create_schema()
+
+    def _create_schema(self):
+        with self._lock, self._conn:
+            if any(self._columns(name) not in ([], SHEET_HEADERS[name]) for name in DERIVED_SHEETS):
+                # Agrégats d'un ancien schéma (insertions positionnelles) : recalculés depuis l'historique
+                for name in DERIVED_SHEETS:
+                    self._conn.execute(f'DROP TABLE IF EXISTS {name}')
+            for sheet_name, headers in SHEET_HEADERS.items():
+                # Colonnes sans type déclaré : les valeurs gardent leur type (comme get_all_records)
+                columns = ', '.join(_sql_name(h) for h in headers)
+                self._conn.execute(f'CREATE TABLE IF NOT EXISTS {sheet_name} ({columns})')
+                self._add_missing_columns(sheet_name, headers)
+                for column in [SHEET_ID_COLUMNS[sheet_name]] + self.SECONDARY_INDEXES.get(sheet_name, []):
+                    index_name = _sql_name(f'idx_{sheet_name}_{column}')
+                    self._conn.execute(f'CREATE INDEX IF NOT EXISTS {index_name} ON {sheet_name} ({_sql_name(column)})')
+            self._conn.execute('CREATE TABLE IF NOT EXISTS leases (name PRIMARY KEY, owner, expires_at)')
+
+    def _columns(self, table):
+        """Colonnes de la table, dans l'ordre ([] si elle n'existe pas)."""
+        return [row[1] for row in self._conn.execute(f'PRAGMA table_info({_sql_name(table)})')]
+
+    def _add_missing_columns(self, table, headers):
+        """Colonnes ajoutées au schéma depuis la création de la table (ex. lot des archives)."""
+        existing = set(self._columns(table))
+        for header in headers:
+            if header not in existing:
+                self._conn.execute(f'ALTER TABLE {_sql_name(table)} ADD COLUMN {_sql_name(header)}')
+
+    def fetch(self, sheet_name):
+        with self._lock:
+            df = pd.read_sql_query(f'SELECT * FROM {sheet_name} ORDER BY rowid', self._conn)
+        return apply_schema(sheet_name, df)
+
+    def iter_chunks(self, sheet_name, chunk_rows):
+        # Connexion dédiée : le curseur reste ouvert entre deux morceaux sans bloquer l'application
+        conn = sqlite3.connect(self.path)
+        try:
+            for chunk in pd.read_sql_query(f'SELECT * FROM {sheet_name} ORDER BY rowid', conn, chunksize=chunk_rows):
+                yield apply_schema(sheet_name, chunk)
+        finally:
+            conn.close()
+
+    def append(self, sheet_name, values):
+        return self.append_many(sheet_name, [values])
+
+    def _count(self, sheet_name):
+        return self._conn.execute(f'SELECT COUNT(*) FROM {sheet_name}').fetchone()[0]
+
+    def _update_first(self, sheet_name, id_column, id_value, data_dict):
+        """Met à jour la première ligne portant l'ID ; retourne False si aucune ligne ne correspond."""
+        columns = [c for c in data_dict if c in SHEET_HEADERS[sheet_name]]
+        if not columns:
+            return True
+        assignments = ', '.join(f'{_sql_name(c)} = ?' for c in columns)
+        params = [_to_python(data_dict[c]) for c in columns] + [_to_python(id_value)]
+        # Comme pour Google Sheets, seule la première ligne correspondante est modifiée
+        query = (
+            f'UPDATE {sheet_name} SET {assignments} WHERE rowid = '
+            f'(SELECT rowid FROM {sheet_name} WHERE {_sql_name(id_column)} = ? ORDER BY rowid LIMIT 1)'
+        )
+        return self._conn.execute(query, params).rowcount > 0
+
+    def update(self, sheet_name, df, id_column, id_value, data_dict):
+        with self._lock, self._conn:
+            found = self._update_first(sheet_name, id_column, id_value, data_dict)
+        if not found:
+            raise RowNotFound(id_value)
+
+    def append_many(self, sheet_name, rows):
+        placeholders = ', '.join('?' for _ in SHEET_HEADERS[sheet_name])
+        with self._lock, self._conn:
+            self._conn.executemany(
+                f'INSERT INTO {sheet_name} VALUES ({placeholders})',
+                [[_to_python(v) for v in values] for values in rows]
+            )
+            # Les lignes ajoutées sont les dernières dans l'ordre des rowid (voir `fetch`)
+            return self._count(sheet_name) - len(rows)
+
+    def existing_ids(self, sheet_name, id_values):
+        id_values = list(id_values)
+        if not id_values:
+            return set()
+        id_column = _sql_name(SHEET_ID_COLUMNS[sheet_name])
+        placeholders = ', '.join('?' for _ in id_values)
+        with self._lock:
+            found = self._conn.execute(
+                f'SELECT {id_column} FROM {sheet_name} WHERE {id_column} IN ({placeholders})',
+                [_to_python(v) for v in id_values]
+            ).fetchall()
+        return {r[0] for r in found}
+
+    def update_many(self, sheet_name, updates):
+        with self._lock, self._conn:
+            return [
+                id_value for id_value, (id_column, data_dict) in updates.items()
+                if not self._update_first(sheet_name, id_column, id_value, data_dict)
+            ]
+
+    def archive_rows(self, sheet_name, month, rows, batch):
+        table = f"{sheet_name}_{month.replace('-', '_')}"
+        headers = SHEET_HEADERS[sheet_name] + ['batch']
+        columns = ', '.join(_sql_name(h) for h in headers)
+        placeholders = ', '.join('?' for _ in headers)
+        with self._lock, self._conn:
+            self._conn.execute(f'CREATE TABLE IF NOT EXISTS {_sql_name(table)} ({columns})')
+            self._add_missing_columns(table, headers)
+            self._conn.executemany(
+                f'INSERT INTO {_sql_name(table)} ({columns}) VALUES ({placeholders})',
+                [[_to_python(v) for v in values] + [batch] for values in rows]
+            )
+
+    def archived_batches(self, sheet_name, month):
+        table = f"{sheet_name}_{month.replace('-', '_')}"
+        with self._lock:
+            if self._conn.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (table,)).fetchone() is None:
+                return {}
+            self._add_missing_columns(table, ['batch'])
+            rows = self._conn.execute(
+                f'SELECT {_sql_name(SHEET_ID_COLUMNS[sheet_name])}, batch FROM {_sql_name(table)}'
+            ).fetchall()
+        return {str(id_value): batch or '' for id_value, batch in rows}
+
+    def delete_rows(self, sheet_name, id_values):
+        self.replace_rows(sheet_name, id_values, [])
+
+    def replace_rows(self, sheet_name, id_values, rows):
+        placeholders = ', '.join('?' for _ in SHEET_HEADERS[sheet_name])
+        with self._lock, self._conn:
+            self._conn.executemany(
+                f'DELETE FROM {sheet_name} WHERE {_sql_name(SHEET_ID_COLUMNS[sheet_name])} = ?',
+                [(_to_python(v),) for v in id_values]
+            )
+            self._conn.executemany(
+                f'INSERT INTO {sheet_name} VALUES ({placeholders})',
+                [[_to_python(v) for v in values] for values in rows]
+            )
+
+    def acquire_lease(self, name, owner, seconds):
+        now = time.time()
+        # Une seule transaction : SQLite sérialise les écritures entre processus
+        with self._lock, self._conn:
+            self._conn.execute('DELETE FROM leases WHERE name = ? AND expires_at < ?', (name, now))
+            self._conn.execute('INSERT OR IGNORE INTO leases VALUES (?, ?, ?)', (name, owner, now + seconds))
+            row = self._conn.execute('SELECT owner FROM leases WHERE name = ?', (name,)).fetchone()
+        return row is not None and row[0] == owner
+
+    def release_lease(self, name, owner):
+        with self._lock, self._conn:
+            self._conn.execute('DELETE FROM leases WHERE name = ? AND owner = ?', (name, owner))
+
+
+class ShardRouter:
+    """Classeur de chaque ligne des feuilles réparties : équipe de l'utilisateur, puis année de la ligne.
+
+    Le classeur 'équipe/année' est préféré, puis 'équipe' ; une ligne sans classeur configuré reste
+    dans le classeur principal (None).
+    """
+
+    def __init__(self, spreadsheets, teams):
+        self.spreadsheets = dict(spreadsheets)
+        self.teams = {email.lower(): team for email, team in teams.items()}
+
+    def keys(self, sheet_name, teams=None, years=None):
+        """Classeurs d'une feuille répartie, le principal (None) d'abord, puis ceux des équipes `teams` et,
+        pour les classeurs 'équipe/année', des années `years` (None : toutes).
+
+        Seules les feuilles datées (Sessions, Logins) sont réparties par année : Tâches ignore ces classeurs.
+        """
+        dated = SHARD_COLUMNS[sheet_name][1] is not None
+        keys = [None]
+        for name, key in self.spreadsheets.items():
+            team, _, year = name.partition('/')
+            if teams is not None and team not in teams:
+                continue
+            if year and (not dated or (years is not None and year not in years)):
+                continue
+            keys.append(key)
+        return list(dict.fromkeys(keys))
+
+    def shard_for(self, sheet_name, values):
+        email_column, time_column = SHARD_COLUMNS[sheet_name]
+        headers = SHEET_HEADERS[sheet_name]
+        team = self.teams.get(str(values[headers.index(email_column)]).lower())
+        if team is None:
+            return None
+        if time_column is not None:
+            year = str(_to_python(values[headers.index(time_column)]))[:4]
+            if f"{team}/{year}" in self.spreadsheets:
+                return self.spreadsheets[f"{team}/{year}"]
+        return self.spreadsheets.get(team)
+
+
+class ShardedBackend(StorageBackend):
+    """Moteur Google Sheets réparti : Tâches, Sessions et Logins sur un classeur par équipe (et par année).
+
+    Chaque classeur a son propre quota de cellules et ses feuilles restent petites. Le classeur principal
+    garde les autres feuilles et les lignes antérieures à la répartition. Une écriture va au classeur de la
+    ligne. Les classeurs sont ouverts au premier usage et leurs poignées sont partagées.
+
+    Les lectures des sessions (`fetch`, `fetch_many`, `fetch_delta`) ne voient que l'année en cours : le
+    chargement complet lit en parallèle le classeur principal et les classeurs de l'année de toutes les
+    équipes, puis la synchronisation incrémentale ne relit que ceux de l'équipe qui lit (voir `_scope`).
+    Les années passées ne sont lues que par le reporting (`fetch_past`, élagué par années) et la
+    maintenance (`fetch_all`, `iter_chunks`).
+
+    Le découpage d'un DataFrame combiné, [(classeur, nombre de lignes)], est porté par le DataFrame lui-même
+    (`df.attrs['shard_segments']`) : un DataFrame sans découpage ou dont le découpage ne couvre pas toutes
+    les lignes n'est jamais redécoupé.
+    """
+
+    name = 'gsheets'
+
+    def __init__(self, router):
+        self.router = router
+        self._lock = threading.Lock()
+        self._backends = {None: GSheetsBackend()}
+        # Dernière lecture de chaque équipe (None : utilisateur sans équipe, qui lit toutes les équipes)
+        self._active = {}
+        # Classeurs d'années passées lus par le reporting : {(feuille, classeur): (chargé à, DataFrame)}
+        self._past = {}
+
+    def _backend(self, key):
+        with self._lock:
+            backend = self._backends.get(key)
+            if backend is None:
+                backend = self._backends[key] = GSheetsBackend(lambda: open_shard(key))
+            return backend
+
+    def _parallel(self, fn, items):
+        """`fn(item)` pour chaque item sur un pool borné (l'action en cours suit chaque thread)."""
+        with ThreadPoolExecutor(max_workers=max(1, BULK_LOAD_WORKERS)) as pool:
+            futures = [pool.submit(contextvars.copy_context().run, fn, item) for item in items]
+            return [future.result() for future in futures]
+
+    def _live_keys(self, sheet_name, teams=None):
+        """Classeurs lus par les sessions : principal, classeurs d'équipe et classeurs de l'année en cours."""
+        return self.router.keys(sheet_name, teams, {str(datetime.now().year)})
+
+    def _scope(self):
+        """Équipes dont les classeurs sont relus par la synchronisation en cours (None : toutes).
+
+        Une session relit l'équipe de son utilisateur (toutes pour un utilisateur sans équipe, comme l'admin) ;
+        la synchronisation d'arrière-plan, les équipes lues depuis moins de `SYNC_IDLE_SECONDS`.
+        """
+        _, user = _api_context.get()
+        now = time.monotonic()
+        with self._lock:
+            if user:
+                team = self.router.teams.get(user.lower())
+                self._active[team] = now
+                return None if team is None else {team}
+            active = {team for team, at in self._active.items() if now - at < SYNC_IDLE_SECONDS}
+        return None if None in active else active
+
+    def _past_frame(self, sheet_name, key):
+        """Classeur d'une année passée : relu au plus une fois par `FULL_RESYNC_SECONDS` (ses lignes sont closes)."""
+        with self._lock:
+            cached = self._past.get((sheet_name, key))
+        if cached is not None and time.monotonic() - cached[0] < FULL_RESYNC_SECONDS:
+            return cached[1]
+        df = self._backend(key).fetch(sheet_name)
+        with self._lock:
+            self._past[(sheet_name, key)] = (time.monotonic(), df)
         return df
-    except Exception as e:
-        st.error(f"Erreur de lecture de Google Sheet ({sheet_name}). Vérifiez vos permissions. Détail: {e}")
+
+    def _forget_past(self, sheet_name, keys):
+        with self._lock:
+            for key in keys:
+                self._past.pop((sheet_name, key), None)
+
+    def _combine(self, sheet_name, parts):
+        """Concatène les DataFrames [(classeur, df)] d'une feuille ; le découpage est attaché au résultat."""
+        df = concat_typed([df for _, df in parts])
+        df.attrs['shard_segments'] = [(key, len(part)) for key, part in parts]
+        return df
+
+    def _owners(self, sheet_name, id_values):
+        """Classeur de chaque ID trouvé : index en mémoire d'abord, relecture des colonnes d'IDs au besoin."""
+        owners = {}
+        # Classeurs de l'année en cours d'abord : la relecture des IDs s'arrête dès que tous sont trouvés
+        keys = list(dict.fromkeys(self._live_keys(sheet_name) + self.router.keys(sheet_name)))
+        for key in keys:
+            for id_value in self._backend(key).indexed_ids(sheet_name, id_values):
+                owners.setdefault(id_value, key)
+        unknown = [v for v in id_values if v not in owners]
+        for key in keys:
+            if not unknown:
+                break
+            found = self._backend(key).existing_ids(sheet_name, unknown)
+            owners.update(dict.fromkeys(found, key))
+            unknown = [v for v in unknown if v not in found]
+        return owners
+
+    def fetch(self, sheet_name):
+        if sheet_name not in SHARD_COLUMNS:
+            return self._backend(None).fetch(sheet_name)
+        keys = self._live_keys(sheet_name)
+        frames = self._parallel(lambda key: self._backend(key).fetch(sheet_name), keys)
+        return self._combine(sheet_name, list(zip(keys, frames)))
+
+    def fetch_many(self, sheet_names):
+        """Classeur principal : toutes les feuilles en un appel ; autres classeurs : leurs feuilles, en parallèle."""
+        sharded = [sheet_name for sheet_name in sheet_names if sheet_name in SHARD_COLUMNS]
+        keys_of = {sheet_name: self._live_keys(sheet_name) for sheet_name in sharded}
+        keys = list(dict.fromkeys([None] + [key for keys in keys_of.values() for key in keys]))
+
+        def load(key):
+            names = sheet_names if key is None else [sheet_name for sheet_name in sharded if key in keys_of[sheet_name]]
+            return self._backend(key).fetch_many(names)
+
+        results = dict(zip(keys, self._parallel(load, keys)))
+        frames = dict(results[None])
+        for sheet_name in sharded:
+            frames[sheet_name] = self._combine(sheet_name, [(key, results[key][sheet_name]) for key in keys_of[sheet_name]])
+        return frames
+
+    def fetch_delta(self, sheet_name, df):
+        if sheet_name not in SHARD_COLUMNS:
+            return self._backend(None).fetch_delta(sheet_name, df)
+        segments = _shard_segments(df)
+        if segments is None:
+            return self.fetch(sheet_name)
+        # Seuls les classeurs de l'année en cours des équipes concernées sont relus ; les autres segments sont gardés
+        refreshed = set(self._live_keys(sheet_name, self._scope()))
+        parts, start = [], 0
+        for key, count in segments:
+            parts.append((key, df.iloc[start:start + count].reset_index(drop=True)))
+            start += count
+        # Classeur ajouté à la configuration, ou nouvelle année : chargé entièrement
+        known = {key for key, _ in segments}
+        parts += [(key, None) for key in self._live_keys(sheet_name) if key in refreshed and key not in known]
+
+        def refresh(part):
+            key, frame = part
+            if frame is None:
+                return self._backend(key).fetch(sheet_name)
+            return self._backend(key).fetch_delta(sheet_name, frame) if key in refreshed else frame
+
+        frames = self._parallel(refresh, parts)
+        if all(frame is part for (_, part), frame in zip(parts, frames)):
+            # Aucun classeur n'a changé : l'instantané combiné est rendu tel quel
+            return df
+        return self._combine(sheet_name, [(key, frame) for (key, _), frame in zip(parts, frames)])
+
+    def fetch_all(self, sheet_name, years=None):
+        if sheet_name not in SHARD_COLUMNS:
+            return self._backend(None).fetch(sheet_name)
+        keys = self.router.keys(sheet_name, years=years)
+        frames = self._parallel(lambda key: self._backend(key).fetch(sheet_name), keys)
+        return self._combine(sheet_name, list(zip(keys, frames)))
+
+    def fetch_past(self, sheet_name, years=None):
+        if sheet_name not in SHARD_COLUMNS:
+            return None
+        live = set(self._live_keys(sheet_name))
+        keys = [key for key in self.router.keys(sheet_name, years=years) if key not in live]
+        if not keys:
+            return None
+        return concat_typed(self._parallel(lambda key: self._past_frame(sheet_name, key), keys))
+
+    def iter_chunks(self, sheet_name, chunk_rows):
+        for key in (self.router.keys(sheet_name) if sheet_name in SHARD_COLUMNS else [None]):
+            yield from self._backend(key).iter_chunks(sheet_name, chunk_rows)
+
+    def append(self, sheet_name, values):
+        return self.append_many(sheet_name, [values])
+
+    def append_many(self, sheet_name, rows):
+        if sheet_name not in SHARD_COLUMNS:
+            return self._backend(None).append_many(sheet_name, rows)
+        groups = {}
+        for values in rows:
+            groups.setdefault(self.router.shard_for(sheet_name, values), []).append(values)
+        positions = {key: self._backend(key).append_many(sheet_name, group) for key, group in groups.items()}
+        # Position dans le classeur : l'instantané les insère à la fin du segment correspondant (voir `_insert_in_segment`)
+        if len(groups) != 1:
+            return None
+        (key, position), = positions.items()
+        return (key, position) if position is not None else None
+
+    def update(self, sheet_name, df, id_column, id_value, data_dict):
+        if sheet_name not in SHARD_COLUMNS:
+            return self._backend(None).update(sheet_name, df, id_column, id_value, data_dict)
+        owners = self._owners(sheet_name, [id_value])
+        if id_value not in owners:
+            raise RowNotFound(id_value)
+        self._backend(owners[id_value]).update(sheet_name, None, id_column, id_value, data_dict)
+        self._forget_past(sheet_name, [owners[id_value]])
+
+    def update_many(self, sheet_name, updates):
+        if sheet_name not in SHARD_COLUMNS:
+            return self._backend(None).update_many(sheet_name, updates)
+        owners = self._owners(sheet_name, list(updates))
+        missing, parts = [], {}
+        for id_value, update in updates.items():
+            if id_value in owners:
+                parts.setdefault(owners[id_value], {})[id_value] = update
+            else:
+                missing.append(id_value)
+        for key, part in parts.items():
+            missing.extend(self._backend(key).update_many(sheet_name, part))
+        self._forget_past(sheet_name, parts)
+        return missing
+
+    def existing_ids(self, sheet_name, id_values):
+        if sheet_name not in SHARD_COLUMNS:
+            return self._backend(None).existing_ids(sheet_name, id_values)
+        return set(self._owners(sheet_name, list(id_values)))
+
+    def archive_rows(self, sheet_name, month, rows, batch):
+        if sheet_name not in SHARD_COLUMNS:
+            return self._backend(None).archive_rows(sheet_name, month, rows, batch)
+        # Chaque ligne est archivée dans le classeur qui la contient
+        owners = self._owners(sheet_name, [values[0] for values in rows])
+        groups = {}
+        for values in rows:
+            groups.setdefault(owners.get(values[0]), []).append(values)
+        for key, group in groups.items():
+            self._backend(key).archive_rows(sheet_name, month, group, batch)
+
+    def archived_batches(self, sheet_name, month):
+        if sheet_name not in SHARD_COLUMNS:
+            return self._backend(None).archived_batches(sheet_name, month)
+        batches = {}
+        for key in self.router.keys(sheet_name):
+            batches.update(self._backend(key).archived_batches(sheet_name, month))
+        return batches
+
+    def delete_rows(self, sheet_name, id_values):
+        if sheet_name not in SHARD_COLUMNS:
+            return self._backend(None).delete_rows(sheet_name, id_values)
+        # Chaque ID est supprimé du classeur qui le contient
+        owners = self._owners(sheet_name, list(id_values))
+        groups = {}
+        for id_value, key in owners.items():
+            groups.setdefault(key, []).append(id_value)
+        for key, group in groups.items():
+            self._backend(key).delete_rows(sheet_name, group)
+        self._forget_past(sheet_name, groups)
+
+    def replace_rows(self, sheet_name, id_values, rows):
+        if sheet_name in SHARD_COLUMNS:
+            raise ValueError(f"Remplacement atomique impossible sur une feuille répartie ({sheet_name})")
+        self._backend(None).replace_rows(sheet_name, id_values, rows)
+
+    def acquire_lease(self, name, owner, seconds):
+        return self._backend(None).acquire_lease(name, owner, seconds)
+
+    def release_lease(self, name, owner):
+        self._backend(None).release_lease(name, owner)
+
+    def seed(self, sheet_name, df):
+        # Le découpage d'un instantané disque n'est pas connu : seules les feuilles non réparties l'adoptent
+        if sheet_name not in SHARD_COLUMNS:
+            self._backend(None).seed(sheet_name, df)
+
+
+@st.cache_resource
+def get_backend():
+    """Instancie le moteur de stockage choisi par la configuration (partagé par toutes les sessions)."""
+    if STORAGE_BACKEND == 'sqlite':
+        return SQLiteBackend(SQLITE_PATH)
+    if STORAGE_BACKEND != 'gsheets':
+        st.error(f"ERREUR : moteur de stockage inconnu '{STORAGE_BACKEND}' (valeurs possibles : gsheets, sqlite).")
+        st.stop()
+    if SHARD_SPREADSHEETS:
+        return ShardedBackend(ShardRouter(SHARD_SPREADSHEETS, SHARD_TEAMS))
+    return GSheetsBackend()
+
+
+Snapshot = namedtuple('Snapshot', ['df', 'loaded_at', 'version'])
+
+
+class SnapshotCache:
+    """Cache process des DataFrames (un seul exemplaire par feuille), partagé par toutes les sessions.
+
+    Un instantané expire après `ttl` secondes. Les écritures de l'application y sont reportées directement
+    (`apply_append`, `apply_updates`) : elles sont visibles sans relecture de la feuille.
+    Les DataFrames retournés sont partagés : ils doivent être traités en lecture seule.
+    """
+
+    def __init__(self, ttl):
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._entries = {}
+        self._generations = {sheet_name: 0 for sheet_name in SHEET_HEADERS}
+        self._versions = dict(self._generations)
+        self._derived = {}
+        # Écritures reportées récentes (version avant, version après, écriture) : les index dérivés les rejouent
+        self._changes = {sheet_name: deque(maxlen=256) for sheet_name in SHEET_HEADERS}
+        # Dernière lecture de chaque feuille : la synchronisation d'arrière-plan ne rafraîchit que celles-ci
+        self._requested = {}
+        # Un verrou par feuille : un seul téléchargement à la fois, les autres sessions attendent son résultat
+        self._load_locks = {sheet_name: threading.Lock() for sheet_name in SHEET_HEADERS}
+
+    def _fresh(self, entry, max_age=None):
+        return entry is not None and time.monotonic() - entry.loaded_at < (self.ttl if max_age is None else max_age)
+
+    def watched(self, idle_seconds):
+        """Feuilles lues par une session depuis moins de `idle_seconds` secondes."""
+        since = time.monotonic() - idle_seconds
+        return [sheet_name for sheet_name, at in list(self._requested.items()) if at >= since]
+
+    def get(self, sheet_name, loader, refresher=None):
+        """Retourne l'instantané de la feuille, en le (re)chargeant s'il est périmé.
+
+        `loader(sheet_name)` charge la feuille entière ; `refresher(sheet_name, df)`, s'il est fourni,
+        met à jour l'instantané précédent de manière incrémentale.
+        """
+        self._requested[sheet_name] = time.monotonic()
+        entry = self._entries.get(sheet_name)
+        if self._fresh(entry):
+            return entry.df
+        with self._load_locks[sheet_name]:
+            entry = self._entries.get(sheet_name)
+            if self._fresh(entry):
+                return entry.df
+            generation = self._generations[sheet_name]
+            if entry is not None and refresher is not None:
+                df = refresher(sheet_name, entry.df)
+            else:
+                df = loader(sheet_name)
+            return self._store(sheet_name, df, generation)
+
+    def _store(self, sheet_name, df, generation):
+        """Publie `df` et retourne l'instantané publié : le précédent, avec sa version, si rien n'a changé.
+
+        Les résultats dérivés (`derive`) ne sont ainsi recalculés que si la feuille a réellement changé.
+        """
+        with self._lock:
+            entry = self._entries.get(sheet_name)
+        unchanged = entry is not None and (df is entry.df or (df.attrs == entry.df.attrs and df.equals(entry.df)))
+        with self._lock:
+            # Une écriture survenue pendant le chargement rend l'instantané immédiatement périmé
+            loaded_at = time.monotonic() if generation == self._generations[sheet_name] else float('-inf')
+            if unchanged and self._entries.get(sheet_name) is entry:
+                self._entries[sheet_name] = entry._replace(loaded_at=loaded_at)
+                return entry.df
+            self._versions[sheet_name] += 1
+            self._entries[sheet_name] = Snapshot(df, loaded_at, self._versions[sheet_name])
+            return df
+
+    def get_many(self, sheet_names, bulk_loader, refresher=None, refreshable=(), max_age=None):
+        """Version groupée de `get` : retourne ({feuille: DataFrame}, {feuille: secondes}).
+
+        Les feuilles périmées sont chargées par un seul appel `bulk_loader(noms)` ; celles de `refreshable`
+        déjà en cache sont rafraîchies par `refresher` en parallèle, sur un pool de threads borné.
+        `max_age` remplace la durée de vie (synchronisation d'arrière-plan, qui ne compte pas comme une lecture).
+        """
+        frames, timings = {}, {}
+        stale = []
+        for sheet_name in sheet_names:
+            if max_age is None:
+                self._requested[sheet_name] = time.monotonic()
+            entry = self._entries.get(sheet_name)
+            if self._fresh(entry, max_age):
+                frames[sheet_name] = entry.df
+            else:
+                stale.append(sheet_name)
+        if not stale:
+            return frames, timings
+
+        # Verrous pris dans un ordre fixe : pas d'interblocage entre deux chargements groupés
+        locks = [self._load_locks[sheet_name] for sheet_name in sorted(stale)]
+        for lock in locks:
+            lock.acquire()
+        try:
+            generations, full, delta = {}, [], []
+            for sheet_name in stale:
+                entry = self._entries.get(sheet_name)
+                if self._fresh(entry, max_age):
+                    frames[sheet_name] = entry.df
+                    continue
+                generations[sheet_name] = self._generations[sheet_name]
+                incremental = entry is not None and refresher is not None and sheet_name in refreshable
+                (delta if incremental else full).append(sheet_name)
+
+            def timed(fn, *args):
+                started = time.perf_counter()
+                return fn(*args), time.perf_counter() - started
+
+            with ThreadPoolExecutor(max_workers=max(1, BULK_LOAD_WORKERS)) as pool:
+                # Chaque thread garde l'action en cours (attribution des appels API)
+                futures = {
+                    sheet_name: pool.submit(contextvars.copy_context().run, timed, refresher, sheet_name, self._entries[sheet_name].df)
+                    for sheet_name in delta
+                }
+                if full:
+                    loaded, elapsed = timed(bulk_loader, full)
+                    for sheet_name in full:
+                        frames[sheet_name], timings[sheet_name] = loaded[sheet_name], elapsed
+                for sheet_name, future in futures.items():
+                    frames[sheet_name], timings[sheet_name] = future.result()
+
+            for sheet_name in generations:
+                frames[sheet_name] = self._store(sheet_name, frames[sheet_name], generations[sheet_name])
+            return frames, timings
+        finally:
+            for lock in locks:
+                lock.release()
+
+    def derive(self, sheet_name, df, key, compute, advance=None):
+        """Calcule `compute(df)` une seule fois par version d'instantané (recalcul direct si `df` n'est pas l'instantané courant).
+
+        Si `advance(résultat, écriture)` est fourni, un résultat d'une version antérieure est avancé en rejouant
+        les écritures reportées depuis (`('append', lignes)` en fin de feuille, `('insert', lignes)` au milieu d'un moteur
+        réparti, ou `('update', mises à jour)`) au lieu d'être recalculé ;
+        `advance` retourne un nouveau résultat sans modifier le précédent, lu hors verrou par d'autres sessions,
+        ou None pour forcer le recalcul.
+        """
+        entry = self._entries.get(sheet_name)
+        if entry is None or entry.df is not df:
+            return compute(df)
+        with self._lock:
+            cached = self._derived.get((sheet_name, key))
+            if cached is not None and cached[0] != entry.version and advance is not None:
+                result = self._replay(sheet_name, cached[0], cached[1], entry.version, advance)
+                if result is not None:
+                    self._derived[(sheet_name, key)] = (entry.version, result)
+                    return result
+        if cached is not None and cached[0] == entry.version:
+            return cached[1]
+        result = compute(df)
+        with self._lock:
+            self._derived[(sheet_name, key)] = (entry.version, result)
+        return result
+
+    def _replay(self, sheet_name, version, result, target, advance):
+        """Avance un résultat dérivé de `version` à `target` ; None si une écriture intermédiaire est inconnue."""
+        links = {start: (end, change) for start, end, change in self._changes[sheet_name]}
+        while version != target:
+            if version not in links:
+                return None
+            version, change = links[version]
+            result = advance(result, change)
+            if result is None:
+                return None
+        return result
+
+    def _patch(self, sheet_name, patch, change=None):
+        """Remplace l'instantané par `patch(df)`, ou le marque périmé si `patch` retourne None.
+
+        `change` décrit l'écriture pour les index dérivés (voir `derive`).
+        """
+        with self._lock:
+            # Un chargement commencé avant l'écriture ne l'inclut peut-être pas : il sera périmé à son arrivée
+            self._generations[sheet_name] += 1
+            entry = self._entries.get(sheet_name)
+        if entry is None:
+            return
+        df = patch(entry.df)
+        with self._lock:
+            current = self._entries.get(sheet_name)
+            if current is None:
+                return
+            if current is not entry or df is None:
+                # Instantané remplacé entre-temps ou impossible à corriger localement : relecture au prochain accès
+                self._entries[sheet_name] = current._replace(loaded_at=float('-inf'))
+                return
+            self._versions[sheet_name] += 1
+            if change is not None:
+                self._changes[sheet_name].append((entry.version, self._versions[sheet_name], change))
+            self._entries[sheet_name] = Snapshot(df, entry.loaded_at, self._versions[sheet_name])
+
+    def apply_append(self, sheet_name, rows, position):
+        """Reporte des lignes ajoutées par l'application ; `position` est celle renvoyée par le moteur.
+
+        Si elle ne suit pas la dernière ligne de l'instantané (ou de son segment, pour un moteur réparti),
+        d'autres lignes ont été ajoutées ailleurs : l'instantané est alors simplement marqué périmé.
+        """
+        def patch(df):
+            appended = apply_schema(sheet_name, pd.DataFrame(rows, columns=SHEET_HEADERS[sheet_name]))
+            if isinstance(position, tuple):
+                return _insert_in_segment(df, appended, *position)
+            if position is None or position != len(df):
+                return None
+            return concat_typed([df, appended])
+        kind = 'insert' if isinstance(position, tuple) else 'append'
+        self._patch(sheet_name, patch, (kind, [list(row) for row in rows]))
+
+    def apply_updates(self, sheet_name, updates):
+        """Reporte des mises à jour {id_value: (id_column, data_dict)} écrites par l'application."""
+        if updates:
+            self._patch(sheet_name, lambda df: _patch_rows(df.copy(), updates), ('update', updates))
+
+    def seed(self, sheet_name, df, age):
+        """Instantané lu sur disque, vieux de `age` secondes : rafraîchi comme un autre dès qu'il est périmé."""
+        with self._lock:
+            if sheet_name in self._entries:
+                return None
+            self._versions[sheet_name] += 1
+            self._entries[sheet_name] = Snapshot(df, time.monotonic() - age, self._versions[sheet_name])
+            return self._versions[sheet_name]
+
+    def last_good(self, sheet_name):
+        """Dernier instantané chargé avec succès, même périmé (repli quand l'API est indisponible)."""
+        return self._entries.get(sheet_name)
+
+    def invalidate(self, sheet_name):
+        """Marque l'instantané d'une feuille comme périmé (appelé après chaque écriture)."""
+        with self._lock:
+            self._generations[sheet_name] += 1
+            entry = self._entries.get(sheet_name)
+            if entry is not None:
+                self._entries[sheet_name] = entry._replace(loaded_at=float('-inf'))
+
+
+def _shard_segments(df):
+    """Découpage [(classeur, nombre de lignes)] d'un DataFrame combiné par `ShardedBackend`, ou None s'il ne le décrit pas."""
+    segments = df.attrs.get('shard_segments')
+    if not segments or sum(count for _, count in segments) != len(df):
+        return None
+    return segments
+
+
+def _insert_in_segment(df, appended, key, position):
+    """Insère des lignes ajoutées au classeur `key` à la fin de son segment ; None si `position` ne la suit pas."""
+    segments = _shard_segments(df)
+    if segments is None:
+        return None
+    start = 0
+    for i, (segment_key, count) in enumerate(segments):
+        if segment_key == key:
+            if count != position:
+                return None
+            end = start + count
+            patched = concat_typed([df.iloc[:end], appended, df.iloc[end:]])
+            patched.attrs['shard_segments'] = segments[:i] + [(key, count + len(appended))] + segments[i + 1:]
+            return patched
+        start += count
+    return None
+
+
+def _parquet_ready(df):
+    """Copie écrivable en Parquet et colonnes converties en texte (cellules vides mêlées à des nombres).
+
+    Les colonnes typées par SHEET_SCHEMAS (datetime64, int64, catégories) sont écrites telles quelles.
+    """
+    columns, text_columns = {}, []
+    for column in df.columns:
+        values = df[column]
+        if values.dtype == object and pd.api.types.infer_dtype(values, skipna=False) not in (
+                'string', 'empty', 'integer', 'floating', 'mixed-integer-float', 'boolean'):
+            values = values.map(lambda v: '' if v is None else str(v))
+            text_columns.append(column)
+        columns[column] = values
+    return pd.DataFrame(columns, index=df.index), text_columns
+
+
+def _numericise_column(values):
+    """Conversion de `numericise_all` appliquée à une colonne entière : nombres convertis, texte et vides inchangés."""
+    numbers = pd.to_numeric(values, errors='coerce')
+    restored = values.astype(object)
+    is_number = numbers.notna() & (values != '')
+    is_int = is_number & (numbers == numbers.round())
+    restored[is_int] = numbers[is_int].astype('int64')
+    restored[is_number & ~is_int] = numbers[is_number & ~is_int]
+    return restored
+
+
+class SnapshotStore:
+    """Instantanés Parquet des feuilles sur disque, décrits par un manifeste JSON.
+
+    Ils réchauffent le cache au démarrage (seul le delta depuis l'instantané est ensuite lu dans l'API)
+    et peuvent être lus directement (memory map) pour les analyses.
+    """
+
+    def __init__(self, directory):
+        self.directory = directory
+        self._lock = threading.Lock()
+        self._saved_versions = {}
+        os.makedirs(directory, exist_ok=True)
+
+    def path(self, sheet_name):
+        return os.path.join(self.directory, f"{sheet_name}.parquet")
+
+    def _manifest_path(self):
+        return os.path.join(self.directory, 'manifest.json')
+
+    def manifest(self):
+        try:
+            with open(self._manifest_path(), encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def load(self):
+        """Instantanés présents sur disque : {feuille: (DataFrame, âge en secondes)}."""
+        frames = {}
+        for sheet_name, meta in self.manifest().items():
+            if sheet_name not in SHEET_HEADERS:
+                continue
+            try:
+                df = pd.read_parquet(self.path(sheet_name), memory_map=True)
+            except Exception as e:
+                logger.warning("Instantané illisible (%s) : %s", sheet_name, e)
+                continue
+            if list(df.columns) != SHEET_HEADERS[sheet_name]:
+                continue
+            for column in meta.get('text_columns', []):
+                df[column] = _numericise_column(df[column])
+            frames[sheet_name] = (apply_schema(sheet_name, df), max(0.0, time.time() - meta['saved_at']))
+        return frames
+
+    def iter_chunks(self, sheet_name, chunk_rows):
+        """Parcourt l'instantané d'une feuille par lots Parquet d'au plus `chunk_rows` lignes (rien s'il est absent)."""
+        meta = self.manifest().get(sheet_name)
+        if meta is None:
+            return
+        for batch in pyarrow.parquet.ParquetFile(self.path(sheet_name)).iter_batches(batch_size=chunk_rows):
+            df = batch.to_pandas()
+            for column in meta.get('text_columns', []):
+                df[column] = _numericise_column(df[column])
+            yield apply_schema(sheet_name, df)
+
+    def mark_saved(self, sheet_name, version):
+        with self._lock:
+            self._saved_versions[sheet_name] = version
+
+    def save(self, cache):
+        """Écrit les instantanés du cache modifiés depuis la dernière sauvegarde ; retourne les feuilles écrites."""
+        with self._lock:
+            manifest = self.manifest()
+            written = []
+            for sheet_name in SHEET_HEADERS:
+                snapshot = cache.last_good(sheet_name)
+                # Un instantané invalidé peut manquer des écritures récentes : il n'est pas sauvegardé
+                if (snapshot is None or snapshot.loaded_at == float('-inf')
+                        or self._saved_versions.get(sheet_name) == snapshot.version):
+                    continue
+                df, text_columns = _parquet_ready(snapshot.df)
+                tmp_path = self.path(sheet_name) + '.tmp'
+                df.to_parquet(tmp_path, index=False)
+                os.replace(tmp_path, self.path(sheet_name))
+                manifest[sheet_name] = {'saved_at': time.time(), 'rows': len(df), 'text_columns': text_columns}
+                self._saved_versions[sheet_name] = snapshot.version
+                written.append(sheet_name)
+            if written:
+                tmp_path = self._manifest_path() + '.tmp'
+                with open(tmp_path, 'w', encoding='utf-8') as f:
+                    json.dump(manifest, f, ensure_ascii=False, indent=1)
+                os.replace(tmp_path, self._manifest_path())
+            return written
+
+
+@st.cache_resource
+def get_snapshot_store():
+    """Instantanés sur disque du processus (None si désactivés ou si pyarrow n'est pas installé)."""
+    if not SNAPSHOT_DIR:
+        return None
+    if pyarrow is None:
+        logger.warning("pyarrow n'est pas installé : instantanés Parquet désactivés")
+        return None
+    return SnapshotStore(SNAPSHOT_DIR)
+
+
+@st.cache_resource
+def get_snapshot_cache():
+    """Cache d'instantanés unique pour le processus (toutes les sessions navigateur), réchauffé depuis le disque."""
+    cache = SnapshotCache(CACHE_TTL_SECONDS)
+    store = get_snapshot_store()
+    if store is not None:
+        backend = get_backend()
+        for sheet_name, (df, age) in store.load().items():
+            backend.seed(sheet_name, df)
+            store.mark_saved(sheet_name, cache.seed(sheet_name, df, age))
+    return cache
+
+
+@st.cache_resource
+def start_snapshot_writer():
+    """Sauvegarde périodique (et à l'arrêt) des instantanés modifiés : un thread par processus."""
+    store, cache = get_snapshot_store(), get_snapshot_cache()
+
+    def save():
+        try:
+            written = store.save(cache)
+            if written:
+                logger.info("Instantanés sauvegardés : %s", ", ".join(written))
+        except Exception:
+            logger.exception("Échec de la sauvegarde des instantanés")
+
+    def run():
+        while True:
+            time.sleep(SNAPSHOT_INTERVAL_MINUTES * 60)
+            save()
+
+    atexit.register(save)
+    thread = threading.Thread(target=run, name='klick-snapshots', daemon=True)
+    thread.start()
+    return thread
+
+
+# Une écriture en attente : ajout de ligne (`values`) ou mise à jour par ID (`data`) ; `seq` : rang dans le journal
+Mutation = namedtuple('Mutation', ['kind', 'sheet_name', 'values', 'id_column', 'id_value', 'data', 'seq'], defaults=[None])
+
+
+class WriteJournal:
+    """Journal des écritures différées sur disque (JSON lines, fsync à chaque ligne).
+
+    Chaque mutation y est écrite avant d'être acquittée à l'utilisateur, puis marquée `ack` une fois
+    appliquée au stockage : au redémarrage, les mutations non acquittées sont rejouées.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        self._seq = 0
+        self._dirty = True
+        self._file = open(path, 'a+', encoding='utf-8')
+
+    def _write(self, record):
+        self._file.write(json.dumps(record, ensure_ascii=False, default=_to_python) + '\n')
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        self._dirty = True
+
+    def replay(self):
+        """Mutations journalisées et pas encore acquittées, dans l'ordre d'écriture."""
+        pending = {}
+        with self._lock:
+            self._file.seek(0)
+            text = self._file.read()
+            for line in text.splitlines():
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    # Ligne tronquée par un arrêt brutal : la mutation n'avait pas été acquittée à l'utilisateur
+                    continue
+                if 'ack' in record:
+                    for seq in record['ack']:
+                        pending.pop(seq, None)
+                else:
+                    pending[record['seq']] = Mutation(**record)
+                    self._seq = max(self._seq, record['seq'])
+            if text and not text.endswith('\n'):
+                # Les lignes suivantes ne doivent pas prolonger la ligne tronquée
+                self._file.write('\n')
+                self._file.flush()
+        return list(pending.values())
+
+    def append(self, mutation):
+        """Écrit la mutation sur disque ; retourne la mutation numérotée."""
+        with self._lock:
+            self._seq += 1
+            mutation = mutation._replace(seq=self._seq)
+            self._write(mutation._asdict())
+        return mutation
+
+    def ack(self, mutations):
+        with self._lock:
+            self._write({'ack': [m.seq for m in mutations]})
+
+    def truncate(self):
+        """Vide le journal (à n'appeler que lorsque plus aucune mutation n'est en attente)."""
+        with self._lock:
+            if not self._dirty:
+                return
+            self._file.truncate(0)
+            self._file.flush()
+            os.fsync(self._file.fileno())
+            self._dirty = False
+
+
+def _coalesce_updates(mutations):
+    """Fusionne les mises à jour d'une même ligne (la dernière valeur de chaque colonne l'emporte)."""
+    updates = {}
+    for mutation in mutations:
+        _, data_dict = updates.setdefault(mutation.id_value, (mutation.id_column, {}))
+        data_dict.update(mutation.data)
+    return updates
+
+
+def _patch_rows(df, updates, strict=True):
+    """Applique sur place des mises à jour {id_value: (id_column, data_dict)} à la première ligne de chaque ID.
+
+    Retourne `df`, ou None si un ID est introuvable et que `strict` est vrai.
+    """
+    for id_value, (column, data_dict) in updates.items():
+        matches = df.index[df[column] == id_value] if column in df else []
+        if not len(matches):
+            if strict:
+                return None
+            continue
+        for key, value in data_dict.items():
+            if key in df:
+                value = _typed_value(df, key, value)
+            df.at[matches[0], key] = value
+    return df
+
+
+def _typed_value(df, column, value):
+    """Valeur écrite convertie au type de la colonne (comme après relecture) ; élargit la colonne au besoin."""
+    dtype = df[column].dtype
+    if pd.api.types.is_datetime64_any_dtype(dtype):
+        return pd.to_datetime(value, format=TIMESTAMP_FORMAT, errors='coerce')
+    if pd.api.types.is_integer_dtype(dtype):
+        return _as_int(value)
+    if isinstance(dtype, pd.CategoricalDtype):
+        value = str(value)
+        if value not in dtype.categories:
+            df[column] = df[column].cat.add_categories([value])
+        return value
+    if dtype != object:
+        df[column] = df[column].astype(object)
+    return value
+
+
+def _overlay_mutations(df, mutations):
+    """Applique des mutations encore en file sur une copie du DataFrame (lecture de ses propres écritures)."""
+    sheet_name = mutations[0].sheet_name
+    id_column = SHEET_ID_COLUMNS[sheet_name]
+    known_ids = set(df[id_column]) if id_column in df else set()
+
+    # Les ajouts déjà visibles dans l'instantané (vidés entre-temps) ne sont pas dupliqués
+    new_rows = [
+        m.values for m in mutations
+        if m.kind == 'append' and m.values[0] not in known_ids
+    ]
+    if new_rows:
+        df = concat_typed([df, apply_schema(sheet_name, pd.DataFrame(new_rows, columns=SHEET_HEADERS[sheet_name]))])
+    else:
+        df = df.copy()
+
+    return _patch_rows(df, _coalesce_updates([m for m in mutations if m.kind == 'update']), strict=False)
+
+
+class MutationQueue:
+    """File d'écritures différées, vidée en arrière-plan toutes les `interval` secondes par lots groupés par feuille
+    (plus tôt si plus de `batch_size` écritures attendent).
+
+    L'ordre est garanti par feuille : un seul vidage à la fois, les ajouts d'un lot
+    (`append_rows`) précèdent ses mises à jour (`batch_update`), qui ne visent que des lignes existantes.
+    Avec un `journal`, chaque écriture est d'abord rendue durable sur disque, et les ajouts dont l'envoi
+    a échoué (ou qui sont rejoués au redémarrage) ne sont renvoyés que si leur ID est absent de la feuille.
+    """
+
+    def __init__(self, backend, cache, interval, journal=None, batch_size=FLUSH_BATCH_SIZE):
+        self.backend = backend
+        self.cache = cache
+        self.interval = interval
+        self.batch_size = batch_size
+        self.journal = journal
+        self.last_error = None
+        # Dernière erreur de chaque feuille en échec : une feuille bloquée n'empêche pas le vidage des autres
+        self.errors = {}
+        # Écritures refusées définitivement (lettres mortes) et mises à jour sans ligne correspondante
+        self.dead_letters = deque(maxlen=1000)
+        self.dropped_updates = deque(maxlen=1000)
+        self._failures = 0
+        # Vidage anticipé demandé (file trop longue), sans effet pendant le repli après échec
+        self._eager = False
+        self._cond = threading.Condition()
+        self._pending = {sheet_name: deque() for sheet_name in SHEET_HEADERS}
+        self._flush_locks = {sheet_name: threading.Lock() for sheet_name in SHEET_HEADERS}
+        # Journal et file modifiés ensemble : le journal n'est vidé que si la file l'est aussi
+        self._submit_lock = threading.Lock()
+        # Feuilles dont un envoi d'ajouts a pu aboutir sans confirmation
+        self._uncertain = set()
+        self._closed = False
+        if journal is not None:
+            for mutation in journal.replay():
+                self._pending[mutation.sheet_name].append(mutation)
+                if mutation.kind == 'append':
+                    self._uncertain.add(mutation.sheet_name)
+            if self.pending_count():
+                logger.info("Journal rejoué : %s écriture(s) en attente", self.pending_count())
+        self._thread = threading.Thread(target=self._run, name='klick-write-behind', daemon=True)
+        self._thread.start()
+        # Vidage final à l'arrêt du processus
+        atexit.register(self.close)
+
+    def submit(self, mutation):
+        """Enregistre une écriture (sur disque si journalisée) et rend la main sans attendre l'API."""
+        with self._submit_lock:
+            if self.journal is not None:
+                mutation = self.journal.append(mutation)
+            with self._cond:
+                self._pending[mutation.sheet_name].append(mutation)
+                # Les écritures d'un même clic partent ensemble au prochain vidage périodique ;
+                # seule une file trop longue réveille le thread plus tôt
+                if not self._eager and sum(len(q) for q in self._pending.values()) >= self.batch_size:
+                    self._eager = True
+                    self._cond.notify()
+
+    def pending(self, sheet_name):
+        """Mutations de la feuille pas encore appliquées au stockage."""
+        with self._cond:
+            return list(self._pending[sheet_name])
+
+    def pending_count(self):
+        with self._cond:
+            return sum(len(q) for q in self._pending.values())
+
+    def _discard(self, sheet_name, done):
+        done_ids = {id(m) for m in done}
+        with self._cond:
+            self._pending[sheet_name] = deque(m for m in self._pending[sheet_name] if id(m) not in done_ids)
+        if self.journal is not None and done:
+            self.journal.ack(done)
+
+    def _dead_letter(self, sheet_name, mutations, error):
+        """Met de côté des écritures refusées définitivement : retirées de la file et du journal, gardées pour l'admin."""
+        detail = f"{type(error).__name__}: {error}"
+        for mutation in mutations:
+            self.dead_letters.append({
+                'at': format_timestamp(), 'sheet': sheet_name, 'kind': mutation.kind,
+                'id': mutation.values[0] if mutation.kind == 'append' else mutation.id_value,
+                'values': mutation.values, 'data': mutation.data, 'error': detail,
+            })
+        logger.error("Écriture(s) refusée(s) définitivement dans %s (%s) : %s", sheet_name, detail, mutations)
+        self._discard(sheet_name, mutations)
+
+    def _send(self, sheet_name, mutations, send):
+        """Envoie un lot ; sur refus définitif (4xx), le renvoie écriture par écriture et isole celles refusées."""
+        try:
+            send(sheet_name, mutations)
+        except Exception as e:
+            if not _permanent_error(e):
+                raise
+            if len(mutations) == 1:
+                self._dead_letter(sheet_name, mutations, e)
+                return
+            for mutation in mutations:
+                self._send(sheet_name, [mutation], send)
+
+    def _send_appends(self, sheet_name, appends):
+        rows = [m.values for m in appends]
+        try:
+            position = self.backend.append_many(sheet_name, rows)
+        except Exception:
+            self._uncertain.add(sheet_name)
+            raise
+        # Reporter dans l'instantané avant de retirer de la file : une lecture voit la ligne soit en file, soit dans l'instantané
+        self.cache.apply_append(sheet_name, rows, position)
+        self._discard(sheet_name, appends)
+
+    def _send_updates(self, sheet_name, updates):
+        coalesced = _coalesce_updates(updates)
+        missing = self.backend.update_many(sheet_name, coalesced)
+        self.cache.apply_updates(sheet_name, {k: v for k, v in coalesced.items() if k not in missing})
+        self._discard(sheet_name, updates)
+        if missing:
+            logger.warning("Lignes introuvables dans %s, mises à jour ignorées : %s", sheet_name, missing)
+            for id_value in missing:
+                self.dropped_updates.append({
+                    'at': format_timestamp(), 'sheet': sheet_name, 'id': id_value, 'data': coalesced[id_value][1],
+                })
+
+    def _flush_pending(self, sheet_name):
+        batch = self.pending(sheet_name)
+        if not batch:
+            return
+        appends = [m for m in batch if m.kind == 'append']
+        updates = [m for m in batch if m.kind == 'update']
+        if appends and sheet_name in self._uncertain:
+            # Un envoi précédent a pu aboutir malgré l'erreur : les lignes déjà présentes ne sont pas renvoyées
+            existing = self.backend.existing_ids(sheet_name, [m.values[0] for m in appends])
+            written = [m for m in appends if m.values[0] in existing]
+            if written:
+                logger.info("%s ajout(s) déjà présents dans %s, non renvoyés", len(written), sheet_name)
+                self.cache.invalidate(sheet_name)
+                self._discard(sheet_name, written)
+            appends = [m for m in appends if m.values[0] not in existing]
+            self._uncertain.discard(sheet_name)
+        if appends:
+            self._send(sheet_name, appends, self._send_appends)
+        if updates:
+            self._send(sheet_name, updates, self._send_updates)
+
+    def _flush_sheet(self, sheet_name):
+        with self._flush_locks[sheet_name]:
+            self._flush_pending(sheet_name)
+
+    @contextlib.contextmanager
+    def hold(self, sheet_name):
+        """Vide la file d'une feuille puis suspend ses vidages (ex. archivage qui décale les lignes)."""
+        with self._flush_locks[sheet_name]:
+            self._flush_pending(sheet_name)
+            yield
+
+    def flush(self):
+        """Vide immédiatement toutes les feuilles, chacune indépendamment (lève ensuite l'erreur de la première en échec)."""
+        errors = {}
+        for sheet_name in SHEET_HEADERS:
+            try:
+                self._flush_sheet(sheet_name)
+            except Exception as e:
+                errors[sheet_name] = e
+        self.errors = {sheet_name: f"{type(e).__name__}: {e}" for sheet_name, e in errors.items()}
+        self.last_error = '; '.join(f"{sheet_name} : {detail}" for sheet_name, detail in self.errors.items()) or None
+        if self.journal is not None:
+            with self._submit_lock:
+                if not self.pending_count():
+                    self.journal.truncate()
+        if errors:
+            raise next(iter(errors.values()))
+
+    def _run(self):
+        while True:
+            with self._cond:
+                # Attente plus longue après des échecs successifs (max 30 s)
+                deadline = time.monotonic() + min(self.interval * (2 ** self._failures), 30)
+                while not self._closed and not (self._eager and not self._failures):
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self._cond.wait(timeout=remaining)
+                self._eager = False
+                if self._closed:
+                    return
+            try:
+                with api_context("file d'écritures", user=''):
+                    self.flush()
+                self._failures = 0
+            except Exception:
+                self._failures += 1
+                logger.exception("Échec du vidage de la file d'écritures (tentative %s)", self._failures)
+
+    def close(self):
+        """Arrête le thread et vide ce qui reste en file."""
+        with self._cond:
+            if self._closed:
+                return
+            self._closed = True
+            self._cond.notify_all()
+        self._thread.join(timeout=5)
+        try:
+            self.flush()
+        except Exception:
+            logger.exception("Écritures perdues à l'arrêt : %s en file", self.pending_count())
+
+
+@st.cache_resource
+def get_mutation_queue():
+    """File d'écritures différées unique pour le processus (rejoue le journal laissé par l'exécution précédente)."""
+    journal = WriteJournal(JOURNAL_PATH) if JOURNAL_PATH else None
+    return MutationQueue(get_backend(), get_snapshot_cache(), FLUSH_INTERVAL_SECONDS, journal)
+
+
+def _pending_mutations(sheet_name):
+    """Écritures encore en file d'une feuille, à relever AVANT de lire l'instantané.
+
+    Un vidage reporte ses écritures dans l'instantané avant de les retirer de la file : relevées dans cet ordre,
+    elles sont vues dans l'une ou l'autre, même si le vidage a lieu entre les deux lectures.
+    """
+    return get_mutation_queue().pending(sheet_name) if WRITE_BEHIND else []
+
+
+def _with_pending(df, pending):
+    """Ajoute à l'instantané les écritures en file `pending` (lecture de ses propres écritures)."""
+    return _overlay_mutations(df, pending) if pending else df
+
+def fetch_data(sheet_name):
+    """Récupère toutes les données d'une feuille (via le cache partagé)."""
+    if sheet_name not in SHEET_HEADERS:
+        st.warning(f"Feuille {sheet_name} non trouvée.")
         return pd.DataFrame()
+    pending = _pending_mutations(sheet_name)
+    return _with_pending(fetch_snapshot(sheet_name), pending)
+
+def fetch_snapshot(sheet_name):
+    """Instantané partagé d'une feuille, sans les écritures encore en file."""
+    try:
+        backend = get_backend()
+        refresher = backend.fetch_delta if DELTA_SYNC and sheet_name in OPEN_ROW_COLUMNS else None
+        return get_snapshot_cache().get(sheet_name, backend.fetch, refresher)
+    except Exception as e:
+        # Un DataFrame vide passerait pour une feuille vide (aucune tâche, déconnexion non journalisée)
+        snapshot = get_snapshot_cache().last_good(sheet_name)
+        if snapshot is None:
+            st.error(f"Erreur de lecture de Google Sheet ({sheet_name}). Vérifiez vos permissions puis réessayez. Détail: {e}")
+            st.stop()
+        st.warning(f"Google Sheets indisponible ({sheet_name}) : affichage des dernières données chargées. Détail: {e}")
+        return snapshot.df
+
+def fetch_many(sheet_names):
+    """Récupère plusieurs feuilles en un seul aller-retour ; retourne (DataFrames, durées par feuille)."""
+    try:
+        backend = get_backend()
+        pending = {sheet_name: _pending_mutations(sheet_name) for sheet_name in sheet_names}
+        frames, timings = get_snapshot_cache().get_many(
+            sheet_names, backend.fetch_many,
+            backend.fetch_delta if DELTA_SYNC else None, set(OPEN_ROW_COLUMNS)
+        )
+        return {sheet_name: _with_pending(frames[sheet_name], pending[sheet_name]) for sheet_name in sheet_names}, timings
+    except Exception as e:
+        # Repli feuille par feuille : chaque erreur est signalée individuellement
+        logger.warning("Chargement groupé impossible (%s), repli feuille par feuille", e)
+        return {sheet_name: fetch_data(sheet_name) for sheet_name in sheet_names}, {}
 
 def append_row(sheet_name, data):
     """Ajoute une ligne de données à la feuille spécifiée."""
     try:
-        _, sheets = init_gspread()
-        sheet = sheets[sheet_name]
-        sheet.append_row(data)
-        st.session_state['data_last_update'] = datetime.now() # Force la mise à jour
+        if WRITE_BEHIND:
+            get_mutation_queue().submit(Mutation('append', sheet_name, list(data), None, None, None))
+            return
+        position = get_backend().append(sheet_name, data)
+        # Écriture reportée dans l'instantané partagé : pas de relecture de la feuille
+        get_snapshot_cache().apply_append(sheet_name, [list(data)], position)
     except Exception as e:
         st.error(f"Erreur d'écriture dans Google Sheet ({sheet_name}). Détail: {e}")
 
@@ -241,34 +2521,638 @@ def append_row(sheet_name, data):
 def update_row_by_id(sheet_name, df, id_column, id_value, data_dict):
     """Met à jour une ligne basée sur une valeur d'ID (nécessite une recherche de ligne)."""
     try:
-        _, sheets = init_gspread()
-        sheet = sheets[sheet_name]
-        
-        # Recherche de l'index de la ligne dans le DataFrame actuel
-        try:
-            row_index = df.index[df[id_column] == id_value].tolist()[0]
-            # Les indices gspread sont basés sur 1, donc +2 pour la position dans la feuille
-            # (1 pour l'en-tête, +1 pour l'index 0)
-            sheet_row_num = row_index + 2
-        except IndexError:
-            st.warning(f"Ligne non trouvée pour l'ID {id_value} dans {sheet_name}.")
+        if WRITE_BEHIND:
+            # La ligne est localisée au moment du vidage : `df` peut ne pas encore contenir un ajout en file
+            get_mutation_queue().submit(Mutation('update', sheet_name, None, id_column, id_value, dict(data_dict)))
             return
-
-        # Création de la ligne de données à mettre à jour (liste de toutes les valeurs)
-        updated_row_data = df.loc[row_index].to_dict()
-        updated_row_data.update(data_dict)
-        
-        # Conversion du dictionnaire en liste de valeurs dans l'ordre des colonnes
-        # C'est une méthode simplifiée pour Streamlit: on assume l'ordre des colonnes
-        headers = sheet.row_values(1)
-        values_to_update = [str(updated_row_data.get(h, '')) for h in headers]
-        
-        # Mise à jour de la ligne complète
-        sheet.update(f'A{sheet_row_num}', [values_to_update])
-        st.session_state['data_last_update'] = datetime.now()
+        get_backend().update(sheet_name, df, id_column, id_value, data_dict)
+        get_snapshot_cache().apply_updates(sheet_name, {id_value: (id_column, dict(data_dict))})
+    except RowNotFound:
+        st.warning(f"Ligne non trouvée pour l'ID {id_value} dans {sheet_name}.")
     except Exception as e:
         st.error(f"Erreur de mise à jour dans Google Sheet ({sheet_name}). Détail: {e}")
 
+def archived_rollups(df_archives, sheet_name):
+    """Résumés archivés d'une feuille ('sessions' ou 'logins'), déjà typés au chargement."""
+    if df_archives is None or 'sheet' not in df_archives:
+        return apply_schema('archives', pd.DataFrame(columns=SHEET_HEADERS['archives']))
+    return df_archives[df_archives['sheet'] == sheet_name]
+
+
+def compute_task_totals(df_sessions, df_archives=None):
+    """Agrège en une passe les sessions de mission par tâche : temps total, nombre de sessions, dernière activité.
+
+    Les sessions archivées sont comptées via leurs résumés (`df_archives`).
+    """
+    parts = []
+    if not df_sessions.empty and 'pause_type' in df_sessions:
+        missions = df_sessions[df_sessions['pause_type'] == 'mission']
+        parts.append(pd.DataFrame({
+            'task_id': missions['task_id'],
+            'duration': missions['duration_seconds'],
+            'count': 1,
+            'last_event': missions[['start_at', 'pause_at', 'resume_at', 'end_at']].max(axis=1),
+        }))
+    archived = archived_rollups(df_archives, 'sessions')
+    archived = archived[archived['pause_type'] == 'mission']
+    if not archived.empty:
+        parts.append(pd.DataFrame({
+            'task_id': archived['task_id'],
+            'duration': archived['duration_seconds'],
+            'count': archived['rows'],
+            'last_event': archived['last_activity'],
+        }))
+    if not parts:
+        return pd.DataFrame(columns=['total_seconds', 'session_count', 'last_activity'], index=pd.Index([], name='task_id'))
+
+    # observed=True : seules les tâches présentes (les catégories non utilisées ne produisent pas de groupe)
+    return concat_typed(parts).groupby('task_id', observed=True).agg(
+        total_seconds=('duration', 'sum'),
+        session_count=('count', 'sum'),
+        last_activity=('last_event', 'max'),
+    )
+
+
+def task_totals(df_sessions):
+    """Agrégats par tâche, recalculés uniquement quand l'instantané des sessions change (l'archivage change les deux)."""
+    return get_snapshot_cache().derive(
+        'sessions', df_sessions, 'task_totals',
+        lambda df: compute_task_totals(df, fetch_data('archives'))
+    )
+
+
+def summarize_archived_rows(sheet_name, df, batch):
+    """Résume des lignes à archiver par jour, utilisateur, tâche et type : ce dont le reporting a besoin."""
+    if sheet_name == 'sessions':
+        duration = df['duration_seconds']
+        frame = pd.DataFrame({
+            'task_id': df['task_id'],
+            'pause_type': df['pause_type'],
+            'duration': duration,
+            # Le reporting des pauses ne compte que les sessions mises en pause
+            'paused': duration.where(df['pause_at'].notna(), 0),
+            'last_event': df[['start_at', 'pause_at', 'resume_at', 'end_at']].max(axis=1),
+        })
+    else:
+        frame = pd.DataFrame({
+            'task_id': '',
+            'pause_type': '',
+            'duration': df['total_logged_seconds'],
+            'paused': 0,
+            'last_event': df[['login_at', 'logout_at']].max(axis=1),
+        }, index=df.index)
+    # Granularité journalière : les agrégats par jour restent reconstructibles après archivage
+    frame['period'] = day_labels(df[ARCHIVE_TIME_COLUMNS[sheet_name]])
+    frame['sheet'] = sheet_name
+    frame['user_email'] = df['user_email']
+    summary = frame.groupby(['period', 'sheet', 'user_email', 'task_id', 'pause_type'], as_index=False, observed=True).agg(
+        rows=('duration', 'size'),
+        duration_seconds=('duration', 'sum'),
+        paused_seconds=('paused', 'sum'),
+        last_activity=('last_event', 'max'),
+    )
+    summary['batch'] = batch
+    return summary[SHEET_HEADERS['archives']]
+
+
+def archive_history(backend, horizon_days, queue=None, cache=None):
+    """Déplace les lignes fermées plus anciennes que l'horizon vers les archives mensuelles et laisse leurs résumés.
+
+    Ordre : copie vers l'archive, ajout des résumés, puis suppression ; un arrêt en cours de route ne perd aucune ligne.
+    Une passe à la fois, tous processus confondus (bail 'archivage') : retourne None si une autre passe est en cours.
+    Les lignes copiées et leurs résumés portent la clé de leur lot : une passe interrompue est reprise sans copier
+    ni résumer deux fois, et les lignes sont supprimées par ID, relues au moment de la suppression.
+    Retourne le nombre de lignes déplacées par feuille.
+    """
+    cutoff = pd.Timestamp(datetime.now() - timedelta(days=horizon_days))
+    moved = {}
+    with backend.lease('archivage', ARCHIVE_LEASE_SECONDS) as acquired:
+        if not acquired:
+            return None
+        summarized = None
+        for sheet_name, time_column in ARCHIVE_TIME_COLUMNS.items():
+            # La file est vidée et suspendue : aucune mise à jour ne vise une ligne pendant son déplacement
+            with queue.hold(sheet_name) if queue else contextlib.nullcontext():
+                df = backend.fetch_all(sheet_name)
+                stamps = df[time_column]
+                closed = ~df[OPEN_ROW_COLUMNS[sheet_name]].isna().all(axis=1)
+                # NaT (horodatage vide) n'est jamais antérieur à la date limite
+                selected = df[closed & (stamps < cutoff)]
+                if selected.empty:
+                    continue
+                ids = selected[SHEET_ID_COLUMNS[sheet_name]].astype(str)
+                months = stamps[selected.index].dt.strftime('%Y-%m')
+
+                # Lignes déjà copiées par une passe interrompue : elles gardent le lot de cette passe
+                batches = {}
+                for month in months.unique():
+                    batches.update(backend.archived_batches(sheet_name, month))
+                batch = str(uuid.uuid4())
+                fresh = ~ids.isin(list(batches))
+                for month, rows in selected[fresh].groupby(months[fresh]):
+                    backend.archive_rows(sheet_name, month, rows[SHEET_HEADERS[sheet_name]].values.tolist(), batch)
+
+                # Résumés des seuls lots absents de 'Archives' (lot '' : copie antérieure aux lots, déjà résumée)
+                if summarized is None:
+                    summarized = set(backend.fetch('archives')['batch'].astype(str)) | {''}
+                row_batches = ids.map(lambda id_value: batches.get(id_value, batch))
+                summaries = [
+                    summarize_archived_rows(sheet_name, rows, key)
+                    for key, rows in selected.groupby(row_batches) if key not in summarized
+                ]
+                if summaries:
+                    backend.append_many('archives', pd.concat(summaries).values.tolist())
+                    summarized.update(row_batches)
+                backend.delete_rows(sheet_name, ids.tolist())
+                moved[sheet_name] = len(selected)
+            if cache is not None:
+                cache.invalidate(sheet_name)
+                cache.invalidate('archives')
+    return moved
+
+
+@st.cache_resource
+def start_archiver():
+    """Archivage automatique : un thread par processus, relancé toutes les `ARCHIVE_INTERVAL_HOURS` heures."""
+    backend, cache = get_backend(), get_snapshot_cache()
+    queue = get_mutation_queue() if WRITE_BEHIND else None
+
+    def run():
+        while True:
+            try:
+                with api_context('archivage', user=''):
+                    moved = archive_history(backend, ARCHIVE_HORIZON_DAYS, queue, cache)
+                    # Regroupement des lignes d'incrément des agrégats, après archivage
+                    compact_rollups(backend, queue, cache)
+                if moved is None:
+                    logger.info("Archivage : passe déjà en cours dans un autre processus")
+                elif moved:
+                    logger.info("Archivage : %s", moved)
+            except Exception:
+                logger.exception("Échec de l'archivage automatique")
+            time.sleep(ARCHIVE_INTERVAL_HOURS * 3600)
+
+    thread = threading.Thread(target=run, name='klick-archiver', daemon=True)
+    thread.start()
+    return thread
+
+@st.cache_resource
+def start_sync_daemon():
+    """Synchronisation en arrière-plan : un thread par processus rafraîchit les feuilles consultées.
+
+    Les sessions lisent l'instantané publié sans attendre l'API : le trafic de lecture ne dépend plus
+    du nombre d'utilisateurs (un rechargement synchrone n'a lieu qu'au premier accès ou après invalidation).
+    """
+    backend, cache = get_backend(), get_snapshot_cache()
+
+    def run():
+        failures = 0
+        while True:
+            # Attente plus longue après des échecs successifs (max 5 min)
+            time.sleep(min(SYNC_INTERVAL_SECONDS * (2 ** failures), 300))
+            sheet_names = cache.watched(SYNC_IDLE_SECONDS)
+            if not sheet_names:
+                continue
+            try:
+                with api_context('synchronisation', user=''):
+                    # Demi-intervalle : chaque passage rafraîchit les instantanés publiés au passage précédent
+                    cache.get_many(
+                        sheet_names, backend.fetch_many, backend.fetch_delta if DELTA_SYNC else None,
+                        set(OPEN_ROW_COLUMNS), max_age=SYNC_INTERVAL_SECONDS / 2
+                    )
+                failures = 0
+            except Exception:
+                failures += 1
+                logger.exception("Échec de la synchronisation d'arrière-plan (tentative %s)", failures)
+
+    thread = threading.Thread(target=run, name='klick-sync', daemon=True)
+    thread.start()
+    return thread
+
+def _as_int(value):
+    """Valeur numérique d'une cellule (vide ou invalide -> 0)."""
+    try:
+        return int(float(value))
+    except (TypeError, ValueError):
+        return 0
+
+
+def _as_float(value):
+    """Comme `_as_int`, sans arrondi."""
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return 0.0
+
+
+def _bump_rollup(sheet_name, increments, fixed):
+    """Ajoute une ligne d'incrément `increments` à la clé d'agrégat `fixed` (jour et utilisateur, ou tâche).
+
+    Aucune lecture préalable : deux sessions ou processus qui incrémentent la même clé ajoutent chacun leur
+    ligne. Les lignes d'une même clé sont additionnées à la lecture, puis regroupées par `compact_rollups`.
+    Chaque ligne a son propre ID : un ajout rejoué n'est reconnu comme déjà écrit que par sa propre ligne.
+    """
+    row = {**fixed, **increments, SHEET_ID_COLUMNS[sheet_name]: new_record_id('R')}
+    append_row(sheet_name, [row.get(h, 0) for h in SHEET_HEADERS[sheet_name]])
+
+
+def record_session_closed(user_email, task_id, pause_type, start_at, duration, paused):
+    """Met à jour les agrégats quand une session se ferme (pause, fin de tâche, fin de pause globale)."""
+    day = str(start_at)[:10]
+    duration = int(duration)
+    daily_key = {'day': day, 'user_email': user_email}
+    if pause_type == 'mission':
+        _bump_rollup('daily_rollups', {
+            'mission_seconds': duration,
+            'mission_paused_seconds': duration if paused else 0,
+        }, daily_key)
+        _bump_rollup('task_rollups', {'total_seconds': duration, 'sessions': 1}, {'task_id': task_id, 'last_activity': format_timestamp()})
+    elif pause_type == 'global':
+        _bump_rollup('daily_rollups', {'global_pause_seconds': duration}, daily_key)
+
+
+def record_login_closed(user_email, login_at, seconds):
+    """Met à jour les agrégats quand une connexion se ferme (déconnexion)."""
+    day = str(login_at)[:10]
+    _bump_rollup('daily_rollups', {'logged_seconds': int(seconds)}, {'day': day, 'user_email': user_email})
+
+
+def compute_rollups(df_sessions, df_logins, df_archives):
+    """Recalcule les agrégats journaliers et par tâche depuis l'historique (lignes fermées + résumés archivés)."""
+    parts = []
+    tasks = []
+    if not df_sessions.empty:
+        sessions = df_sessions[df_sessions['pause_at'].notna() | df_sessions['end_at'].notna()]
+        duration = sessions['duration_seconds']
+        is_mission = sessions['pause_type'] == 'mission'
+        parts.append(pd.DataFrame({
+            'day': day_labels(sessions['start_at']),
+            'user_email': sessions['user_email'],
+            'mission_seconds': duration.where(is_mission, 0),
+            'mission_paused_seconds': duration.where(is_mission & sessions['pause_at'].notna(), 0),
+            'global_pause_seconds': duration.where(sessions['pause_type'] == 'global', 0),
+        }))
+        tasks.append(pd.DataFrame({
+            'task_id': sessions['task_id'][is_mission],
+            'duration': duration[is_mission],
+            'count': 1,
+            'last_event': sessions[['start_at', 'pause_at', 'resume_at', 'end_at']][is_mission].max(axis=1),
+        }))
+    if not df_logins.empty:
+        logins = df_logins[df_logins['logout_at'].notna()]
+        parts.append(pd.DataFrame({
+            'day': day_labels(logins['login_at']),
+            'user_email': logins['user_email'],
+            'logged_seconds': logins['total_logged_seconds'],
+        }))
+
+    archived = archived_rollups(df_archives, 'sessions')
+    archived_mission = archived['pause_type'] == 'mission'
+    parts.append(pd.DataFrame({
+        'day': archived['period'].astype(str),
+        'user_email': archived['user_email'],
+        'mission_seconds': archived['duration_seconds'].where(archived_mission, 0),
+        'mission_paused_seconds': archived['paused_seconds'].where(archived_mission, 0),
+        'global_pause_seconds': archived['duration_seconds'].where(archived['pause_type'] == 'global', 0),
+    }))
+    tasks.append(pd.DataFrame({
+        'task_id': archived['task_id'][archived_mission],
+        'duration': archived['duration_seconds'][archived_mission],
+        'count': archived['rows'][archived_mission],
+        'last_event': archived['last_activity'][archived_mission],
+    }))
+    archived_logins = archived_rollups(df_archives, 'logins')
+    parts.append(pd.DataFrame({
+        'day': archived_logins['period'].astype(str),
+        'user_email': archived_logins['user_email'],
+        'logged_seconds': archived_logins['duration_seconds'],
+    }))
+
+    counters = SHEET_HEADERS['daily_rollups'][3:]
+    daily = pd.concat(parts, ignore_index=True).reindex(columns=['day', 'user_email'] + counters)
+    daily[counters] = daily[counters].fillna(0)
+    daily = daily.groupby(['day', 'user_email'], as_index=False, observed=True)[counters].sum()
+    daily[counters] = daily[counters].astype(int)
+
+    per_task = concat_typed(tasks).groupby('task_id', as_index=False, observed=True).agg(
+        total_seconds=('duration', 'sum'),
+        sessions=('count', 'sum'),
+        last_activity=('last_event', 'max'),
+    )
+    per_task[['total_seconds', 'sessions']] = per_task[['total_seconds', 'sessions']].astype(int)
+    return _keyed_rollups(daily, per_task)
+
+
+def _keyed_rollups(daily, per_task):
+    """Agrégats regroupés (une ligne par clé), avec l'ID de ligne tiré de la clé et les colonnes dans l'ordre des feuilles."""
+    daily = daily.assign(rollup_id=daily['day'].astype(str) + '|' + daily['user_email'].astype(str))
+    per_task = per_task.assign(rollup_id=per_task['task_id'].astype(str))
+    return daily[SHEET_HEADERS['daily_rollups']], per_task[SHEET_HEADERS['task_rollups']]
+
+
+def fold_rollups(df_daily, df_task_rollups):
+    """Une ligne par clé d'agrégat : les lignes d'une même clé (jour et utilisateur, ou tâche) sont additionnées."""
+    counters = SHEET_HEADERS['daily_rollups'][3:]
+    daily = df_daily.groupby(['day', 'user_email'], as_index=False, observed=True)[counters].sum()
+    per_task = df_task_rollups.groupby('task_id', as_index=False, observed=True).agg(
+        total_seconds=('total_seconds', 'sum'),
+        sessions=('sessions', 'sum'),
+        last_activity=('last_activity', 'max'),
+    )
+    return _keyed_rollups(daily, per_task)
+
+
+def merge_rollups(partials):
+    """Fusionne des agrégats (daily, per_task) de `compute_rollups` calculés sur des morceaux disjoints de l'historique."""
+    return fold_rollups(
+        pd.concat([daily for daily, _ in partials], ignore_index=True),
+        concat_typed([per_task for _, per_task in partials]),
+    )
+
+
+def _held(queue, sheet_names):
+    """Vide puis suspend la file d'écritures de ces feuilles le temps du bloc (aucune si `queue` est None)."""
+    stack = contextlib.ExitStack()
+    if queue is not None:
+        for sheet_name in sheet_names:
+            stack.enter_context(queue.hold(sheet_name))
+    return stack
+
+
+def _rewrite_rollups(backend, current, tables, cache):
+    """Remplace les lignes d'agrégat lues (`current`, par feuille) par `tables`, feuille par feuille et atomiquement.
+
+    Les lignes ajoutées après la lecture (incréments d'autres processus) ne sont pas touchées.
+    """
+    for sheet_name, table in zip(DERIVED_SHEETS, tables):
+        ids = current[sheet_name][SHEET_ID_COLUMNS[sheet_name]].unique().tolist()
+        if ids or not table.empty:
+            backend.replace_rows(sheet_name, ids, table.values.tolist())
+        if cache is not None:
+            cache.invalidate(sheet_name)
+
+
+def rebuild_rollups(backend, queue=None, cache=None):
+    """Réécrit les agrégats à partir de l'historique (premier démarrage, réparation) : une ligne par clé.
+
+    Les lignes d'agrégat sont lues juste avant l'historique et seules celles-ci sont remplacées. Les écritures
+    de ce processus sur l'historique et les agrégats restent en file jusqu'à la fin. Une reconstruction ou un
+    regroupement à la fois, tous processus confondus (bail 'agrégats') : retourne False si un autre est en cours.
+    """
+    with backend.lease('agrégats', ARCHIVE_LEASE_SECONDS) as acquired:
+        if not acquired:
+            return False
+        with _held(queue, ('sessions', 'logins') + DERIVED_SHEETS):
+            current = {sheet_name: backend.fetch(sheet_name) for sheet_name in DERIVED_SHEETS}
+            tables = compute_rollups(backend.fetch_all('sessions'), backend.fetch_all('logins'), backend.fetch('archives'))
+            _rewrite_rollups(backend, current, tables, cache)
+    return True
+
+
+def compact_rollups(backend, queue=None, cache=None):
+    """Regroupe les lignes d'incrément des agrégats (une ligne par clé) sans relire l'historique.
+
+    Les lignes lues sont remplacées par leur somme : le total ne change pas, même si d'autres processus
+    ajoutent des incréments pendant le regroupement. Retourne False si le bail 'agrégats' est pris.
+    """
+    with backend.lease('agrégats', ARCHIVE_LEASE_SECONDS) as acquired:
+        if not acquired:
+            return False
+        with _held(queue, DERIVED_SHEETS):
+            current = {sheet_name: backend.fetch(sheet_name) for sheet_name in DERIVED_SHEETS}
+            tables = fold_rollups(*current.values())
+            if any(len(table) < len(current[sheet_name]) for sheet_name, table in zip(DERIVED_SHEETS, tables)):
+                _rewrite_rollups(backend, current, tables, cache)
+    return True
+
+
+@st.cache_resource
+def ensure_rollups():
+    """Construit les agrégats une fois par processus s'ils sont vides alors que l'historique ne l'est pas."""
+    backend = get_backend()
+    if backend.fetch('daily_rollups').empty and not (backend.fetch('sessions').empty and backend.fetch('logins').empty):
+        rebuild_rollups(backend, get_mutation_queue() if WRITE_BEHIND else None, get_snapshot_cache())
+    return True
+
+def build_user_directory(df_users):
+    """Annuaire {user_email: compte} : comptes préexistants du code, remplacés par ceux de la feuille Users.
+
+    Un compte est un dict {'prénom', 'rôle', 'in_sheet'} ; `in_sheet` est faux tant que le compte
+    préexistant n'a pas encore été recopié dans la feuille (première connexion).
+    """
+    directory = {
+        email: {'prénom': account['name'], 'rôle': account['role'], 'in_sheet': False}
+        for email, account in PRE_EXISTING_ACCOUNTS.items()
+    }
+    if not df_users.empty:
+        # Première ligne de chaque email, comme la recherche qu'il remplace
+        first_rows = df_users.drop_duplicates('user_email')
+        for email, name, role in zip(first_rows['user_email'], first_rows['prénom'], first_rows['rôle']):
+            directory[str(email)] = {'prénom': name, 'rôle': role, 'in_sheet': True}
+    return directory
+
+
+def advance_user_directory(directory, change):
+    """Annuaire avec les comptes ajoutés (copie : l'annuaire reçu reste inchangé) ; une autre écriture impose une reconstruction."""
+    kind, detail = change
+    if kind not in ('append', 'insert'):
+        return None
+    directory = dict(directory)
+    for email, name, role, *_ in detail:
+        if not directory.get(email, {}).get('in_sheet'):
+            directory[email] = {'prénom': name, 'rôle': role, 'in_sheet': True}
+    return directory
+
+
+# Connexions ouvertes : {user_email: login_id} et {login_id: (user_email, login_at)}
+OpenLogins = namedtuple('OpenLogins', ['by_user', 'rows'])
+
+
+def build_open_logins(df_logins):
+    """Index de la dernière connexion ouverte (sans déconnexion) de chaque utilisateur."""
+    index = OpenLogins({}, {})
+    if df_logins.empty:
+        return index
+    open_rows = df_logins[df_logins['logout_at'].isna()].drop_duplicates('user_email', keep='last')
+    for login_id, email, login_at in zip(open_rows['login_id'], open_rows['user_email'], open_rows['login_at']):
+        index.by_user[str(email)] = login_id
+        index.rows[login_id] = (str(email), login_at)
+    return index
+
+
+def advance_open_logins(index, change):
+    """Index avec une connexion ajoutée ou une déconnexion (logout_at renseigné), en copie : l'index reçu reste inchangé."""
+    kind, detail = change
+    index = OpenLogins(dict(index.by_user), dict(index.rows))
+    if kind in ('append', 'insert'):
+        for login_id, email, login_at, logout_at, *_ in detail:
+            if logout_at not in ('', None):
+                continue
+            index.rows.pop(index.by_user.get(email), None)
+            index.by_user[email] = login_id
+            index.rows[login_id] = (email, pd.Timestamp(login_at))
+    else:
+        for login_id, (id_column, data_dict) in detail.items():
+            if id_column != 'login_id':
+                return None
+            if data_dict.get('logout_at') and login_id in index.rows:
+                email, _ = index.rows.pop(login_id)
+                if index.by_user.get(email) == login_id:
+                    del index.by_user[email]
+    return index
+
+
+def _pending_changes(sheet_name):
+    """Écritures encore en file d'une feuille, au format des écritures reportées (voir `SnapshotCache.derive`).
+
+    À relever avant l'instantané, comme `_pending_mutations`.
+    """
+    return [
+        ('append', [m.values]) if m.kind == 'append' else ('update', {m.id_value: (m.id_column, m.data)})
+        for m in _pending_mutations(sheet_name)
+    ]
+
+
+def find_account(email):
+    """Compte de `email` (voir `build_user_directory`) ou None : recherche en temps constant dans l'annuaire partagé."""
+    pending = _pending_changes('users')
+    directory = get_snapshot_cache().derive(
+        'users', fetch_snapshot('users'), 'directory', build_user_directory, advance_user_directory
+    )
+    account = directory.get(email)
+    # Écritures en file : rejouées sur une copie de la seule entrée demandée
+    entry = {email: account} if account is not None else {}
+    for change in pending:
+        entry = advance_user_directory(entry, change) or entry
+    return entry.get(email)
+
+
+def find_open_login(email):
+    """Connexion ouverte de `email` : (login_id, login_at) ou None, sans parcourir la feuille Logins."""
+    pending = _pending_changes('logins')
+    index = get_snapshot_cache().derive(
+        'logins', fetch_snapshot('logins'), 'open_logins', build_open_logins, advance_open_logins
+    )
+    login_id = index.by_user.get(email)
+    row = index.rows.get(login_id)
+    entry = OpenLogins({email: login_id}, {login_id: row}) if row is not None else OpenLogins({}, {})
+    for change in pending:
+        entry = advance_open_logins(entry, change) or entry
+    login_id = entry.by_user.get(email)
+    return (login_id, entry.rows[login_id][1]) if login_id is not None else None
+
+
+# Index temporel de Sessions ou Logins : horodatages triés (DatetimeIndex) et positions des lignes correspondantes,
+# pour toute la feuille et par utilisateur, et nombre de lignes de l'instantané indexé
+TimeIndex = namedtuple('TimeIndex', ['stamps', 'positions', 'by_user', 'rows'])
+
+
+def build_time_index(df, time_column):
+    """Trie les lignes par `time_column` (lignes sans horodatage exclues) ; les ajouts suivants y sont insérés par `advance_time_index`."""
+    stamps = df[time_column].reset_index(drop=True).dropna().sort_values(kind='stable')
+    users = df['user_email'].reset_index(drop=True).loc[stamps.index]
+    by_user = {
+        str(email): (pd.DatetimeIndex(group), group.index.to_numpy())
+        for email, group in stamps.groupby(users, observed=True, sort=False)
+    }
+    return TimeIndex(pd.DatetimeIndex(stamps), stamps.index.to_numpy(), by_user, len(df))
+
+
+def _insert_sorted(stamps, positions, new_stamps, new_positions):
+    """Insère des lignes dans un index trié sans le retrier : recherche dichotomique, ex æquo après les lignes existantes."""
+    order = np.argsort(new_stamps.to_numpy(), kind='stable')
+    new_stamps, new_positions = new_stamps[order], new_positions[order]
+    at = stamps.searchsorted(new_stamps, side='right')
+    return pd.DatetimeIndex(np.insert(stamps.to_numpy(), at, new_stamps.to_numpy())), np.insert(positions, at, new_positions)
+
+
+def advance_time_index(index, change, sheet_name):
+    """Index avec les lignes ajoutées en fin de feuille, insérées à leur place (copie : l'index reçu reste inchangé).
+
+    Une insertion au milieu (moteur réparti) ou une mise à jour de l'horodatage ou de l'utilisateur impose une reconstruction.
+    """
+    kind, detail = change
+    time_column = ARCHIVE_TIME_COLUMNS[sheet_name]
+    if kind == 'update':
+        changed = any(time_column in data or 'user_email' in data for _, data in detail.values())
+        return None if changed else index
+    if kind != 'append':
+        return None
+    appended = apply_schema(sheet_name, pd.DataFrame(detail, columns=SHEET_HEADERS[sheet_name]))
+    appended.index = pd.RangeIndex(index.rows, index.rows + len(appended))
+    appended = appended[appended[time_column].notna()]
+    stamps, positions = _insert_sorted(
+        index.stamps, index.positions, pd.DatetimeIndex(appended[time_column]), appended.index.to_numpy()
+    )
+    by_user = dict(index.by_user)
+    for email, group in appended.groupby(appended['user_email'].astype(str), sort=False):
+        user_stamps, user_positions = by_user.get(email, (pd.DatetimeIndex([]), np.array([], dtype=int)))
+        by_user[email] = _insert_sorted(user_stamps, user_positions, pd.DatetimeIndex(group[time_column]), group.index.to_numpy())
+    return TimeIndex(stamps, positions, by_user, index.rows + len(detail))
+
+
+def _range_years(start=None, end=None):
+    """Années ({'AAAA'}) couvertes par [start, end), ou None (toutes) si la période n'a pas de début."""
+    if start is None:
+        return None
+    last = (pd.Timestamp(end) - pd.Timedelta(microseconds=1)).year if end is not None else datetime.now().year
+    return {str(year) for year in range(pd.Timestamp(start).year, last + 1)}
+
+
+def query_history(sheet_name, user=None, start=None, end=None, pause_type=None):
+    """Lignes de Sessions ou Logins datées dans [start, end), d'un utilisateur et d'un type de pause (None : tous).
+
+    Seule la tranche correspondante de l'index temporel est lue (recherche dichotomique), puis complétée
+    des écritures encore en file et, pour un moteur réparti, des années passées de la période ; les lignes
+    sont retournées dans l'ordre de la feuille (années passées d'abord).
+    """
+    time_column = ARCHIVE_TIME_COLUMNS[sheet_name]
+    pending = _pending_mutations(sheet_name)
+    df = fetch_snapshot(sheet_name)
+    if df.empty:
+        rows = _with_pending(df, pending)
+    else:
+        index = get_snapshot_cache().derive(
+            sheet_name, df, 'time_index', lambda d: build_time_index(d, time_column),
+            lambda index, change: advance_time_index(index, change, sheet_name),
+        )
+        stamps, positions = index.by_user.get(user, (pd.DatetimeIndex([]), [])) if user else (index.stamps, index.positions)
+        low = stamps.searchsorted(pd.Timestamp(start)) if start is not None else 0
+        high = stamps.searchsorted(pd.Timestamp(end)) if end is not None else len(stamps)
+        rows = _with_pending(df.iloc[positions[low:high]].sort_index(), pending)
+    # Années passées d'un moteur réparti (absentes de l'instantané) : seules celles de la période sont lues
+    past = get_backend().fetch_past(sheet_name, _range_years(start, end))
+    if past is not None:
+        rows = concat_typed([past, rows])
+
+    # Les écritures en file (ajouts d'autres utilisateurs, autres dates) sont filtrées sur la petite tranche
+    keep = rows[time_column].notna()
+    if start is not None:
+        keep &= rows[time_column] >= pd.Timestamp(start)
+    if end is not None:
+        keep &= rows[time_column] < pd.Timestamp(end)
+    if user:
+        keep &= rows['user_email'] == user
+    if pause_type is not None and 'pause_type' in rows:
+        keep &= rows['pause_type'] == pause_type
+    return rows[keep]
+
+
+def range_rollups(user=None, start=None, end=None):
+    """Agrégats (daily, per_task) d'une période et d'un utilisateur, depuis les seules lignes de cette période."""
+    archives = fetch_data('archives')
+    if not archives.empty:
+        # Résumés archivés journaliers : filtrés sur leur jour 'AAAA-MM-JJ'
+        keep = pd.Series(True, index=archives.index)
+        if start is not None:
+            keep &= archives['period'] >= pd.Timestamp(start).strftime('%Y-%m-%d')
+        if end is not None:
+            keep &= archives['period'] < pd.Timestamp(end).strftime('%Y-%m-%d')
+        if user:
+            keep &= archives['user_email'] == user
+        archives = archives[keep]
+    return compute_rollups(query_history('sessions', user, start, end), query_history('logins', user, start, end), archives)
+
 # --- 4. LOGIQUE D'AUTHENTIFICATION ET DE GESTION DES SESSIONS ---
 
 def check_login():
@@ -285,7 +3169,6 @@ def check_login():
         st.session_state['active_task_id'] = None
         st.session_state['task_timer_start'] = None
         st.session_state['task_last_session_id'] = None
-        st.session_state['data_last_update'] = datetime.now()
         
     # 2. Si déjà connecté, logiquement on ne fait rien de plus.
     if st.session_state['logged_in']:
@@ -298,30 +3181,31 @@ def check_login():
         return
 
     # 3. Fonction de déconnexion
+@api_context('logout')
 def logout():
     """Déconnecte l'utilisateur et log l'événement."""
     if st.session_state.get('logged_in'):
-        # Log de l'événement de déconnexion
-        df_logins = fetch_data('logins')
-        last_login_row = df_logins[df_logins['user_email'] == st.session_state['user_email']].tail(1)
+        # Log de l'événement de déconnexion (connexion ouverte lue dans l'index, sans parcourir Logins)
+        open_login = find_open_login(st.session_state['user_email'])
         
-        if not last_login_row.empty:
-            login_id = last_login_row['login_id'].values[0]
-            login_at_str = last_login_row['login_at'].values[0]
+        if open_login is not None:
+            login_id, login_at = open_login
+            login_at_dt = login_at.to_pydatetime()
+            login_at_str = format_timestamp(login_at_dt)
             
             # Calcul du temps total de connexion
-            login_at_dt = datetime.strptime(login_at_str, '%Y-%m-%d %H:%M:%S')
             logout_at_str = format_timestamp()
             total_seconds = (datetime.now() - login_at_dt).total_seconds()
             
             # Mise à jour de la feuille Logins
             update_row_by_id(
                 'logins', 
-                df_logins, 
+                None, 
                 'login_id', 
                 login_id, 
                 {'logout_at': logout_at_str, 'total_logged_seconds': int(total_seconds)}
             )
+            record_login_closed(st.session_state['user_email'], login_at_str, total_seconds)
         
         # Réinitialisation des états
         st.session_state['logged_in'] = False
@@ -343,17 +3227,14 @@ def login_form():
                 st.error("Veuillez entrer une adresse email valide.")
                 return
 
-            df_users = fetch_data('users')
-            user_data = df_users[df_users['user_email'] == email]
-            
-            # Simulation d'un utilisateur préexistant (hardcodé)
-            pre_existing_user = PRE_EXISTING_ACCOUNTS.get(email)
+            # Annuaire en mémoire : feuille Users et comptes préexistants (hardcodés)
+            account = find_account(email)
 
-            if not user_data.empty:
+            if account is not None and account['in_sheet']:
                 # CAS 1 : Utilisateur trouvé dans Google Sheets
                 st.session_state['user_email'] = email
-                st.session_state['user_name'] = user_data['prénom'].values[0]
-                st.session_state['user_role'] = user_data['rôle'].values[0]
+                st.session_state['user_name'] = account['prénom']
+                st.session_state['user_role'] = account['rôle']
                 st.session_state['logged_in'] = True
                 st.success(f"Bienvenue, {st.session_state['user_name']} (Rôle : {st.session_state['user_role']})")
                 
@@ -361,13 +3242,13 @@ def login_form():
                 log_new_login(email)
                 st.rerun()
 
-            elif pre_existing_user:
+            elif account is not None:
                 # CAS 2 : Utilisateur connu dans le code, mais pas encore dans Google Sheets (Première connexion)
-                log_new_user(email, pre_existing_user['name'], pre_existing_user['role'])
+                log_new_user(email, account['prénom'], account['rôle'])
                 
                 st.session_state['user_email'] = email
-                st.session_state['user_name'] = pre_existing_user['name']
-                st.session_state['user_role'] = pre_existing_user['role']
+                st.session_state['user_name'] = account['prénom']
+                st.session_state['user_role'] = account['rôle']
                 st.session_state['logged_in'] = True
                 st.success(f"Compte préexistant synchronisé. Bienvenue, {st.session_state['user_name']} (Rôle : {st.session_state['user_role']})")
 
@@ -409,7 +3290,7 @@ def log_new_user(email, name, role):
     
 def log_new_login(email):
     """Enregistre un événement de connexion dans la feuille Logins."""
-    login_id = 'L' + datetime.now().strftime('%Y%m%d%H%M%S') + str(int(time.time() * 1000) % 1000)
+    login_id = new_record_id('L')
     login_data = [
         login_id,
         email,
@@ -421,6 +3302,7 @@ def log_new_login(email):
 
 # --- 5. LOGIQUE DE CHRONOMÈTRE ET GESTION DE TÂCHES ---
 
+@api_context('toggle_global_pause')
 def toggle_global_pause(pause_type='global'):
     """Active ou désactive la pause globale et gère l'arrêt du chronomètre de tâche."""
     if not st.session_state['logged_in']: return
@@ -449,6 +3331,7 @@ def toggle_global_pause(pause_type='global'):
                 session_id, 
                 {'pause_at': st.session_state['global_pause_start'], 'duration_seconds': duration}
             )
+            record_session_closed(st.session_state['user_email'], task_id, 'mission', st.session_state['task_timer_start'], duration, paused=True)
             
             # Mettre à jour l'état local de la tâche
             st.session_state['active_task_id'] = None
@@ -458,7 +3341,7 @@ def toggle_global_pause(pause_type='global'):
         st.info("PAUSE GLOBALE ACTIVÉE (max 1 heure). Le chronomètre de tâche a été arrêté.")
 
         # Log de la session de pause globale (simulée comme une session de tâche)
-        pause_session_id = 'P' + datetime.now().strftime('%Y%m%d%H%M%S') + str(int(time.time() * 1000) % 1000)
+        pause_session_id = new_record_id('P')
         pause_data = [
             pause_session_id,
             'GLOBAL_PAUSE',
@@ -481,7 +3364,6 @@ def toggle_global_pause(pause_type='global'):
         # Mettre à jour la session de pause globale
         global_pause_session_id = st.session_state.get('global_pause_session_id')
         if global_pause_session_id:
-            df_sessions = fetch_data('sessions') # Recharger pour avoir la ligne de pause
             pause_start_dt = datetime.strptime(st.session_state['global_pause_start'], '%Y-%m-%d %H:%M:%S')
             total_duration = (datetime.now() - pause_start_dt).total_seconds()
             
@@ -492,6 +3374,7 @@ def toggle_global_pause(pause_type='global'):
                 global_pause_session_id, 
                 {'end_at': pause_end_time, 'duration_seconds': int(total_duration)}
             )
+            record_session_closed(st.session_state['user_email'], 'GLOBAL_PAUSE', 'global', st.session_state['global_pause_start'], total_duration, paused=False)
         
         st.session_state['global_pause_start'] = None
         st.session_state['global_pause_session_id'] = None
@@ -504,6 +3387,7 @@ def toggle_global_pause(pause_type='global'):
     st.rerun()
 
 
+@api_context('start_task')
 def start_task(task_id, df_tasks):
     """Démarre le chronomètre pour une tâche."""
     
@@ -523,7 +3407,7 @@ def start_task(task_id, df_tasks):
         update_row_by_id('tasks', df_tasks, 'task_id', task_id, {'statut': 'En cours'})
 
     # 2. Créer une nouvelle ligne dans 'Sessions'
-    session_id = 'S' + datetime.now().strftime('%Y%m%d%H%M%S') + str(int(time.time() * 1000) % 1000)
+    session_id = new_record_id('S')
     start_time_str = format_timestamp()
     
     new_session_data = [
@@ -546,6 +3430,7 @@ def start_task(task_id, df_tasks):
     st.toast(f"Tâche {task_id} démarrée !", icon="🚀")
     st.rerun()
 
+@api_context('pause_task')
 def pause_task(task_id, df_tasks):
     """Met en pause le chronomètre de la tâche active."""
     if st.session_state['active_task_id'] != task_id: return
@@ -566,6 +3451,7 @@ def pause_task(task_id, df_tasks):
         session_id, 
         {'pause_at': pause_time_str, 'duration_seconds': int(duration)}
     )
+    record_session_closed(st.session_state['user_email'], task_id, 'mission', st.session_state['task_timer_start'], duration, paused=True)
     
     # 3. Mettre à jour l'état local
     st.session_state['active_task_id'] = None
@@ -574,6 +3460,7 @@ def pause_task(task_id, df_tasks):
     st.toast(f"Tâche {task_id} mise en PAUSE.", icon="⏸️")
     st.rerun()
 
+@api_context('resume_task')
 def resume_task(task_id, df_tasks):
     """Reprend le chronomètre pour une tâche mise en pause (crée une nouvelle session)."""
     if st.session_state['active_task_id']:
@@ -583,7 +3470,7 @@ def resume_task(task_id, df_tasks):
     df_sessions = fetch_data('sessions')
     
     # 1. Créer une nouvelle ligne dans 'Sessions' (avec resume_at)
-    session_id = 'S' + datetime.now().strftime('%Y%m%d%H%M%S') + str(int(time.time() * 1000) % 1000)
+    session_id = new_record_id('S')
     resume_time_str = format_timestamp()
     
     new_session_data = [
@@ -606,6 +3493,7 @@ def resume_task(task_id, df_tasks):
     st.toast(f"Tâche {task_id} reprise !", icon="▶️")
     st.rerun()
 
+@api_context('complete_task')
 def complete_task(task_id, df_tasks):
     """Termine la tâche : arrête le chrono (si actif) et met à jour le statut."""
     
@@ -626,6 +3514,7 @@ def complete_task(task_id, df_tasks):
             session_id, 
             {'end_at': end_time_str, 'duration_seconds': int(duration)}
         )
+        record_session_closed(st.session_state['user_email'], task_id, 'mission', st.session_state['task_timer_start'], duration, paused=False)
         
         # Réinitialiser l'état local
         st.session_state['active_task_id'] = None
@@ -640,13 +3529,8 @@ def complete_task(task_id, df_tasks):
         st.error("Seul un administrateur peut modifier une tâche déjà terminée.")
         return
 
-    # Calculer le temps total (nécessite le Reporting DF pour la somme)
-    df_sessions_all = fetch_data('sessions')
-    task_sessions = df_sessions_all[
-        (df_sessions_all['task_id'] == task_id) & 
-        (df_sessions_all['pause_type'] == 'mission')
-    ]
-    total_time_seconds = task_sessions['duration_seconds'].astype(float).sum()
+    # Calculer le temps total (agrégat par tâche des sessions de mission)
+    total_time_seconds = task_totals(fetch_data('sessions'))['total_seconds'].get(task_id, 0)
 
     # Mise à jour de la tâche
     update_row_by_id(
@@ -667,36 +3551,84 @@ def complete_task(task_id, df_tasks):
     
 # --- 6. INTERFACES UTILISATEUR ---
 
+TASK_ROW_COLUMNS = ['task_id', 'titre', 'description', 'assigné_email', 'created_at', 'due_datetime', 'statut', 'closed_at']
+# Tris proposés : libellé -> (colonne, ordre décroissant)
+TASK_SORTS = {
+    "Création (récentes d'abord)": ('created_at', True),
+    "Échéance (proches d'abord)": ('due_datetime', False),
+    "Titre (A → Z)": ('titre', False),
+    "Statut": ('statut', False),
+}
+
+def build_task_rows(df_tasks):
+    """Modèle de ligne compact de la liste : dictionnaires de chaînes, tâches supprimées (DELETED) exclues."""
+    visible = df_tasks[df_tasks['statut'] != 'DELETED'] if 'statut' in df_tasks else df_tasks
+    return text_frame(visible.reindex(columns=TASK_ROW_COLUMNS)).to_dict('records')
+
+def task_rows(df_tasks):
+    """Modèle de ligne, reconstruit uniquement quand l'instantané des tâches change."""
+    return get_snapshot_cache().derive('tasks', df_tasks, 'task_rows', build_task_rows)
+
+def filter_task_rows(rows, user_email, statuses=None, assignee=None, due_before=None, sort_label=None):
+    """Filtre (visibilité, statut, assigné, échéance) et trie les lignes de la liste des tâches."""
+    due_limit = due_before.isoformat() if due_before else None
+    selected = [
+        row for row in rows
+        # TOUTES les tâches non-terminées ET les tâches terminées qui sont assignées à l'utilisateur
+        if (row['statut'] != 'Terminer' or row['assigné_email'] == user_email)
+        and (not statuses or row['statut'] in statuses)
+        and (not assignee or row['assigné_email'] == assignee)
+        and (due_limit is None or (row['due_datetime'] and row['due_datetime'][:10] <= due_limit))
+    ]
+    column, descending = TASK_SORTS.get(sort_label, TASK_SORTS["Création (récentes d'abord)"])
+    selected.sort(key=lambda row: row[column], reverse=descending)
+    return selected
+
 def display_task_list(df_tasks, df_sessions):
-    """Affiche la liste des tâches avec les chronomètres et les actions."""
+    """Affiche la liste des tâches avec les chronomètres et les actions (filtrée, triée et paginée)."""
 
     st.markdown("## Tâches en Attente et en Cours")
     st.divider()
 
-    # Filtrer les tâches assignées à l'utilisateur ou non terminées
     user_email = st.session_state['user_email']
+    rows = task_rows(df_tasks)
+
+    with st.expander("🔎 Filtres et tri"):
+        col_status, col_assignee, col_due, col_sort = st.columns(4)
+        statuses = col_status.multiselect("Statut", ['À faire', 'En cours', 'Terminer'], key="task_filter_status")
+        assignees = sorted({row['assigné_email'] for row in rows})
+        assignee = col_assignee.selectbox("Assigné à", ['Tous'] + assignees, key="task_filter_assignee")
+        due_before = col_due.date_input("Échéance avant le", value=None, key="task_filter_due")
+        sort_label = col_sort.selectbox("Tri", list(TASK_SORTS), key="task_sort")
+
+    filtered_tasks = filter_task_rows(
+        rows, user_email, statuses, None if assignee == 'Tous' else assignee, due_before, sort_label
+    )
     
-    # Afficher TOUTES les tâches non-terminées ET les tâches terminées qui sont assignées à l'utilisateur
-    filtered_tasks = df_tasks[
-        (df_tasks['statut'] != 'Terminer') | 
-        (df_tasks['assigné_email'] == user_email)
-    ].sort_values(by='created_at', ascending=False).reset_index(drop=True)
-    
-    if filtered_tasks.empty:
+    if not filtered_tasks:
         st.info("Aucune tâche à afficher. L'administrateur peut en créer une nouvelle.")
         return
 
-    # Boucle sur les tâches pour l'affichage
-    for index, task in filtered_tasks.iterrows():
+    # Pagination : seules les tâches de la page courante sont rendues
+    page_count = -(-len(filtered_tasks) // TASK_PAGE_SIZE)
+    st.session_state['task_page'] = min(st.session_state.get('task_page', 1), page_count)
+    if page_count > 1:
+        st.number_input(f"Page (sur {page_count})", min_value=1, max_value=page_count, step=1, key="task_page")
+    page = st.session_state['task_page']
+    page_rows = filtered_tasks[(page - 1) * TASK_PAGE_SIZE:page * TASK_PAGE_SIZE]
+    st.caption(f"{len(filtered_tasks)} tâche(s) — page {page}/{page_count}")
+
+    # Temps déjà passé par tâche : agrégat mémorisé, consulté pour les seules lignes affichées
+    time_spent = task_totals(df_sessions)['total_seconds']
+
+    # Boucle sur les tâches de la page pour l'affichage
+    for task in page_rows:
         task_id = task['task_id']
         current_status = task['statut']
         assigned_to = task['assigné_email']
         
-        # Calcul du temps total déjà passé
-        total_time_spent = df_sessions[
-            (df_sessions['task_id'] == task_id) & 
-            (df_sessions['pause_type'] == 'mission')
-        ]['duration_seconds'].astype(float).sum()
+        # Temps total déjà passé
+        total_time_spent = time_spent.get(task_id, 0)
         
         # Vérification si cette tâche est ACTIVE dans la session de l'utilisateur
         is_active = st.session_state['active_task_id'] == task_id
@@ -719,7 +3651,7 @@ def display_task_list(df_tasks, df_sessions):
                 start_dt = datetime.strptime(st.session_state['task_timer_start'], '%Y-%m-%d %H:%M:%S')
                 current_session_duration = (datetime.now() - start_dt).total_seconds()
                 display_time += current_session_duration
-                st.markdown(f"**EN COURS...** ({seconds_to_hms(display_time)})", unsafe_allow_html=True)
+                live_timer(display_time)
             else:
                 st.markdown(f"**Total Passé :** {seconds_to_hms(display_time)}")
 
@@ -770,7 +3702,7 @@ def admin_task_management(df_tasks, df_users):
 
         if submitted:
             if title and description:
-                task_id = 'T' + datetime.now().strftime('%Y%m%d%H%M%S')
+                task_id = new_record_id('T')
                 due_datetime_str = f"{due_date} {due_time}"
                 
                 new_task_data = [
@@ -804,34 +3736,99 @@ def admin_task_management(df_tasks, df_users):
         st.success(f"Tâche {task_to_delete} marquée comme supprimée.")
         st.rerun()
 
-def display_reporting(df_tasks, df_sessions, df_logins, df_users):
-    """Affiche les métriques de reporting."""
+def period_timesheet(df_daily, period='W'):
+    """Feuille de temps par période ('D' jour, 'W' semaine, 'M' mois) et par utilisateur, depuis les agrégats journaliers."""
+    counters = SHEET_HEADERS['daily_rollups'][3:]
+    daily = df_daily.reindex(columns=['day', 'user_email'] + counters)
+    daily[counters] = daily[counters].fillna(0)
+    start = pd.to_datetime(daily['day'], format='%Y-%m-%d', errors='coerce').dt.to_period(period).dt.start_time.dt.date
+    timesheet = daily.assign(période=start).groupby(['période', 'user_email'], as_index=False, observed=True)[counters].sum()
+    return timesheet.sort_values('période', ascending=False)
+
+
+def compute_reporting_tables(df_daily):
+    """Totaux par utilisateur et feuille de temps hebdomadaire, calculés depuis les agrégats journaliers."""
+    counters = SHEET_HEADERS['daily_rollups'][3:]
+    daily = df_daily.reindex(columns=['day', 'user_email'] + counters)
+    daily[counters] = daily[counters].fillna(0)
+    per_user = daily.groupby('user_email', as_index=False, observed=True)[counters].sum()
+    return per_user, period_timesheet(df_daily, 'W').rename(columns={'période': 'semaine'})
+
+
+def task_duration_table(df_tasks, df_task_rollups, scoped=False):
+    """Rapport 1 : tâches terminées, avec leur temps total (secondes) et leur nombre de sessions.
+
+    Avec `scoped`, le temps est celui des agrégats fournis (sessions de la période filtrée) et non le cumul de la tâche.
+    """
+    task_times = df_tasks[df_tasks['statut'] == 'Terminer'].copy()
+    # Plusieurs lignes d'incrément par tâche : additionnées
+    per_task = df_task_rollups.groupby('task_id', observed=True)[['total_seconds', 'sessions']].sum()
+    task_times['sessions'] = task_times['task_id'].map(per_task['sessions']).fillna(0).astype(int)
+    if scoped:
+        task_times['total_time_seconds'] = task_times['task_id'].map(per_task['total_seconds']).fillna(0).astype(int)
+    return task_times[['task_id', 'titre', 'assigné_email', 'statut', 'total_time_seconds', 'sessions', 'closed_at']]
+
+
+def pause_table(per_user):
+    """Rapport 3 : pauses par utilisateur, une ligne par type (Mission, Globale) non nul."""
+    mission = per_user[per_user['mission_paused_seconds'] > 0][['user_email', 'mission_paused_seconds']]
+    mission = mission.rename(columns={'mission_paused_seconds': 'duration_seconds'}).assign(Type='Mission')
+    global_pauses = per_user[per_user['global_pause_seconds'] > 0][['user_email', 'global_pause_seconds']]
+    global_pauses = global_pauses.rename(columns={'global_pause_seconds': 'duration_seconds'}).assign(Type='Globale')
+    return pd.concat([mission, global_pauses])
+
+
+def display_reporting(df_tasks, df_users, df_daily, df_task_rollups):
+    """Affiche les métriques de reporting (lues uniquement dans les agrégats matérialisés)."""
     st.markdown("## Rapport d'Activité Général")
+
+    # Filtres : sans période ni utilisateur, le rapport est lu dans les agrégats matérialisés (tout l'historique)
+    col_range, col_user = st.columns(2)
+    period = col_range.date_input("Période", value=(), key="report_range")
+    emails = sorted(df_users['user_email'].astype(str).unique()) if not df_users.empty else []
+    user_choice = col_user.selectbox("Utilisateur", ["Tous"] + emails, key="report_user")
+    user = None if user_choice == "Tous" else user_choice
+    start = pd.Timestamp(period[0]) if len(period) > 0 else None
+    end = pd.Timestamp(period[1]) + pd.Timedelta(days=1) if len(period) > 1 else None
+
+    scoped = start is not None or user is not None
+    if not scoped:
+        per_user, weekly = get_snapshot_cache().derive('daily_rollups', df_daily, 'reporting', compute_reporting_tables)
+    else:
+        # Requête sur la seule tranche de l'historique concernée (index temporels de Sessions et Logins)
+        df_daily, df_task_rollups = range_rollups(user, start, end)
+        per_user, weekly = compute_reporting_tables(df_daily)
+        closed_at = df_tasks['closed_at']
+        in_range = pd.Series(True, index=df_tasks.index)
+        if start is not None:
+            in_range &= closed_at >= start
+        if end is not None:
+            in_range &= closed_at < end
+        if user is not None:
+            in_range &= df_tasks['assigné_email'] == user
+        df_tasks = df_tasks[in_range]
+
+    # Jointure pour afficher le prénom/rôle
+    user_map = df_users.set_index('user_email')[['prénom', 'rôle']].to_dict('index')
+    first_name = lambda email: user_map.get(email, {}).get('prénom', email)
     
-    # 1. TEMPS TOTAL PASSÉ PAR TÂCHE
-    task_times = df_tasks.copy()
-    task_times['total_time_seconds'] = pd.to_numeric(task_times['total_time_seconds'], errors='coerce').fillna(0)
-    task_times['Temps Total'] = task_times['total_time_seconds'].apply(seconds_to_hms)
+    # 1. TEMPS TOTAL PASSÉ PAR TÂCHE (sur la période filtrée : seules les sessions de la tranche sont comptées)
+    task_times = task_duration_table(df_tasks, df_task_rollups, scoped).rename(columns={'sessions': 'Sessions'})
+    time_label = 'Temps sur la Période' if scoped else 'Temps Total'
+    task_times[time_label] = task_times['total_time_seconds'].apply(seconds_to_hms)
     
-    task_report = task_times[['task_id', 'titre', 'assigné_email', 'statut', 'Temps Total', 'closed_at']]
     st.markdown("### 1. Durée de Traitement des Tâches Terminées")
     st.dataframe(
-        task_report[task_report['statut'] == 'Terminer'],
+        task_times[['task_id', 'titre', 'assigné_email', 'statut', time_label, 'Sessions', 'closed_at']],
         use_container_width=True,
         hide_index=True
     )
 
     # 2. TEMPS DE CONNEXION PAR UTILISATEUR
     st.markdown("### 2. Temps Total de Connexion (Login → Logout)")
-    logins_report = df_logins.copy()
-    logins_report['total_logged_seconds'] = pd.to_numeric(logins_report['total_logged_seconds'], errors='coerce').fillna(0)
-    
-    user_login_summary = logins_report.groupby('user_email')['total_logged_seconds'].sum().reset_index()
-    user_login_summary['Temps Connecté Total'] = user_login_summary['total_logged_seconds'].apply(seconds_to_hms)
-    
-    # Jointure pour afficher le prénom/rôle
-    user_map = df_users.set_index('user_email')[['prénom', 'rôle']].to_dict('index')
-    user_login_summary['Prénom'] = user_login_summary['user_email'].apply(lambda x: user_map.get(x, {}).get('prénom', x))
+    user_login_summary = per_user[['user_email']].copy()
+    user_login_summary['Temps Connecté Total'] = per_user['logged_seconds'].apply(seconds_to_hms)
+    user_login_summary['Prénom'] = user_login_summary['user_email'].apply(first_name)
     
     st.dataframe(
         user_login_summary[['Prénom', 'user_email', 'Temps Connecté Total']],
@@ -842,23 +3839,11 @@ def display_reporting(df_tasks, df_sessions, df_logins, df_users):
     # 3. TEMPS DE PAUSE
     st.markdown("### 3. Temps Total de Pause (Mission vs. Global)")
     
-    pause_sessions = df_sessions[df_sessions['pause_at'] != '']
-    pause_sessions['duration_seconds'] = pd.to_numeric(pause_sessions['duration_seconds'], errors='coerce').fillna(0)
-    
-    # Calcul des pauses mission (bouton pause dans la tâche)
-    mission_pauses = pause_sessions[pause_sessions['pause_type'] == 'mission']
-    mission_pause_summary = mission_pauses.groupby('user_email')['duration_seconds'].sum().reset_index()
-    mission_pause_summary['Type'] = 'Mission'
-    
-    # Calcul des pauses globales (bouton général)
-    global_pauses = pause_sessions[pause_sessions['pause_type'] == 'global']
-    global_pause_summary = global_pauses.groupby('user_email')['duration_seconds'].sum().reset_index()
-    global_pause_summary['Type'] = 'Globale'
-    
-    combined_pauses = pd.concat([mission_pause_summary, global_pause_summary])
+    # Pauses mission (bouton pause dans la tâche) et pauses globales (bouton général)
+    combined_pauses = pause_table(per_user)
     
     # Ajout du nom d'utilisateur
-    combined_pauses['Prénom'] = combined_pauses['user_email'].apply(lambda x: user_map.get(x, {}).get('prénom', x))
+    combined_pauses['Prénom'] = combined_pauses['user_email'].apply(first_name)
     combined_pauses['Durée Totale'] = combined_pauses['duration_seconds'].apply(seconds_to_hms)
     
     st.dataframe(
@@ -867,9 +3852,117 @@ def display_reporting(df_tasks, df_sessions, df_logins, df_users):
         hide_index=True
     )
 
+    # 4. FEUILLE DE TEMPS HEBDOMADAIRE
+    st.markdown("### 4. Feuille de Temps Hebdomadaire")
+    timesheet = pd.DataFrame({
+        'Semaine du': weekly['semaine'],
+        'Prénom': weekly['user_email'].apply(first_name),
+        'Temps Mission': weekly['mission_seconds'].apply(seconds_to_hms),
+        'Pause Globale': weekly['global_pause_seconds'].apply(seconds_to_hms),
+        'Temps Connecté': weekly['logged_seconds'].apply(seconds_to_hms),
+    })
+    st.dataframe(timesheet, use_container_width=True, hide_index=True)
+
+
+def display_admin_tools():
+    """Outils de maintenance réservés aux admins (archivage, agrégats, démarrage)."""
+    with st.expander("🗄️ Archivage de l'historique"):
+        st.caption(f"Sessions et connexions fermées depuis plus de {ARCHIVE_HORIZON_DAYS} jours → feuilles mensuelles + résumés dans 'Archives'.")
+        if st.button("Archiver maintenant", disabled=ARCHIVE_HORIZON_DAYS <= 0):
+            moved = archive_history(
+                get_backend(), ARCHIVE_HORIZON_DAYS,
+                get_mutation_queue() if WRITE_BEHIND else None, get_snapshot_cache()
+            )
+            if moved is None:
+                st.warning("Un archivage est déjà en cours (autre session ou processus) ; réessayez plus tard.")
+            else:
+                st.success(f"Lignes archivées : {moved or 'aucune'}")
+    with st.expander("📊 Agrégats du reporting"):
+        st.caption("Les agrégats journaliers et par tâche sont tenus à jour à chaque fermeture de session ; recalcul complet en cas d'écart.")
+        if st.button("Recalculer les agrégats"):
+            if rebuild_rollups(get_backend(), get_mutation_queue() if WRITE_BEHIND else None, get_snapshot_cache()):
+                st.success("Agrégats recalculés depuis l'historique.")
+            else:
+                st.warning("Un recalcul des agrégats est déjà en cours (autre session ou processus) ; réessayez plus tard.")
+    if WRITE_BEHIND:
+        queue = get_mutation_queue()
+        with st.expander("📮 File d'écritures"):
+            st.caption(f"{queue.pending_count()} écriture(s) en attente.")
+            for sheet_name, detail in queue.errors.items():
+                st.error(f"{sheet_name} : {detail}")
+            if queue.dead_letters:
+                st.markdown("**Écritures refusées définitivement** (retirées de la file, à ressaisir)")
+                dead_letters = pd.DataFrame(list(queue.dead_letters))
+                st.dataframe(dead_letters.astype(str), hide_index=True, use_container_width=True)
+                st.download_button(
+                    "Exporter (JSON lines)",
+                    '\n'.join(json.dumps(entry, ensure_ascii=False, default=_to_python) for entry in queue.dead_letters),
+                    file_name='klick_dead_letters.jsonl', mime='application/jsonl'
+                )
+            if queue.dropped_updates:
+                st.markdown("**Mises à jour ignorées** (ligne introuvable)")
+                st.dataframe(pd.DataFrame(list(queue.dropped_updates)).astype(str), hide_index=True, use_container_width=True)
+    if st.session_state.get('last_load_timings'):
+        with st.expander("⏱️ Dernier chargement des feuilles"):
+            st.table(pd.DataFrame(
+                [(sheet_name, f"{seconds:.3f} s") for sheet_name, seconds in st.session_state['last_load_timings'].items()],
+                columns=['Feuille', 'Durée']
+            ))
+    if STORAGE_BACKEND == 'gsheets':
+        with st.expander("📡 Appels API Google Sheets"):
+            meter = get_api_meter()
+            last_minute = meter.last_minute()
+            for kind, quota in (('lecture', API_READ_QUOTA_PER_MINUTE), ('écriture', API_WRITE_QUOTA_PER_MINUTE)):
+                st.progress(
+                    min(1.0, last_minute[kind] / max(1, quota)),
+                    text=f"{kind.capitalize()}s sur la dernière minute : {last_minute[kind]} / {quota}"
+                )
+            df_calls = pd.DataFrame(meter.calls(), columns=ApiCall._fields)
+            if df_calls.empty:
+                st.info("Aucun appel API enregistré depuis le démarrage.")
+            else:
+                breakdown = df_calls.groupby(['action', 'user', 'sheet', 'operation'], as_index=False).agg(
+                    appels=('seconds', 'size'),
+                    durée_totale_s=('seconds', 'sum'),
+                    échecs=('ok', lambda ok: int((~ok).sum())),
+                ).sort_values('appels', ascending=False)
+                st.dataframe(breakdown, hide_index=True, use_container_width=True)
+            st.download_button(
+                "Exporter le journal (JSON lines)", meter.to_jsonl(),
+                file_name='klick_api_calls.jsonl', mime='application/jsonl'
+            )
+        with st.expander("⏱️ Temps de démarrage Google Sheets"):
+            _, sheets = init_gspread()
+            st.table(pd.DataFrame(
+                [(step, f"{seconds:.3f} s") for step, seconds in sheets.startup_timings.items()],
+                columns=['Étape', 'Durée']
+            ))
+
 
 # --- 7. APPLICATION PRINCIPALE (Structure de Streamlit) ---
 
+def view_tasks(data):
+    """Vue Tâches : liste et chronomètres."""
+    display_task_list(data['tasks'], data['sessions'])
+
+def view_reporting(data):
+    """Vue Reporting : lue dans les agrégats matérialisés."""
+    display_reporting(data['tasks'], data['users'], data['daily_rollups'], data['task_rollups'])
+
+def view_admin(data):
+    """Vue Administration : gestion des tâches et maintenance."""
+    admin_task_management(data['tasks'], data['users'])
+    display_admin_tools()
+
+# Vues de l'application : seule la vue sélectionnée charge ses feuilles et s'exécute
+View = namedtuple('View', ['sheets', 'render', 'admin_only'])
+VIEWS = {
+    # 'archives' : les totaux par tâche y ajoutent les sessions archivées
+    "📋 Tâches": View(['tasks', 'sessions', 'archives'], view_tasks, False),
+    "📈 Reporting": View(['tasks', 'users', 'daily_rollups', 'task_rollups'], view_reporting, False),
+    "👥 Administration": View(['tasks', 'users'], view_admin, True),
+}
+
 def main_app():
     """Fonction principale de l'application connectée."""
     
@@ -899,38 +3992,37 @@ def main_app():
         with col_logout:
             st.button("🔴 Déconnexion", on_click=logout, key="logout_btn", use_container_width=True)
 
-    st.markdown("---")
-    
-    # Rechargement des données (déclenché après chaque action d'écriture)
-    df_tasks = fetch_data('tasks')
-    df_sessions = fetch_data('sessions')
-    df_users = fetch_data('users')
-    df_logins = fetch_data('logins')
+    if WRITE_BEHIND and get_mutation_queue().last_error:
+        st.warning(f"Synchronisation Google Sheets en attente ({get_mutation_queue().pending_count()} écriture(s)). Détail: {get_mutation_queue().last_error}")
 
-    # Affichage des Onglets
-    tab1, tab2, tab3 = st.tabs(["📋 Tâches", "📈 Reporting", "👥 Administration"])
+    # Archivage de l'historique, rafraîchissement des feuilles et instantanés disque (un thread chacun par processus)
+    if ARCHIVE_HORIZON_DAYS > 0:
+        start_archiver()
+    if SYNC_INTERVAL_SECONDS > 0:
+        start_sync_daemon()
+    if get_snapshot_store() is not None:
+        start_snapshot_writer()
 
-    with tab1:
-        display_task_list(df_tasks, df_sessions)
+    # Navigation (remplace st.tabs, qui exécutait les trois onglets à chaque rerun)
+    view_name = st.radio("Navigation", list(VIEWS), horizontal=True, key="current_view", label_visibility="collapsed")
+    view = VIEWS[view_name]
+    st.markdown("---")
 
-    with tab2:
-        display_reporting(df_tasks, df_sessions, df_logins, df_users)
-        
-    with tab3:
-        if st.session_state['user_role'] == 'admin':
-            admin_task_management(df_tasks, df_users)
-        else:
-            st.warning("Accès Administrateur requis pour cette section.")
+    if view.admin_only and st.session_state['user_role'] != 'admin':
+        st.warning("Accès Administrateur requis pour cette section.")
+        return
 
-    # Actualisation automatique du chronomètre (à mettre à jour toutes les 1s)
-    if st.session_state['active_task_id']:
-        time.sleep(1)
-        st.rerun()
+    if 'daily_rollups' in view.sheets:
+        # Agrégats du reporting : construits depuis l'historique au premier démarrage
+        ensure_rollups()
+
+    with api_context(view_name):
+        # Chargement des seules feuilles de la vue, en un seul aller-retour (instantanés partagés)
+        data, timings = fetch_many(view.sheets)
+        if timings:
+            st.session_state['last_load_timings'] = timings
+        view.render(data)
 
 # Lancement de l'application
 if __name__ == "__main__":
     main_app()
-
-
-
-
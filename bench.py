@@ -0,0 +1,365 @@
+"""Banc de performance hors ligne : le code de app.py exécuté contre un faux Google Sheets en mémoire.
+
+    python bench.py --sizes 100,10000,1000000 --latency-ms 50
+
+Pour chaque taille de jeu de données (nombre de lignes de Sessions), chaque opération est mesurée :
+temps écoulé, appels API simulés (avec la latence configurée) et pic mémoire (tracemalloc).
+Le tableau est affiché et écrit dans `bench_output.txt`.
+"""
+import argparse
+import os
+import random
+import re
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+from collections import Counter
+from datetime import datetime, timedelta
+
+# Configuration lue par app.py à l'import : pas d'archivage automatique, aucun fichier dans le dépôt
+os.environ.setdefault('KLICK_STORAGE_BACKEND', 'gsheets')
+os.environ.setdefault('KLICK_ARCHIVE_HORIZON_DAYS', '0')
+os.environ.setdefault('KLICK_JOURNAL_PATH', '')
+os.environ.setdefault('KLICK_SNAPSHOT_DIR', '')
+os.environ.setdefault('KLICK_SHEET_IDS_PATH', os.path.join(tempfile.gettempdir(), 'klick_bench_sheet_ids.json'))
+if '--write-behind' in sys.argv:
+    # Thread de vidage neutralisé (ni échéance ni seuil atteints pendant le banc) : les vidages sont
+    # déclenchés par le banc seul et leurs appels comptés sur la ligne « (vidage) » de l'opération
+    os.environ['KLICK_WRITE_BEHIND'] = 'true'
+    os.environ['KLICK_FLUSH_INTERVAL_SECONDS'] = '3600'
+    os.environ['KLICK_FLUSH_BATCH_SIZE'] = str(10 ** 9)
+else:
+    os.environ.setdefault('KLICK_WRITE_BEHIND', 'false')
+
+import gspread  # noqa: E402
+from gspread.exceptions import WorksheetNotFound  # noqa: E402
+
+import app  # noqa: E402
+
+
+# --- Faux Google Sheets ---
+
+class FakeAPI:
+    """Compte les appels par type et simule la latence réseau de chacun."""
+
+    def __init__(self, latency):
+        self.latency = latency
+        self.calls = Counter()
+        self._lock = threading.Lock()
+
+    def call(self, operation):
+        with self._lock:
+            self.calls[operation] += 1
+        if self.latency:
+            time.sleep(self.latency)
+
+
+def _parse_range(a1_range):
+    """Plage A1 -> (titre, première ligne, dernière ligne, première colonne, dernière colonne), bornes 1-indexées ou None."""
+    title, _, cells = a1_range.partition('!')
+    if title.startswith("'"):
+        title = title[1:-1].replace("''", "'")
+    bounds = [None] * 4
+    for i, part in enumerate(cells.split(':') if cells else []):
+        match = re.fullmatch(r'\$?([A-Z]*)\$?(\d*)', part)
+        if match.group(1):
+            bounds[2 + i] = gspread.utils.a1_to_rowcol(f"{match.group(1)}1")[1]
+        if match.group(2):
+            bounds[i] = int(match.group(2))
+    first_row, last_row, first_col, last_col = bounds
+    if len(cells.split(':')) == 1 and cells:
+        # Cellule seule : la plage couvre exactement cette cellule
+        last_row, last_col = first_row, first_col
+    return title, first_row, last_row, first_col, last_col
+
+
+class FakeWorksheet:
+    """Feuille en mémoire : une liste de lignes de chaînes, en-tête compris (comme les valeurs de l'API)."""
+
+    def __init__(self, spreadsheet, title, sheet_id, rows):
+        self.spreadsheet = spreadsheet
+        self.title = title
+        self.id = sheet_id
+        self.rows = rows
+
+    def _read(self, first_row, last_row, first_col, last_col):
+        rows = self.rows[(first_row or 1) - 1:last_row]
+        first_col = (first_col or 1) - 1
+        return [row[first_col:last_col] for row in rows]
+
+    def _write(self, first_row, first_col, values):
+        for offset, values_row in enumerate(values):
+            row_num = first_row + offset
+            while len(self.rows) < row_num:
+                self.rows.append([])
+            row = self.rows[row_num - 1]
+            end = first_col - 1 + len(values_row)
+            row.extend([''] * (end - len(row)))
+            row[first_col - 1:end] = ['' if v is None else str(v) for v in values_row]
+
+    def get_all_records(self):
+        self.spreadsheet.api.call('get_all_records')
+        headers = self.rows[0]
+        return [
+            dict(zip(headers, gspread.utils.numericise_all(row + [''] * (len(headers) - len(row)))))
+            for row in self.rows[1:]
+        ]
+
+    def get_all_values(self):
+        self.spreadsheet.api.call('get_all_values')
+        return [list(row) for row in self.rows]
+
+    def col_values(self, col):
+        self.spreadsheet.api.call('col_values')
+        return [row[col - 1] if len(row) >= col else '' for row in self.rows]
+
+    def get(self, a1_range):
+        self.spreadsheet.api.call('get')
+        return self._read(*_parse_range(f"x!{a1_range}")[1:])
+
+    def update(self, a1_range, values):
+        self.spreadsheet.api.call('update')
+        _, first_row, _, first_col, _ = _parse_range(f"x!{a1_range}")
+        self._write(first_row, first_col, values)
+
+    def batch_update(self, cells):
+        self.spreadsheet.api.call('batch_update')
+        for cell in cells:
+            _, first_row, _, first_col, _ = _parse_range(f"x!{cell['range']}")
+            self._write(first_row, first_col, cell['values'])
+
+    def append_rows(self, rows):
+        self.spreadsheet.api.call('append_rows')
+        first_row = len(self.rows) + 1
+        self._write(first_row, 1, rows)
+        last_column = gspread.utils.rowcol_to_a1(1, max(len(r) for r in rows))[:-1]
+        return {'updates': {'updatedRange': f"{app._a1_title(self.title)}!A{first_row}:{last_column}{len(self.rows)}"}}
+
+
+class FakeSpreadsheet:
+    """Classeur en mémoire exposant les méthodes gspread utilisées par app.py."""
+
+    id = 'bench'
+
+    def __init__(self, api, tables):
+        self.api = api
+        self._sheets = {}
+        for title, rows in tables.items():
+            self._sheets[title] = FakeWorksheet(self, title, len(self._sheets) + 1, rows)
+
+    def worksheet(self, title):
+        self.api.call('fetch_sheet_metadata')
+        if title not in self._sheets:
+            raise WorksheetNotFound(title)
+        return self._sheets[title]
+
+    def worksheets(self):
+        self.api.call('fetch_sheet_metadata')
+        return list(self._sheets.values())
+
+    def add_worksheet(self, title, rows, cols):
+        self.api.call('add_worksheet')
+        self._sheets[title] = FakeWorksheet(self, title, len(self._sheets) + 1, [])
+        return self._sheets[title]
+
+    def values_batch_get(self, ranges):
+        self.api.call('values_batch_get')
+        value_ranges = []
+        for a1_range in ranges:
+            title, *bounds = _parse_range(a1_range)
+            value_ranges.append({'range': a1_range, 'values': self._sheets[title]._read(*bounds)})
+        return {'valueRanges': value_ranges}
+
+    def values_batch_update(self, body):
+        self.api.call('values_batch_update')
+        for data in body['data']:
+            title, first_row, _, first_col, _ = _parse_range(data['range'])
+            self._sheets[title]._write(first_row, first_col, data['values'])
+
+    def batch_update(self, body):
+        self.api.call('batch_update')
+        by_id = {sheet.id: sheet for sheet in self._sheets.values()}
+        for request in body['requests']:
+            if 'findReplace' in request:
+                find = request['findReplace']
+                for row in by_id[find['sheetId']].rows:
+                    row[:] = [find['replacement'] if cell == find['find'] else cell for cell in row]
+            elif 'appendCells' in request:
+                cells = request['appendCells']
+                values = [[next(iter(cell.get('userEnteredValue', {}).values()), '') for cell in row['values']]
+                          for row in cells['rows']]
+                sheet = by_id[cells['sheetId']]
+                sheet._write(len(sheet.rows) + 1, 1, values)
+            else:
+                span = request['deleteDimension']['range']
+                del by_id[span['sheetId']].rows[span['startIndex']:span['endIndex']]
+
+
+# --- Jeux de données ---
+
+def generate_tables(session_rows, seed=0):
+    """Feuilles de l'application avec `session_rows` sessions réparties sur un an (graine fixe)."""
+    rng = random.Random(seed)
+    now = datetime.now().replace(microsecond=0)
+    emails = list(app.PRE_EXISTING_ACCOUNTS) + [f"user{i}@bench.local" for i in range(max(0, session_rows // 2000 - 5))]
+    stamp = lambda dt: dt.strftime('%Y-%m-%d %H:%M:%S')  # noqa: E731
+
+    users = [[email, email.split('@')[0], 'user', stamp(now - timedelta(days=400))] for email in emails]
+    task_count = max(10, session_rows // 50)
+    tasks = [
+        [f"T{i:07d}", f"Tâche {i}", "Générée par le banc", rng.choice(emails), stamp(now - timedelta(days=rng.randint(1, 365))),
+         stamp(now + timedelta(days=rng.randint(1, 30))), rng.choice(['À faire', 'En cours', 'Terminer']), '0', app.ADMIN_EMAIL, '', '']
+        for i in range(task_count)
+    ]
+    sessions = []
+    for i in range(session_rows):
+        start = now - timedelta(days=365) + timedelta(seconds=int(365 * 86400 * i / max(1, session_rows)))
+        duration = rng.randint(60, 7200)
+        end = stamp(start + timedelta(seconds=duration))
+        if rng.random() < 0.05:
+            sessions.append([f"P{i:08d}", 'GLOBAL_PAUSE', rng.choice(emails), stamp(start), '', '', end, str(duration), 'global'])
+        else:
+            paused = rng.random() < 0.5
+            sessions.append([f"S{i:08d}", f"T{rng.randrange(task_count):07d}", rng.choice(emails), stamp(start),
+                             end if paused else '', '', '' if paused else end, str(duration), 'mission'])
+    logins = []
+    for i in range(max(1, session_rows // 4)):
+        login_at = now - timedelta(days=365) + timedelta(seconds=int(365 * 86400 * i / max(1, session_rows // 4)))
+        seconds = rng.randint(600, 8 * 3600)
+        logins.append([f"L{i:08d}", rng.choice(emails), stamp(login_at), stamp(login_at + timedelta(seconds=seconds)), str(seconds)])
+
+    rows = {'users': users, 'tasks': tasks, 'sessions': sessions, 'logins': logins}
+    return {
+        title: [list(app.SHEET_HEADERS[sheet_name])] + rows.get(sheet_name, [])
+        for sheet_name, title in app.WORKSHEET_TITLES.items()
+    }
+
+
+# --- Exécution ---
+
+class _ScriptControl(Exception):
+    """st.rerun()/st.stop() : fin du gestionnaire, comme sous `streamlit run`."""
+
+
+class _SessionState(dict):
+    """État de session persistant (en mode nu, st.session_state repart de zéro à chaque accès)."""
+
+    __getattr__ = dict.__getitem__
+    __setattr__ = dict.__setitem__
+
+
+class _BareStreamlit:
+    """Module streamlit vu par app.py pendant le banc : état de session réel, rerun/stop interrompent l'action."""
+
+    def __init__(self, module):
+        self._module = module
+        self.session_state = _SessionState()
+
+    def __getattr__(self, name):
+        return getattr(self._module, name)
+
+    def rerun(self):
+        raise _ScriptControl('rerun')
+
+    def stop(self):
+        raise _ScriptControl('stop')
+
+
+def reset_process(spreadsheet):
+    """Repart d'un processus neuf : singletons vidés, classeur simulé branché à la place de Google."""
+    if app.WRITE_BEHIND:
+        app.get_mutation_queue().close()
+    for resource in (app.get_backend, app.get_snapshot_cache, app.get_mutation_queue, app.ensure_rollups):
+        resource.clear()
+
+    def init_gspread():
+        if not hasattr(init_gspread, 'result'):
+            app._ensure_headers(spreadsheet)
+            init_gspread.result = (None, app.LazyWorksheets(spreadsheet, {}))
+        return init_gspread.result
+    app.init_gspread = init_gspread
+
+
+def run_size(session_rows, latency, measure_memory):
+    api = FakeAPI(0)
+    spreadsheet = FakeSpreadsheet(api, generate_tables(session_rows))
+    reset_process(spreadsheet)
+    app.init_gspread()
+    api.latency = latency
+
+    user_email = app.ADMIN_EMAIL
+    app.st.session_state.clear()
+    app.st.session_state.update({
+        'logged_in': True, 'user_email': user_email, 'user_name': 'Bench', 'user_role': 'admin',
+        'global_pause': False, 'global_pause_start': None, 'active_task_id': None,
+        'task_timer_start': None, 'task_last_session_id': None,
+    })
+    task_id = spreadsheet.worksheet('Tâches').rows[1][0]
+    results = []
+
+    def measure(name, fn):
+        before = sum(api.calls.values())
+        if measure_memory:
+            tracemalloc.start()
+        started = time.perf_counter()
+        try:
+            fn()
+        except _ScriptControl:
+            pass
+        elapsed = time.perf_counter() - started
+        peak = tracemalloc.get_traced_memory()[1] if measure_memory else None
+        if measure_memory:
+            tracemalloc.stop()
+        results.append((session_rows, name, elapsed, sum(api.calls.values()) - before, peak))
+        if app.WRITE_BEHIND and app.get_mutation_queue().pending_count():
+            # Le clic ne fait que mettre en file : le vidage est mesuré à part
+            measure(f"{name} (vidage)", app.get_mutation_queue().flush)
+
+    tasks = lambda: app.fetch_data('tasks')  # noqa: E731
+    measure("fetch_data('sessions') à froid", lambda: app.fetch_data('sessions'))
+    measure("fetch_data('sessions') en cache", lambda: app.fetch_data('sessions'))
+    measure("fetch_many (vue Tâches)", lambda: app.fetch_many(app.VIEWS["📋 Tâches"].sheets))
+    measure("update_row_by_id", lambda: app.update_row_by_id('tasks', tasks(), 'task_id', task_id, {'description': 'Banc'}))
+    measure("start_task", lambda: app.start_task(task_id, tasks()))
+    measure("pause_task", lambda: app.pause_task(task_id, tasks()))
+    measure("start_task (reprise)", lambda: app.start_task(task_id, tasks()))
+    measure("complete_task", lambda: app.complete_task(task_id, tasks()))
+    measure("display_task_list", lambda: app.view_tasks(app.fetch_many(app.VIEWS["📋 Tâches"].sheets)[0]))
+    measure("ensure_rollups", app.ensure_rollups)
+    measure("display_reporting", lambda: app.view_reporting(app.fetch_many(app.VIEWS["📈 Reporting"].sheets)[0]))
+    return results
+
+
+def format_table(results, measure_memory):
+    lines = [f"{'sessions':>9}  {'opération':<40} {'temps (ms)':>11} {'appels API':>10} {'pic mémoire (Mio)':>18}"]
+    for size, name, elapsed, calls, peak in results:
+        memory = f"{peak / 2 ** 20:.1f}" if measure_memory else '-'
+        lines.append(f"{size:>9}  {name:<40} {elapsed * 1000:>11.1f} {calls:>10} {memory:>18}")
+    return '\n'.join(lines)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Banc de performance hors ligne de Klick.")
+    parser.add_argument('--sizes', default='100,1000,10000,100000,1000000',
+                        help="Tailles de la feuille Sessions, séparées par des virgules")
+    parser.add_argument('--latency-ms', type=float, default=50, help="Latence simulée de chaque appel API")
+    parser.add_argument('--write-behind', action='store_true', help="Écritures différées (vidages mesurés à part)")
+    parser.add_argument('--no-memory', action='store_true', help="Sans tracemalloc (temps non ralentis par la mesure mémoire)")
+    parser.add_argument('--output', default='bench_output.txt', help="Fichier où écrire le tableau")
+    args = parser.parse_args()
+
+    app.st = _BareStreamlit(app.st)
+    results = []
+    for size in (int(s) for s in args.sizes.split(',')):
+        print(f"Jeu de données : {size} sessions…", file=sys.stderr)
+        results.extend(run_size(size, args.latency_ms / 1000, not args.no_memory))
+    table = format_table(results, not args.no_memory)
+    print(table)
+    with open(args.output, 'w', encoding='utf-8') as f:
+        f.write(table + '\n')
+
+
+if __name__ == '__main__':
+    main()
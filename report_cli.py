@@ -0,0 +1,126 @@
+"""Rapports en ligne de commande : les rapports de l'onglet Reporting, calculés hors du serveur Streamlit.
+
+    python report_cli.py --output rapports --format csv --period M
+    python report_cli.py --source snapshot --workers 4 --chunk-rows 100000
+
+Les sessions et connexions sont lues par morceaux de `--chunk-rows` lignes (moteur de stockage configuré
+ou instantanés Parquet de `snapshot_dir`) et agrégées au fil de l'eau : un morceau et les agrégats
+journaliers seulement sont en mémoire, quelle que soit la taille de l'historique. `--workers` répartit
+l'agrégation des morceaux sur un pool de processus.
+
+Fichiers écrits dans `--output` : taches, connexions, pauses et feuille_de_temps_<jour|semaine|mois>.
+"""
+import argparse
+import os
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+import pandas as pd
+
+import app
+
+PERIODS = {'D': 'jour', 'W': 'semaine', 'M': 'mois'}
+
+
+def empty_sheet(sheet_name):
+    return app.apply_schema(sheet_name, pd.DataFrame(columns=app.SHEET_HEADERS[sheet_name]))
+
+
+def read_sheet(iter_chunks, sheet_name, chunk_rows):
+    """Feuille entière (petites feuilles : tâches, utilisateurs, résumés archivés)."""
+    chunks = list(iter_chunks(sheet_name, chunk_rows))
+    return app.concat_typed(chunks) if chunks else empty_sheet(sheet_name)
+
+
+def chunk_rollups(sheet_name, chunk):
+    """Agrégats (daily, per_task) d'un morceau de Sessions ou de Logins ; exécuté dans un processus du pool au besoin."""
+    if sheet_name == 'sessions':
+        return app.compute_rollups(chunk, empty_sheet('logins'), None)
+    return app.compute_rollups(empty_sheet('sessions'), chunk, None)
+
+
+def stream_rollups(iter_chunks, chunk_rows, workers, df_archives):
+    """Agrégats de tout l'historique, fusionnés morceau par morceau (au plus 2 morceaux par processus en attente)."""
+    total = app.compute_rollups(empty_sheet('sessions'), empty_sheet('logins'), df_archives)
+    chunks = ((sheet_name, chunk) for sheet_name in ('sessions', 'logins') for chunk in iter_chunks(sheet_name, chunk_rows))
+    if workers <= 1:
+        for sheet_name, chunk in chunks:
+            total = app.merge_rollups([total, chunk_rollups(sheet_name, chunk)])
+        return total
+
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        in_flight = deque()
+        for sheet_name, chunk in chunks:
+            in_flight.append(pool.submit(chunk_rollups, sheet_name, chunk))
+            if len(in_flight) >= 2 * workers:
+                total = app.merge_rollups([total, in_flight.popleft().result()])
+        while in_flight:
+            total = app.merge_rollups([total, in_flight.popleft().result()])
+    return total
+
+
+def build_reports(iter_chunks, chunk_rows, workers, period):
+    """Les trois rapports du Reporting et la feuille de temps de la période : {nom de fichier: DataFrame}."""
+    df_archives = read_sheet(iter_chunks, 'archives', chunk_rows)
+    daily, per_task = stream_rollups(iter_chunks, chunk_rows, workers, df_archives)
+    directory = app.build_user_directory(read_sheet(iter_chunks, 'users', chunk_rows))
+    first_name = lambda email: directory.get(email, {}).get('prénom', email)
+    per_user, _ = app.compute_reporting_tables(daily)
+
+    tasks = app.task_duration_table(read_sheet(iter_chunks, 'tasks', chunk_rows), per_task)
+    tasks = tasks.assign(temps_total=tasks['total_time_seconds'].apply(app.seconds_to_hms))
+
+    logins = per_user[['user_email', 'logged_seconds']].assign(prénom=per_user['user_email'].apply(first_name))
+    logins = logins.assign(temps_connecté=logins['logged_seconds'].apply(app.seconds_to_hms))
+
+    pauses = app.pause_table(per_user)
+    pauses = pauses.assign(
+        prénom=pauses['user_email'].apply(first_name),
+        durée=pauses['duration_seconds'].apply(app.seconds_to_hms),
+    )
+
+    timesheet = app.period_timesheet(daily, period)
+    timesheet.insert(2, 'prénom', timesheet['user_email'].apply(first_name))
+
+    return {
+        'taches': tasks,
+        'connexions': logins,
+        'pauses': pauses,
+        f'feuille_de_temps_{PERIODS[period]}': timesheet,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--source', choices=['backend', 'snapshot'], default='backend',
+                        help="moteur de stockage configuré (storage_backend) ou instantanés Parquet")
+    parser.add_argument('--snapshot-dir', default=app.SNAPSHOT_DIR or 'klick_snapshots')
+    parser.add_argument('--output', default='rapports', help="dossier des fichiers produits")
+    parser.add_argument('--format', choices=['csv', 'parquet'], default='csv')
+    parser.add_argument('--period', choices=sorted(PERIODS), default='W', help="D (jour), W (semaine) ou M (mois)")
+    parser.add_argument('--chunk-rows', type=int, default=50000)
+    parser.add_argument('--workers', type=int, default=1, help="processus d'agrégation (1 : dans le processus courant)")
+    args = parser.parse_args()
+
+    if (args.source == 'snapshot' or args.format == 'parquet') and app.pyarrow is None:
+        parser.error("pyarrow est requis pour lire les instantanés et écrire du Parquet (pip install pyarrow)")
+    if args.source == 'snapshot':
+        iter_chunks = app.SnapshotStore(args.snapshot_dir).iter_chunks
+    else:
+        iter_chunks = app.get_backend().iter_chunks
+
+    with app.api_context('rapport', user=''):
+        reports = build_reports(iter_chunks, args.chunk_rows, args.workers, args.period)
+
+    os.makedirs(args.output, exist_ok=True)
+    for name, df in reports.items():
+        path = os.path.join(args.output, f"{name}.{args.format}")
+        if args.format == 'csv':
+            df.to_csv(path, index=False)
+        else:
+            df.to_parquet(path, index=False)
+        print(f"{path} : {len(df)} ligne(s)")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,108 @@
+"""Archivage de l'historique sur le moteur SQLite : seule opération de l'application qui supprime des lignes."""
+from datetime import datetime, timedelta
+
+import pytest
+
+import app
+
+
+def stamp(days_ago):
+    return (datetime.now() - timedelta(days=days_ago)).strftime(app.TIMESTAMP_FORMAT)
+
+
+def archived_copies(backend, month):
+    table = f"sessions_{month.replace('-', '_')}"
+    return backend._conn.execute(f'SELECT COUNT(*) FROM {table}').fetchone()[0]
+
+
+@pytest.fixture
+def backend(tmp_path):
+    backend = app.SQLiteBackend(str(tmp_path / 'klick.db'))
+    # session_id, task_id, user_email, start_at, pause_at, resume_at, end_at, duration_seconds, pause_type
+    backend.append_many('sessions', [
+        ['old-closed', 'T1', 'a@example.com', stamp(200), '', '', stamp(200), 600, ''],
+        ['old-open', 'T1', 'a@example.com', stamp(200), '', '', '', 0, ''],
+        ['recent', 'T1', 'a@example.com', stamp(1), '', '', stamp(1), 300, ''],
+    ])
+    return backend
+
+
+@pytest.fixture
+def month():
+    return stamp(200)[:7]
+
+
+def test_moves_only_old_closed_rows(backend, month):
+    assert app.archive_history(backend, 90) == {'sessions': 1}
+
+    assert backend.fetch('sessions')['session_id'].tolist() == ['old-open', 'recent']
+    assert set(backend.archived_batches('sessions', month)) == {'old-closed'}
+    archives = backend.fetch('archives')
+    assert archives['rows'].sum() == 1
+    assert archives['duration_seconds'].sum() == 600
+    assert archives['batch'].tolist() == [backend.archived_batches('sessions', month)['old-closed']]
+
+
+def test_second_pass_is_a_no_op(backend, month):
+    app.archive_history(backend, 90)
+    assert app.archive_history(backend, 90) == {}
+    assert archived_copies(backend, month) == 1
+    assert len(backend.fetch('archives')) == 1
+
+
+def test_pass_interrupted_before_deletion_is_resumed_without_duplicates(backend, month, monkeypatch):
+    def crash(sheet_name, id_values):
+        raise RuntimeError("arrêt")
+
+    monkeypatch.setattr(backend, 'delete_rows', crash)
+    with pytest.raises(RuntimeError):
+        app.archive_history(backend, 90)
+    monkeypatch.undo()
+
+    assert app.archive_history(backend, 90) == {'sessions': 1}
+    assert archived_copies(backend, month) == 1
+    assert backend.fetch('archives')['rows'].sum() == 1
+    assert 'old-closed' not in backend.fetch('sessions')['session_id'].tolist()
+
+
+def test_pass_interrupted_before_summaries_is_resumed(backend, month, monkeypatch):
+    append_many = backend.append_many
+
+    def crash(sheet_name, rows):
+        if sheet_name == 'archives':
+            raise RuntimeError("arrêt")
+        return append_many(sheet_name, rows)
+
+    monkeypatch.setattr(backend, 'append_many', crash)
+    with pytest.raises(RuntimeError):
+        app.archive_history(backend, 90)
+    monkeypatch.undo()
+
+    assert app.archive_history(backend, 90) == {'sessions': 1}
+    assert archived_copies(backend, month) == 1
+    archives = backend.fetch('archives')
+    assert archives['rows'].sum() == 1
+    # Le résumé repris porte le lot de la copie interrompue
+    assert archives['batch'].tolist() == [backend.archived_batches('sessions', month)['old-closed']]
+
+
+def test_concurrent_pass_is_refused(backend):
+    # Deuxième connexion sur la même base : un autre processus
+    other = app.SQLiteBackend(backend.path)
+    with other.lease('archivage', 60) as acquired:
+        assert acquired
+        assert app.archive_history(backend, 90) is None
+    assert len(backend.fetch('sessions')) == 3
+
+    assert app.archive_history(backend, 90) == {'sessions': 1}
+
+
+def test_expired_lease_is_taken_over(backend):
+    assert backend.acquire_lease('archivage', 'crashed-process', -1)
+    assert app.archive_history(backend, 90) == {'sessions': 1}
+
+
+def test_deletion_targets_ids_not_positions(backend):
+    app.archive_history(backend, 90)
+    backend.delete_rows('sessions', ['unknown'])
+    assert backend.fetch('sessions')['session_id'].tolist() == ['old-open', 'recent']
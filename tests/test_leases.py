@@ -0,0 +1,55 @@
+"""Baux entre processus sur Google Sheets (classeur simulé du banc) : une passe d'archivage ou de recalcul à la fois."""
+import time
+
+import pytest
+
+import app
+from bench import FakeAPI, FakeSpreadsheet
+
+
+@pytest.fixture
+def backend():
+    spreadsheet = FakeSpreadsheet(FakeAPI(0), {
+        title: [list(app.SHEET_HEADERS[sheet_name])] for sheet_name, title in app.WORKSHEET_TITLES.items()
+    })
+    sheets = {sheet_name: spreadsheet.worksheet(title) for sheet_name, title in app.WORKSHEET_TITLES.items()}
+    return app.GSheetsBackend(lambda: sheets)
+
+
+@pytest.fixture
+def claims(backend):
+    return backend._lease_sheet('archivage').rows
+
+
+def test_held_lease_is_refused_without_a_claim(backend, claims):
+    assert backend.acquire_lease('archivage', 'other', 60)
+    assert not backend.acquire_lease('archivage', 'me', 60)
+    assert [row[0] for row in claims[1:]] == ['other']
+
+
+def test_lost_race_withdraws_the_claim(backend, claims, monkeypatch):
+    sheet = backend._lease_sheet('archivage')
+    append_rows = sheet.append_rows
+
+    def racing(rows):
+        # Un autre processus ajoute sa demande entre la vérification et la nôtre
+        append_rows([['other', time.time() + 60]])
+        return append_rows(rows)
+
+    monkeypatch.setattr(sheet, 'append_rows', racing)
+    assert not backend.acquire_lease('archivage', 'me', 60)
+    monkeypatch.undo()
+    assert [row[0] for row in claims[1:]] == ['other', '']
+
+    backend.release_lease('archivage', 'other')
+    with backend.lease('archivage', 60) as acquired:
+        assert acquired
+    assert claims == [['owner', 'expires_at']]
+
+
+def test_release_deletes_expired_claims(backend, claims):
+    claims.append(['crashed-process', '0'])
+    with backend.lease('archivage', 60) as acquired:
+        assert acquired
+        assert len(claims) == 3
+    assert claims == [['owner', 'expires_at']]
@@ -0,0 +1,62 @@
+"""Reporting : index temporel avancé au fil des ajouts et temps par tâche sur une période filtrée."""
+import pandas as pd
+
+import app
+
+
+def sessions(rows):
+    # session_id, task_id, user_email, start_at, pause_at, resume_at, end_at, duration_seconds, pause_type
+    return app.apply_schema('sessions', pd.DataFrame(rows, columns=app.SHEET_HEADERS['sessions']))
+
+
+def session(session_id, email, start_at, duration=60):
+    return [session_id, 'T1', email, start_at, '', '', start_at, duration, 'mission']
+
+
+def assert_same_index(left, right):
+    assert left.stamps.equals(right.stamps)
+    assert left.positions.tolist() == right.positions.tolist()
+    assert left.by_user.keys() == right.by_user.keys()
+    for email, (stamps, positions) in left.by_user.items():
+        assert stamps.equals(right.by_user[email][0])
+        assert positions.tolist() == right.by_user[email][1].tolist()
+    assert left.rows == right.rows
+
+
+def test_appended_rows_are_inserted_in_place():
+    rows = [
+        session('S1', 'a@example.com', '2024-03-01 09:00:00'),
+        session('S2', 'b@example.com', '2024-03-03 09:00:00'),
+        session('S3', 'a@example.com', '2024-03-02 09:00:00'),
+    ]
+    appended = [
+        session('S4', 'b@example.com', '2024-03-02 09:00:00'),
+        session('S5', 'c@example.com', '2024-02-01 09:00:00'),
+        session('S6', 'a@example.com', '2024-03-01 09:00:00'),
+    ]
+    index = app.build_time_index(sessions(rows), 'start_at')
+    advanced = app.advance_time_index(index, ('append', appended), 'sessions')
+
+    assert_same_index(advanced, app.build_time_index(sessions(rows + appended), 'start_at'))
+    # Copie : l'index de la version précédente reste utilisable
+    assert index.rows == 3 and len(index.stamps) == 3
+
+
+def test_time_changes_force_a_rebuild():
+    index = app.build_time_index(sessions([session('S1', 'a@example.com', '2024-03-01 09:00:00')]), 'start_at')
+    assert app.advance_time_index(index, ('update', {'S1': ('session_id', {'end_at': '2024-03-01 10:00:00'})}), 'sessions') is index
+    assert app.advance_time_index(index, ('update', {'S1': ('session_id', {'start_at': '2024-03-01 08:00:00'})}), 'sessions') is None
+    assert app.advance_time_index(index, ('insert', [session('S2', 'a@example.com', '2024-03-01 09:00:00')]), 'sessions') is None
+
+
+def test_period_task_time_comes_from_the_filtered_rollups():
+    # task_id, titre, description, assigné_email, created_at, due_datetime, statut, total_time_seconds, created_by, closed_by, closed_at
+    tasks = app.apply_schema('tasks', pd.DataFrame([
+        ['T1', 'Tâche', '', 'a@example.com', '', '', 'Terminer', 7200, '', '', '2024-03-02 09:00:00'],
+    ], columns=app.SHEET_HEADERS['tasks']))
+    logins = app.apply_schema('logins', pd.DataFrame(columns=app.SHEET_HEADERS['logins']))
+    # Seule la session de la période filtrée, sur les deux heures de la tâche
+    _, per_task = app.compute_rollups(sessions([session('S1', 'a@example.com', '2024-03-01 09:00:00', 600)]), logins, None)
+
+    assert app.task_duration_table(tasks, per_task)['total_time_seconds'].tolist() == [7200]
+    assert app.task_duration_table(tasks, per_task, scoped=True)['total_time_seconds'].tolist() == [600]
@@ -0,0 +1,111 @@
+"""Agrégats en lignes d'incrément, écrits par la file d'écritures différées (moteur SQLite)."""
+import pytest
+
+import app
+
+
+@pytest.fixture
+def backend(tmp_path):
+    return app.SQLiteBackend(str(tmp_path / 'klick.db'))
+
+
+@pytest.fixture
+def queue(backend, monkeypatch):
+    # Thread de vidage au repos : les vidages sont déclenchés par le test
+    queue = app.MutationQueue(backend, app.SnapshotCache(60), 3600)
+    monkeypatch.setattr(app, 'WRITE_BEHIND', True)
+    monkeypatch.setattr(app, 'get_backend', lambda: backend)
+    monkeypatch.setattr(app, 'get_snapshot_cache', lambda: queue.cache)
+    monkeypatch.setattr(app, 'get_mutation_queue', lambda: queue)
+    yield queue
+    queue.close()
+
+
+def fail_next_append(backend, monkeypatch, written):
+    """Le prochain envoi d'ajouts échoue ; avec `written`, les lignes sont écrites malgré l'erreur."""
+    append_many = backend.append_many
+
+    def flaky(sheet_name, rows):
+        monkeypatch.setattr(backend, 'append_many', append_many)
+        if written:
+            append_many(sheet_name, rows)
+        raise ConnectionError("503")
+
+    monkeypatch.setattr(backend, 'append_many', flaky)
+
+
+def logged_seconds(backend):
+    return backend.fetch('daily_rollups')['logged_seconds'].tolist()
+
+
+def test_increments_of_one_key_get_their_own_rows(backend, queue):
+    for seconds in (100, 50):
+        app.record_login_closed('a@example.com', '2024-03-01 09:00:00', seconds)
+    queue.flush()
+
+    rollups = backend.fetch('daily_rollups')
+    assert rollups['rollup_id'].nunique() == 2
+    daily, _ = app.fold_rollups(rollups, backend.fetch('task_rollups'))
+    assert daily[['rollup_id', 'logged_seconds']].values.tolist() == [['2024-03-01|a@example.com', 150]]
+
+
+@pytest.mark.parametrize('written', [False, True])
+def test_failed_flush_is_retried_without_losing_increments(backend, queue, monkeypatch, written):
+    app.record_login_closed('a@example.com', '2024-03-01 09:00:00', 100)
+    queue.flush()
+
+    app.record_login_closed('a@example.com', '2024-03-01 10:00:00', 50)
+    app.record_login_closed('a@example.com', '2024-03-01 11:00:00', 25)
+    fail_next_append(backend, monkeypatch, written)
+    with pytest.raises(ConnectionError):
+        queue.flush()
+    # Incréments en file toujours visibles malgré la ligne déjà écrite pour leur clé
+    assert app.fetch_data('daily_rollups')['logged_seconds'].sum() == 175
+
+    queue.flush()
+    assert sorted(logged_seconds(backend)) == [25, 50, 100]
+    assert queue.pending_count() == 0
+
+
+def test_session_increment_keeps_its_task(backend, queue):
+    app.record_session_closed('a@example.com', 'T1', 'mission', '2024-03-01 09:00:00', 600, False)
+    queue.flush()
+
+    _, per_task = app.fold_rollups(backend.fetch('daily_rollups'), backend.fetch('task_rollups'))
+    assert per_task[['rollup_id', 'task_id', 'total_seconds', 'sessions']].values.tolist() == [['T1', 'T1', 600, 1]]
+
+
+def add_increment_after_reading(backend, monkeypatch, sheet_name):
+    """Un autre processus ajoute un incrément juste après la lecture de `sheet_name` par le regroupement."""
+    fetch = backend.fetch
+
+    def racing(name):
+        df = fetch(name)
+        if name == sheet_name:
+            monkeypatch.setattr(backend, 'fetch', fetch)
+            backend.append_many('daily_rollups', [['R-other', '2024-03-01', 'a@example.com', 0, 0, 0, 7]])
+        return df
+
+    monkeypatch.setattr(backend, 'fetch', racing)
+
+
+def test_compaction_folds_only_the_rows_it_read(backend, queue, monkeypatch):
+    for seconds in (100, 50):
+        app.record_login_closed('a@example.com', '2024-03-01 09:00:00', seconds)
+    queue.flush()
+
+    add_increment_after_reading(backend, monkeypatch, 'task_rollups')
+    assert app.compact_rollups(backend, queue)
+    assert sorted(logged_seconds(backend)) == [7, 150]
+
+
+def test_rebuild_keeps_increments_added_after_its_read(backend, queue, monkeypatch):
+    # login_id, user_email, login_at, logout_at, total_logged_seconds
+    backend.append_many('logins', [['L1', 'a@example.com', '2024-03-01 09:00:00', '2024-03-01 10:00:00', 3600]])
+    app.record_login_closed('a@example.com', '2024-03-01 09:00:00', 3600)
+    app.record_login_closed('a@example.com', '2024-03-01 09:00:00', 3600)
+    queue.flush()
+
+    add_increment_after_reading(backend, monkeypatch, 'task_rollups')
+    assert app.rebuild_rollups(backend, queue)
+    assert sorted(logged_seconds(backend)) == [7, 3600]
@@ -0,0 +1,96 @@
+"""Synchronisation des instantanés sur Google Sheets (classeur simulé du banc) et répartition entre classeurs."""
+import pytest
+
+import app
+from bench import FakeAPI, FakeSpreadsheet
+
+
+def session(session_id, year=2024, email='a@example.com'):
+    # session_id, task_id, user_email, start_at, pause_at, resume_at, end_at, duration_seconds, pause_type
+    start_at = f'{year}-03-01 09:00:00'
+    return [session_id, 'T1', email, start_at, '', '', start_at, '60', 'mission']
+
+
+@pytest.fixture
+def spreadsheet():
+    tables = {title: [list(app.SHEET_HEADERS[sheet_name])] for sheet_name, title in app.WORKSHEET_TITLES.items()}
+    tables['Sessions'] += [session(f'S{i}') for i in range(1, 6)]
+    return FakeSpreadsheet(FakeAPI(0), tables)
+
+
+@pytest.fixture
+def backend(spreadsheet):
+    sheets = {sheet_name: spreadsheet.worksheet(title) for sheet_name, title in app.WORKSHEET_TITLES.items()}
+    return app.GSheetsBackend(lambda: sheets)
+
+
+@pytest.fixture
+def rows(spreadsheet):
+    return spreadsheet.worksheet('Sessions').rows
+
+
+def session_ids(df):
+    return df['session_id'].tolist()
+
+
+def test_delta_reads_only_new_rows(backend, spreadsheet, rows):
+    df = backend.fetch('sessions')
+    rows.append(session('S6'))
+    spreadsheet.api.calls.clear()
+
+    assert session_ids(backend.fetch_delta('sessions', df)) == ['S1', 'S2', 'S3', 'S4', 'S5', 'S6']
+    assert dict(spreadsheet.api.calls) == {'get': 1}
+
+
+def test_delta_after_deleted_rows_reloads_the_sheet(backend, rows):
+    df = backend.fetch('sessions')
+    # Deux lignes supprimées (archivage), compensées par deux ajouts : même nombre de lignes
+    del rows[1:3]
+    rows.extend([session('S6'), session('S7')])
+
+    assert session_ids(backend.fetch_delta('sessions', df)) == ['S3', 'S4', 'S5', 'S6', 'S7']
+
+
+def test_unchanged_sheet_keeps_the_snapshot_version(backend):
+    # Durée de vie nulle : chaque lecture rafraîchit l'instantané
+    cache = app.SnapshotCache(0)
+    df = cache.get('sessions', backend.fetch, backend.fetch_delta)
+    version = cache.last_good('sessions').version
+
+    assert cache.get('sessions', backend.fetch, backend.fetch_delta) is df
+    assert cache.last_good('sessions').version == version
+
+
+def test_append_is_patched_into_the_snapshot(backend, spreadsheet):
+    cache = app.SnapshotCache(60)
+    cache.get('sessions', backend.fetch)
+    position = backend.append_many('sessions', [session('S6')])
+    cache.apply_append('sessions', [session('S6')], position)
+    spreadsheet.api.calls.clear()
+
+    assert session_ids(cache.get('sessions', backend.fetch))[-1] == 'S6'
+    assert not spreadsheet.api.calls
+
+
+def test_append_at_an_unexpected_position_forces_a_reload(backend, rows):
+    cache = app.SnapshotCache(60)
+    cache.get('sessions', backend.fetch)
+    # Ligne ajoutée par un autre processus avant la nôtre
+    rows.append(session('S6'))
+    position = backend.append_many('sessions', [session('S7')])
+    cache.apply_append('sessions', [session('S7')], position)
+
+    assert session_ids(cache.get('sessions', backend.fetch))[-2:] == ['S6', 'S7']
+
+
+def test_rows_are_routed_by_team_then_year():
+    router = app.ShardRouter({'ops/2024': 'K1', 'ops': 'K2', 'dev': 'K3'}, {'A@example.com': 'ops', 'b@example.com': 'dev'})
+
+    assert router.shard_for('sessions', session('S1', 2024)) == 'K1'
+    assert router.shard_for('sessions', session('S1', 2023)) == 'K2'
+    assert router.shard_for('sessions', session('S1', 2024, 'b@example.com')) == 'K3'
+    assert router.shard_for('sessions', session('S1', 2024, 'c@example.com')) is None
+    # task_id, titre, description, assigné_email, ... : Tâches n'est pas réparti par année
+    assert router.shard_for('tasks', ['T1', '', '', 'a@example.com'] + [''] * 7) == 'K2'
+    assert router.keys('sessions', teams={'ops'}, years={'2023'}) == [None, 'K2']
+    assert router.keys('tasks') == [None, 'K2', 'K3']
@@ -0,0 +1,105 @@
+"""File d'écritures différées : rejeu du journal au redémarrage et lecture de ses propres écritures (moteur SQLite)."""
+import pytest
+
+import app
+
+
+def login(login_id):
+    # login_id, user_email, login_at, logout_at, total_logged_seconds
+    return [login_id, 'a@example.com', '2024-03-01 09:00:00', '', 0]
+
+
+@pytest.fixture
+def backend(tmp_path):
+    return app.SQLiteBackend(str(tmp_path / 'klick.db'))
+
+
+@pytest.fixture
+def journal_path(tmp_path):
+    return str(tmp_path / 'journal.jsonl')
+
+
+@pytest.fixture
+def start_queue(backend, monkeypatch):
+    """Démarre une file (thread de vidage au repos) branchée à la place de celle du processus."""
+    queues = []
+
+    def start(journal=None):
+        queue = app.MutationQueue(backend, app.SnapshotCache(60), 3600, journal)
+        monkeypatch.setattr(app, 'WRITE_BEHIND', True)
+        monkeypatch.setattr(app, 'get_backend', lambda: backend)
+        monkeypatch.setattr(app, 'get_snapshot_cache', lambda: queue.cache)
+        monkeypatch.setattr(app, 'get_mutation_queue', lambda: queue)
+        queues.append(queue)
+        return queue
+
+    yield start
+    for queue in queues:
+        queue.close()
+
+
+def crash_after_journaling(journal_path, mutation):
+    """Processus arrêté après avoir journalisé l'écriture, sans l'avoir acquittée."""
+    journal = app.WriteJournal(journal_path)
+    journal.append(mutation)
+    journal._file.close()
+
+
+@pytest.mark.parametrize('written', [False, True])
+def test_replay_after_uncertain_append_writes_the_row_once(backend, journal_path, start_queue, written):
+    crash_after_journaling(journal_path, app.Mutation('append', 'logins', login('L1'), None, None, None))
+    if written:
+        # L'envoi avait abouti juste avant l'arrêt
+        backend.append_many('logins', [login('L1')])
+
+    queue = start_queue(app.WriteJournal(journal_path))
+    assert queue.pending_count() == 1
+    queue.flush()
+
+    assert backend.fetch('logins')['login_id'].tolist() == ['L1']
+    assert app.WriteJournal(journal_path).replay() == []
+
+
+def test_replayed_update_follows_its_append(backend, journal_path, start_queue):
+    crash_after_journaling(journal_path, app.Mutation('append', 'logins', login('L1'), None, None, None))
+    journal = app.WriteJournal(journal_path)
+    journal.replay()
+    journal.append(app.Mutation('update', 'logins', None, 'login_id', 'L1', {'logout_at': '2024-03-01 10:00:00'}))
+    journal._file.close()
+
+    start_queue(app.WriteJournal(journal_path)).flush()
+    assert backend.fetch('logins')['logout_at'].astype(str).tolist() == ['2024-03-01 10:00:00']
+
+
+@pytest.mark.parametrize('loaded', [True, False])
+@pytest.mark.parametrize('read', [
+    lambda: app.fetch_data('logins')['login_id'].tolist() == ['L1'],
+    lambda: app.find_open_login('a@example.com')[0] == 'L1',
+], ids=['fetch_data', 'find_open_login'])
+def test_pending_write_stays_visible_while_it_is_flushed(start_queue, monkeypatch, loaded, read):
+    queue = start_queue()
+    if loaded:
+        app.fetch_data('logins')
+    queue.submit(app.Mutation('append', 'logins', login('L1'), None, None, None))
+
+    get = queue.cache.get
+
+    def flushed_after_read(*args):
+        # Le vidage reporte l'écriture puis la retire de la file juste après la lecture de l'instantané
+        df = get(*args)
+        queue.flush()
+        return df
+
+    monkeypatch.setattr(queue.cache, 'get', flushed_after_read)
+    assert read()
+
+
+def test_pending_close_hides_the_open_login(backend, start_queue):
+    backend.append_many('logins', [login('L1')])
+    queue = start_queue()
+    assert app.find_open_login('a@example.com')[0] == 'L1'
+
+    queue.submit(app.Mutation('update', 'logins', None, 'login_id', 'L1', {'logout_at': '2024-03-01 10:00:00'}))
+    assert app.find_open_login('a@example.com') is None
+    queue.flush()
+    assert app.find_open_login('a@example.com') is None